@@ -1,10 +1,9 @@
 -- View
 -- lists all auctions along with the total number of bids placed on them can be useful for quick reference.
+-- bid_count is maintained on the auction row by every accepted bid, so no join over dbapp_bid is needed.
 
 CREATE VIEW AuctionBidCount AS
-SELECT a.id, a.title, COUNT(b.id) AS NumberOfBids
-FROM dbapp_auction a
-LEFT JOIN dbapp_bid b ON a.id = b.auction_id
-GROUP BY a.id;
+SELECT a.id, a.title, a.bid_count AS NumberOfBids
+FROM dbapp_auction a;
 
 SELECT * FROM AuctionBidCount;
\ No newline at end of file
@@ -29,8 +29,12 @@ CREATE TABLE dbapp_auction (
 	closed BOOLEAN NOT NULL DEFAULT FALSE,
 	creation_date DATETIME(6) NOT NULL,
 	update_date DATETIME(6) NULL,
+	bid_count INT UNSIGNED NOT NULL DEFAULT 0,
+	highest_bidder_id INT NULL,
+	end_time DATETIME(6) NULL,
 	FOREIGN KEY (category_id) REFERENCES dbapp_category(id),
-	FOREIGN KEY (seller_id) REFERENCES dbapp_user(id)
+	FOREIGN KEY (seller_id) REFERENCES dbapp_user(id),
+	FOREIGN KEY (highest_bidder_id) REFERENCES dbapp_user(id)
 );
 
 
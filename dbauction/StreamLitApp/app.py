@@ -1,9 +1,20 @@
 # import librairies
 import os
+import time
+
 import openai
+import pandas as pd
 import streamlit as st
 import mysql.connector
 
+import db
+import sqlgen
+import sqlguard
+import sqlschema
+from pipeline import Pipeline
+from resultcache import ResultCache
+from sqlcache import SQLCache
+
 # Configure OpenAI API key securely via environment or Streamlit secrets
 _api_key = os.getenv("OPENAI_API_KEY")
 if not _api_key:
@@ -52,16 +63,29 @@ DB_USER = _get_secret("DB_USER")
 DB_PASSWORD = _get_secret("DB_PASSWORD")
 DB_PORT = _get_secret("DB_PORT") or 3306
 
-SQL_CONNECTION = None
+# Connection pool size and per-statement time limit (milliseconds)
+DB_POOL_SIZE = int(_get_secret("DB_POOL_SIZE") or 5)
+DB_STATEMENT_TIMEOUT_MS = int(_get_secret("DB_STATEMENT_TIMEOUT_MS") or 10000)
+
+
+@st.cache_resource
+def get_pool():
+    # one pool per server process, shared by every session and rerun;
+    # a failed attempt is not cached, so the next rerun tries again
+    return db.create_pool(
+        host=DB_HOST,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+        port=DB_PORT,
+        size=DB_POOL_SIZE,
+    )
+
+
+SQL_POOL = None
 if all([DB_HOST, DB_NAME, DB_USER, DB_PASSWORD]):
     try:
-        SQL_CONNECTION = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            port=int(DB_PORT) if isinstance(DB_PORT, str) else DB_PORT,
-        )
+        SQL_POOL = get_pool()
     except Exception as e:
         st.error(f"Failed to connect to MySQL: {e}")
 else:
@@ -70,138 +94,183 @@ else:
 # Text input where the user enter the text to be translated to SQL query
 query = st.text_input('Enter you text to generate SQL query', '')
 
-# The query is sent to the OpenAI API  throught the prompt variable using
-# the "text-davinci-002" engine, and the generated response is returned as
-# a string.
-# These  parameters configuration where based on the ones provided by openai
+# The query is sent to the OpenAI API (the "text-davinci-002" engine, see
+# sqlgen.py) and the generated SQL is returned as a string. Answers are cached
+# on disk keyed by the normalized question and the schema, so a repeated or
+# trivially re-worded question does not call the API again.
+# NL2SQL_LLM=stub swaps OpenAI for an offline stand-in.
+SQL_CACHE_PATH = _get_secret("SQL_CACHE_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".nl2sql_cache.sqlite3")
+SQL_CACHE_MAX_ENTRIES = int(_get_secret("SQL_CACHE_MAX_ENTRIES") or 1000)
+SQL_CACHE_TTL = int(_get_secret("SQL_CACHE_TTL") or 7 * 24 * 3600)
+
+
+@st.cache_resource
+def get_sql_cache():
+    return SQLCache(SQL_CACHE_PATH, max_entries=SQL_CACHE_MAX_ENTRIES, ttl=SQL_CACHE_TTL)
+
+
+@st.cache_resource
+def get_llm_client():
+    if os.getenv("NL2SQL_LLM") == "stub":
+        return sqlgen.StubClient()
+    return sqlgen.OpenAICompletionClient("text-davinci-002")
+
+
+# The schema given to the model is introspected from the database once and
+# kept for SCHEMA_TTL seconds; only the tables a question mentions are sent.
+SCHEMA_TTL = int(_get_secret("SCHEMA_TTL") or 3600)
+SCHEMA_TABLE_PREFIX = _get_secret("SCHEMA_TABLE_PREFIX") or "dbapp_"
+
+
+@st.cache_resource(ttl=SCHEMA_TTL)
+def get_schema():
+    if SQL_POOL is not None:
+        try:
+            schema = sqlschema.introspect(SQL_POOL, SCHEMA_TABLE_PREFIX)
+            if schema.tables:
+                return schema
+        except (mysql.connector.Error, mysql.connector.Warning) as e:
+            st.warning(f"Could not read the database schema, using the bundled one: {e}")
+    return sqlgen.default_schema()
 
 
 def generate_sql(query):
-    model_engine = "text-davinci-002"
-    prompt = f"""
-        Given the following SQL tables, your job is to write queries given a user’s request.
-        CREATE TABLE dbapp_user (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            password VARCHAR(128) NOT NULL,
-            last_login DATETIME(6) NULL,
-            is_superuser BOOLEAN NOT NULL,
-            username VARCHAR(150) NOT NULL UNIQUE,
-            first_name VARCHAR(30) NOT NULL,
-            last_name VARCHAR(150) NOT NULL,
-            email VARCHAR(254) NOT NULL,
-            is_staff BOOLEAN NOT NULL,
-            is_active BOOLEAN NOT NULL,
-            date_joined DATETIME(6) NOT NULL
-        );
-
-        CREATE TABLE dbapp_category (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            title VARCHAR(64) NOT NULL
-        );
-        
-        CREATE TABLE dbapp_auction (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            title VARCHAR(64) NOT NULL,
-            description TEXT NOT NULL,
-            starting_bid DECIMAL(9,2) DEFAULT 0.00 NOT NULL,
-            current_bid DECIMAL(9,2) DEFAULT 0.00 NOT NULL,
-            category_id INT NULL,
-            imageURL VARCHAR(2048) NULL,
-            seller_id INT NOT NULL,
-            closed BOOLEAN NOT NULL DEFAULT FALSE,
-            creation_date DATETIME(6) NOT NULL,
-            update_date DATETIME(6) NULL,
-            FOREIGN KEY (category_id) REFERENCES dbapp_category(id),
-            FOREIGN KEY (seller_id) REFERENCES dbapp_user(id)
-        );
-
-
-        CREATE TABLE dbapp_bid (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            bider_id INT NOT NULL,
-            bid_date DATETIME(6) NOT NULL,
-            bid_price DECIMAL(9,2) NOT NULL,
-            auction_id INT NOT NULL,
-            FOREIGN KEY (bider_id) REFERENCES dbapp_user(id),
-            FOREIGN KEY (auction_id) REFERENCES dbapp_auction(id)
-        );
-
-        CREATE TABLE dbapp_comment (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id INT NOT NULL,
-            headline VARCHAR(64) NOT NULL,
-            message TEXT NOT NULL,
-            cm_date DATETIME(6) NOT NULL,
-            auction_id INT NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES dbapp_user(id),
-            FOREIGN KEY (auction_id) REFERENCES dbapp_auction(id)
-        );
-
-        CREATE TABLE dbapp_watchlist (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id INT NOT NULL UNIQUE,
-            FOREIGN KEY (user_id) REFERENCES dbapp_user(id)
-        );
-
-        CREATE TABLE dbapp_watchlist_auctions (
-            watchlist_id INT NOT NULL,
-            auction_id INT NOT NULL,
-            PRIMARY KEY (watchlist_id, auction_id),
-            FOREIGN KEY (watchlist_id) REFERENCES dbapp_watchlist(id),
-            FOREIGN KEY (auction_id) REFERENCES dbapp_auction(id)
-        );
-        User's request: "{query}"
-        SQL Query:
-    """
-    response = openai.Completion.create(
-        engine=model_engine,
-        prompt=prompt,
-        temperature=0,
-        max_tokens=150,
-        top_p=1.0,
-        frequency_penalty=0.0,
-        presence_penalty=0.0,
-        stop=["#", ";"]
+    return sqlgen.generate_sql(query, get_llm_client(), get_sql_cache(), get_schema())
+
+
+# Generated SQL runs through sqlguard: SELECTs only, with a LIMIT added when
+# missing and refused when EXPLAIN estimates more than GUARD_MAX_EXPLAIN_ROWS
+# examined rows. Result rows are read in chunks of RESULT_FETCH_CHUNK and
+# capped at RESULT_MAX_ROWS. Results are kept for RESULT_CACHE_TTL seconds,
+# keyed by the normalized SQL, so re-running a popular query does not hit MySQL;
+# writes made on the auction site show once the entry expires.
+GUARD_MAX_EXPLAIN_ROWS = int(_get_secret("GUARD_MAX_EXPLAIN_ROWS") or 1000000)
+RESULT_MAX_ROWS = int(_get_secret("RESULT_MAX_ROWS") or 10000)
+RESULT_FETCH_CHUNK = int(_get_secret("RESULT_FETCH_CHUNK") or 1000)
+RESULT_CACHE_TTL = int(_get_secret("RESULT_CACHE_TTL") or 60)
+RESULT_CACHE_MAX_ENTRIES = int(_get_secret("RESULT_CACHE_MAX_ENTRIES") or 64)
+
+
+@st.cache_resource
+def get_result_cache():
+    return ResultCache(max_entries=RESULT_CACHE_MAX_ENTRIES, ttl=RESULT_CACHE_TTL)
+
+
+def execute_sql(sql, cache=None):
+    """Return ``(result, cached)`` for ``sql``, from the result cache when possible."""
+    cache = cache or get_result_cache()
+    result = cache.get(sql, RESULT_MAX_ROWS)
+    if result is not None:
+        return result, True
+    result = sqlguard.run_guarded(
+        SQL_POOL, sql, DB_STATEMENT_TIMEOUT_MS, RESULT_MAX_ROWS, RESULT_FETCH_CHUNK, GUARD_MAX_EXPLAIN_ROWS
     )
-    # Format the SQL query for better readability
-    formatted_sql = response.choices[0].text.strip()
-    formatted_sql = formatted_sql.replace("\\n", "\n").replace("\\t", "\t")
-    return formatted_sql
+    cache.put(sql, result, RESULT_MAX_ROWS)
+    return result, False
+
 
+def display_results(result):
+    # one dataframe widget for the whole result instead of a write per row
+    st.dataframe(pd.DataFrame.from_records(result.rows, columns=result.columns), use_container_width=True)
+    if result.truncated:
+        st.caption(f"Showing the first {RESULT_MAX_ROWS} rows.")
 
-def display_results(results):
-    # Check if results have multiple columns
-    if results and isinstance(results[0], tuple):
-        for row in results:
-            # Unpack the tuple and display each value
-            st.write(' | '.join(map(str, row)))
-    else:
-        for value in results:
-            # If it's not a tuple, just write the value
-            st.write(value)
+
+with st.sidebar:
+    if st.button('Clear cached results'):
+        get_result_cache().clear()
+    st.caption("Result cache: {hits} hits, {misses} misses, {entries} entries".format(**get_result_cache().stats()))
+
+
+def configuration_error():
+    if not _api_key and os.getenv("NL2SQL_LLM") != "stub":
+        return 'OpenAI API key is not configured.'
+    if SQL_POOL is None:
+        return 'Database connection is not configured.'
+    return None
 
 
 # if the Generate SQL query if clicked
 if st.button('Generate SQL query'):
-    if not _api_key:
-        st.error('OpenAI API key is not configured.')
-    elif SQL_CONNECTION is None:
-        st.error('Database connection is not configured.')
+    if configuration_error():
+        st.error(configuration_error())
     elif query:  # Checking if the query string is not empty
+        started = time.perf_counter()
         response = generate_sql(query)
+        generation = time.perf_counter() - started
         st.code(response, language='sql')  # Display the generated SQL query
+        timings = st.empty()
+
+        try:
+            # Execute the SQL query on a pooled connection
+            started = time.perf_counter()
+            result, cached = execute_sql(response)
+            execution = time.perf_counter() - started
+
+            started = time.perf_counter()
+            if result.rows:
+                st.write('Result After running Query on Database')
+                display_results(result)
+            else:
+                st.write("No Record Found")
+            render = time.perf_counter() - started
+
+            timings.caption(
+                f"Generation {generation * 1000:.0f} ms · "
+                f"execution {execution * 1000:.0f} ms{' (cached)' if cached else ''} · "
+                f"render {render * 1000:.0f} ms · {len(result.rows)} rows"
+            )
+        except sqlguard.GuardError as e:
+            timings.caption(f"Generation {generation * 1000:.0f} ms")
+            st.error(f'Query refused: {e}')
+        except (mysql.connector.Error, mysql.connector.Warning) as e:
+            timings.caption(f"Generation {generation * 1000:.0f} ms")
+            st.write(f'Error: {e}')
+
+
+# Several questions, one per line, are answered concurrently by pipeline.py:
+# up to NL2SQL_CONCURRENCY at a time, no more statements at once than the pool
+# has connections, transient failures retried NL2SQL_RETRIES times. Each
+# answer is shown in its place as soon as it is ready.
+NL2SQL_CONCURRENCY = int(_get_secret("NL2SQL_CONCURRENCY") or 4)
+NL2SQL_RETRIES = int(_get_secret("NL2SQL_RETRIES") or 2)
+
+
+def run_batch(questions):
+    # worker threads have no Streamlit script context, so the shared
+    # resources are looked up here and handed to them
+    client, sql_cache, schema, result_cache = get_llm_client(), get_sql_cache(), get_schema(), get_result_cache()
+    pipeline = Pipeline(
+        lambda question: sqlgen.generate_sql(question, client, sql_cache, schema),
+        lambda sql: execute_sql(sql, result_cache)[0],
+        concurrency=NL2SQL_CONCURRENCY,
+        execute_concurrency=DB_POOL_SIZE,
+        retries=NL2SQL_RETRIES,
+    )
+    slots = [st.empty() for _ in questions]
+    for answer in pipeline.run(questions):
+        with slots[answer.index].container():
+            st.markdown(f"**{answer.question}**")
+            if answer.sql:
+                st.code(answer.sql, language='sql')
+            if isinstance(answer.error, sqlguard.GuardError):
+                st.error(f'Query refused: {answer.error}')
+            elif answer.error is not None:
+                st.error(f'Error: {answer.error}')
+            elif answer.result.rows:
+                display_results(answer.result)
+            else:
+                st.write("No Record Found")
+            st.caption(
+                f"Generation {answer.generation_time * 1000:.0f} ms · "
+                f"execution {answer.execution_time * 1000:.0f} ms · {answer.retries} retries"
+            )
+
 
-        with SQL_CONNECTION.cursor() as cursor:
-            try:
-                cursor.execute(response)  # Execute the SQL query
-                results = cursor.fetchall()  # Fetch all the results
-                if results:
-                    st.write('Result After running Query on Database')
-                    # Display the results using the updated function
-                    display_results(results)
-                else:
-                    st.write("No Record Found")
-            except (mysql.connector.Error, mysql.connector.Warning) as e:
-                st.write(f'Error: {e}')
-            finally:
-                SQL_CONNECTION.close()
+batch = st.text_area('Or enter several questions, one per line', '')
+if st.button('Run all'):
+    questions = [line.strip() for line in batch.splitlines() if line.strip()]
+    if configuration_error():
+        st.error(configuration_error())
+    elif questions:
+        run_batch(questions)
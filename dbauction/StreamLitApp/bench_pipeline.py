@@ -0,0 +1,97 @@
+"""Offline run of the concurrent question pipeline.
+
+Answers a batch of questions with a ``StubClient`` in place of OpenAI and a
+SQLite file in place of MySQL, printing each answer as it completes, once
+sequentially and once with the given concurrency:
+
+    python bench_pipeline.py --questions 32 --concurrency 8 --latency 0.3 --error-rate 0.1
+
+Without ``--sqlite`` a throwaway database with the bundled schema and a few
+thousand auctions is created; ``--sqlite ../db.sqlite3`` uses the Django
+development database instead.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from decimal import Decimal
+
+import sqlgen
+from bench_sqlgen import QUESTIONS
+from pipeline import Pipeline, SQLiteExecutor
+
+
+def create_database(path, auctions, seed=0):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(sqlgen.SCHEMA)
+    conn.execute(
+        "INSERT INTO dbapp_user (id, password, is_superuser, username, first_name, last_name, email,"
+        " is_staff, is_active, date_joined) VALUES (1, '', 0, 'seller', '', '', '', 0, 1, '2021-01-01')"
+    )
+    conn.executemany("INSERT INTO dbapp_category (id, title) VALUES (?, ?)",
+                     [(i, f"Category {i}") for i in range(1, 11)])
+    conn.executemany(
+        "INSERT INTO dbapp_auction (id, title, description, starting_bid, current_bid, category_id,"
+        " seller_id, closed, creation_date, bid_count) VALUES (?, ?, '', ?, ?, ?, 1, ?, '2021-01-01', 0)",
+        [
+            (i, f"Item {i}", str(Decimal(rng.randint(100, 10000)) / 100), str(Decimal(rng.randint(100, 20000)) / 100),
+             rng.randint(1, 10), int(rng.random() < 0.3))
+            for i in range(1, auctions + 1)
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+def run(pipeline, questions, verbose):
+    started = time.perf_counter()
+    answers = []
+    for answer in pipeline.run(questions):
+        answers.append(answer)
+        if verbose:
+            outcome = f"error: {answer.error}" if answer.error else f"{len(answer.result.rows)} rows"
+            print(f"  [{time.perf_counter() - started:6.2f}s] #{answer.index:<3} "
+                  f"retries={answer.retries} {outcome}")
+    return answers, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=32, help="questions in the batch")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds the stub LLM takes per call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub LLM calls that time out")
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--sqlite", help="existing SQLite database to query")
+    parser.add_argument("--auctions", type=int, default=5000, help="auctions in the generated database")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print the summary")
+    args = parser.parse_args()
+
+    questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.questions)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.sqlite
+        if path is None:
+            path = os.path.join(tmp, "standin.sqlite3")
+            create_database(path, args.auctions)
+
+        for concurrency in (1, args.concurrency):
+            client = sqlgen.StubClient(latency=args.latency, error_rate=args.error_rate, seed=0)
+            pipeline = Pipeline(
+                lambda question: sqlgen.generate_sql(question, client),
+                SQLiteExecutor(path),
+                concurrency=concurrency,
+                retries=args.retries,
+                backoff=0.1,
+            )
+            print(f"concurrency {concurrency}:")
+            answers, elapsed = run(pipeline, questions, not args.quiet)
+            failed = sum(1 for answer in answers if answer.error)
+            print(f"  {len(answers)} answers in {elapsed:.2f}s ({len(answers) / elapsed:.1f}/s), "
+                  f"{failed} failed, {client.calls} LLM calls")
+
+
+if __name__ == "__main__":
+    main()
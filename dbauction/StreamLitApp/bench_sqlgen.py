@@ -0,0 +1,75 @@
+"""Offline benchmark of the NL-to-SQL cache.
+
+Replays a workload of repeated and trivially re-worded questions through
+``generate_sql`` with a ``StubClient`` in place of OpenAI and reports the
+cache hit rate and the latency of hits and misses:
+
+    python bench_sqlgen.py --questions 200 --latency 0.5
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlcache import SQLCache
+from sqlgen import StubClient, generate_sql
+
+QUESTIONS = [
+    "list all open auctions",
+    "which auctions have no bids",
+    "top 10 auctions by current bid",
+    "how many bids did each user place",
+    "show the comments on auction 1",
+    "which users watch the most auctions",
+    "average starting bid per category",
+    "auctions created in the last 7 days",
+]
+
+REWORDINGS = [
+    str,
+    str.upper,
+    lambda q: f"Please {q}",
+    lambda q: f"{q}?",
+    lambda q: f"  {q}  ",
+    lambda q: f"Show me {q}.",
+    lambda q: f"{q} please",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=200, help="number of questions to replay")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds the stub LLM takes per call")
+    parser.add_argument("--max-entries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    client = StubClient(latency=args.latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SQLCache(os.path.join(tmp, "bench.sqlite3"), max_entries=args.max_entries)
+        hit_times, miss_times = [], []
+        for _ in range(args.questions):
+            question = rng.choice(REWORDINGS)(rng.choice(QUESTIONS))
+            calls = client.calls
+            started = time.perf_counter()
+            generate_sql(question, client, cache)
+            elapsed = time.perf_counter() - started
+            (miss_times if client.calls > calls else hit_times).append(elapsed)
+
+        stats = cache.stats()
+    print(f"questions:  {args.questions}")
+    print(f"LLM calls:  {client.calls}")
+    print(f"hit rate:   {stats['hit_rate']:.1%}")
+    if hit_times:
+        print(f"hit p50:    {statistics.median(hit_times) * 1000:.2f} ms")
+    if miss_times:
+        print(f"miss p50:   {statistics.median(miss_times) * 1000:.2f} ms")
+    total = sum(hit_times) + sum(miss_times)
+    print(f"total time: {total:.2f}s (uncached: {args.questions * args.latency:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Pooled MySQL access for the Streamlit app.
+
+One pool is shared by every Streamlit session of the process (the app keeps
+it in ``st.cache_resource``). Each query checks a connection out, pings it
+(reconnecting if the server dropped it), applies the statement timeout and
+hands it back to the pool afterwards.
+"""
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import pooling
+
+
+def create_pool(host, user, password, database, port=3306, size=5, connect_timeout=10):
+    return pooling.MySQLConnectionPool(
+        pool_name="nl2sql",
+        pool_size=size,
+        pool_reset_session=True,
+        host=host,
+        user=user,
+        password=password,
+        database=database,
+        port=int(port),
+        connection_timeout=connect_timeout,
+        autocommit=True,
+    )
+
+
+def _get_connection(pool, wait):
+    # mysql.connector raises PoolError at once when every connection is
+    # checked out, so poll until one is handed back or ``wait`` runs out
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            return pool.get_connection()
+        except mysql.connector.errors.PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+
+
+@contextmanager
+def checkout(pool, statement_timeout_ms=10000, wait=5.0):
+    """Borrow a live connection from ``pool`` for the duration of the block."""
+    conn = _get_connection(pool, wait)
+    try:
+        conn.ping(reconnect=True, attempts=2, delay=0)
+        with conn.cursor() as cursor:
+            # MySQL aborts SELECTs running longer than this (milliseconds)
+            cursor.execute("SET SESSION MAX_EXECUTION_TIME = %s", (int(statement_timeout_ms),))
+        yield conn
+    finally:
+        # for a pooled connection close() returns it to the pool
+        conn.close()
+
+
+# ``truncated`` is True when the statement returned more than ``max_rows`` rows
+ResultSet = namedtuple("ResultSet", ["columns", "rows", "truncated"])
+
+
+def read_rows(conn, sql, max_rows=None, chunk_size=1000):
+    """Run ``sql`` on ``conn`` and read at most ``max_rows`` rows, ``chunk_size`` at a time.
+
+    The cursor is unbuffered, so rows are pulled from the server chunk by chunk
+    instead of being materialized by the driver first, and reading stops at
+    the cap.
+    """
+    rows = []
+    truncated = False
+    with conn.cursor(buffered=False) as cursor:
+        cursor.execute(sql)
+        if not cursor.description:
+            return ResultSet([], [], False)
+        columns = [col[0] for col in cursor.description]
+        while True:
+            size = chunk_size if max_rows is None else min(chunk_size, max_rows + 1 - len(rows))
+            chunk = cursor.fetchmany(size)
+            if not chunk:
+                break
+            rows.extend(chunk)
+            if max_rows is not None and len(rows) > max_rows:
+                # one row past the cap tells there is more; the rest is
+                # drained unread so the connection can go back to the pool
+                del rows[max_rows:]
+                truncated = True
+                conn.consume_results()
+                break
+    return ResultSet(columns, rows, truncated)
+
+
+def fetch_rows(pool, sql, statement_timeout_ms=10000, max_rows=None, chunk_size=1000):
+    """``read_rows`` on a connection borrowed from ``pool``."""
+    with checkout(pool, statement_timeout_ms) as conn:
+        return read_rows(conn, sql, max_rows, chunk_size)
+
+
+def run_query(pool, sql, statement_timeout_ms=10000):
+    """Run ``sql`` on a pooled connection and return ``(columns, rows)``."""
+    columns, rows, _ = fetch_rows(pool, sql, statement_timeout_ms)
+    return columns, rows
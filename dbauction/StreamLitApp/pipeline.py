@@ -0,0 +1,132 @@
+"""Concurrent pipeline answering a batch of questions.
+
+Each question is turned into SQL and executed on a worker thread. At most
+``concurrency`` questions are in flight and at most ``execute_concurrency``
+statements run at once (no more than the connection pool holds). Transient
+failures are retried with exponential backoff and jitter. ``Pipeline.run``
+yields every answer as soon as it is ready, so the page can show the fast
+ones while the slow ones are still running.
+
+``generate`` and ``execute`` are plain callables, so the same pipeline runs
+against OpenAI and MySQL in the app, or against ``sqlgen.StubClient`` and a
+``SQLiteExecutor`` for offline testing (see bench_pipeline.py).
+"""
+import random
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import mysql.connector
+import openai
+
+import db
+import sqlguard
+
+# errors worth another attempt; bad SQL or a refused statement are not
+TRANSIENT_ERRORS = (
+    TimeoutError,
+    ConnectionError,
+    mysql.connector.errors.OperationalError,
+    mysql.connector.errors.InterfaceError,
+    mysql.connector.errors.PoolError,
+    openai.error.RateLimitError,
+    openai.error.Timeout,
+    openai.error.APIConnectionError,
+    openai.error.ServiceUnavailableError,
+    openai.error.TryAgain,
+)
+
+# ``index`` is the position of the question in the batch; ``error`` is the
+# exception that ended it, or None when ``result`` holds its rows; ``retries``
+# counts the extra attempts of both steps
+Answer = namedtuple(
+    "Answer",
+    ["index", "question", "sql", "result", "error", "retries", "generation_time", "execution_time"],
+)
+
+
+class Pipeline:
+    def __init__(self, generate, execute, concurrency=4, execute_concurrency=None,
+                 retries=2, backoff=0.5, transient=TRANSIENT_ERRORS):
+        self.generate = generate
+        self.execute = execute
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.transient = transient
+        self._executing = threading.BoundedSemaphore(execute_concurrency or concurrency)
+
+    def _attempt(self, call, arg, answer):
+        # re-raises once the retries are used up
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return call(arg)
+            except self.transient:
+                if attempt > self.retries:
+                    raise
+                answer["retries"] += 1
+                time.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+    def _execute(self, sql):
+        with self._executing:
+            return self.execute(sql)
+
+    def _answer(self, index, question):
+        answer = dict(index=index, question=question, sql=None, result=None, error=None, retries=0,
+                      generation_time=0.0, execution_time=0.0)
+        try:
+            started = time.perf_counter()
+            answer["sql"] = self._attempt(self.generate, question, answer)
+            answer["generation_time"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            answer["result"] = self._attempt(self._execute, answer["sql"], answer)
+            answer["execution_time"] = time.perf_counter() - started
+        except Exception as e:
+            answer["error"] = e
+        return Answer(**answer)
+
+    def run(self, questions):
+        """Yield an ``Answer`` for every question, in the order they finish."""
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="nl2sql") as pool:
+            futures = [pool.submit(self._answer, index, question) for index, question in enumerate(questions)]
+            for future in as_completed(futures):
+                yield future.result()
+
+
+class SQLiteExecutor:
+    """Stand-in for MySQL: runs guarded SELECTs on a read-only SQLite file.
+
+    The statement checks and the LIMIT are the same as for MySQL; SQLite has
+    no row estimates to pre-check. Each worker thread opens its own connection.
+    """
+
+    def __init__(self, path, max_rows=10000, chunk_size=1000, timeout=5.0):
+        self.path = path
+        self.max_rows = max_rows
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=self.timeout)
+        return conn
+
+    def __call__(self, sql):
+        statement = sqlguard.limit_statement(sqlguard.check_statement(sql), self.max_rows + 1)
+        cursor = self._connection().execute(statement)
+        columns = [col[0] for col in cursor.description] if cursor.description else []
+        rows = []
+        while len(rows) <= self.max_rows:
+            chunk = cursor.fetchmany(self.chunk_size)
+            if not chunk:
+                break
+            rows.extend(chunk)
+        cursor.close()
+        return db.ResultSet(columns, rows[:self.max_rows], len(rows) > self.max_rows)
@@ -0,0 +1,75 @@
+"""Short-lived in-process cache of query results, keyed by normalized SQL text.
+
+Entries expire after ``ttl`` seconds and the least recently used ones are
+evicted beyond ``max_entries``. Nothing else invalidates them: the app only
+reads, and the auction site writes from another process, so a cached result
+can be up to ``ttl`` seconds behind the database. ``clear()`` drops every
+entry at once.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# string literals and quoted identifiers are kept verbatim by normalize_sql
+_TOKEN = re.compile(r"""'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|`[^`]*`|\s+|[^'"`\s]+""", re.S)
+
+
+def normalize_sql(sql):
+    """Collapse whitespace outside literals and drop trailing semicolons."""
+    parts = []
+    for token in _TOKEN.findall(sql.strip()):
+        parts.append(" " if token.isspace() else token)
+    return "".join(parts).strip().rstrip(";").rstrip()
+
+
+class ResultCache:
+    def __init__(self, max_entries=64, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> (expires, result), oldest use first
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(sql, max_rows):
+        # the same statement read with a different row cap is another result
+        return (normalize_sql(sql), max_rows)
+
+    def get(self, sql, max_rows=None):
+        key = self.key(sql, max_rows)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, sql, result, max_rows=None):
+        key = self.key(sql, max_rows)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": size,
+        }
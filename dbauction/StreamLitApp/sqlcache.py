@@ -0,0 +1,65 @@
+"""Persistent key -> SQL cache on a local SQLite file, with TTL and LRU eviction."""
+import sqlite3
+import threading
+import time
+
+
+class SQLCache:
+    def __init__(self, path, max_entries=1000, ttl=7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # shared by every Streamlit session thread, hence the lock
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sql_cache ("
+            " key TEXT PRIMARY KEY,"
+            " sql TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sql_cache_last_used ON sql_cache (last_used)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT sql, created FROM sql_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM sql_cache WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE sql_cache SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, sql):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sql_cache (key, sql, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, sql, now, now),
+            )
+            # evict the least recently used entries beyond max_entries
+            self._db.execute(
+                "DELETE FROM sql_cache WHERE key IN ("
+                " SELECT key FROM sql_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM sql_cache")
+
+    def stats(self):
+        with self._lock:
+            size = self._db.execute("SELECT COUNT(*) FROM sql_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": size,
+        }
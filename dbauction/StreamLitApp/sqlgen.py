@@ -0,0 +1,207 @@
+"""Natural-language to SQL generation with a persistent result cache.
+
+``generate_sql`` looks the question up in a ``SQLCache`` first, keyed by the
+normalized question text, the model and the fingerprint of the schema, and
+only calls the LLM client on a miss. The prompt describes just the tables the
+question is routed to (see sqlschema.py). The client is any object
+with a ``complete(prompt) -> str`` method, so ``StubClient`` can stand in for
+OpenAI when benchmarking offline.
+"""
+import hashlib
+import random
+import re
+import threading
+import time
+
+from sqlschema import Schema
+
+# the application tables, used when the live database cannot be introspected
+SCHEMA = """
+CREATE TABLE dbapp_user (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    password VARCHAR(128) NOT NULL,
+    last_login DATETIME(6) NULL,
+    is_superuser BOOLEAN NOT NULL,
+    username VARCHAR(150) NOT NULL UNIQUE,
+    first_name VARCHAR(30) NOT NULL,
+    last_name VARCHAR(150) NOT NULL,
+    email VARCHAR(254) NOT NULL,
+    is_staff BOOLEAN NOT NULL,
+    is_active BOOLEAN NOT NULL,
+    date_joined DATETIME(6) NOT NULL
+);
+
+CREATE TABLE dbapp_category (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    title VARCHAR(64) NOT NULL
+);
+
+CREATE TABLE dbapp_auction (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    title VARCHAR(64) NOT NULL,
+    description TEXT NOT NULL,
+    starting_bid DECIMAL(9,2) DEFAULT 0.00 NOT NULL,
+    current_bid DECIMAL(9,2) DEFAULT 0.00 NOT NULL,
+    category_id INT NULL,
+    imageURL VARCHAR(2048) NULL,
+    seller_id INT NOT NULL,
+    closed BOOLEAN NOT NULL DEFAULT FALSE,
+    creation_date DATETIME(6) NOT NULL,
+    update_date DATETIME(6) NULL,
+    bid_count INT UNSIGNED NOT NULL DEFAULT 0,
+    highest_bidder_id INT NULL,
+    end_time DATETIME(6) NULL,
+    FOREIGN KEY (category_id) REFERENCES dbapp_category(id),
+    FOREIGN KEY (seller_id) REFERENCES dbapp_user(id),
+    FOREIGN KEY (highest_bidder_id) REFERENCES dbapp_user(id)
+);
+
+
+CREATE TABLE dbapp_bid (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    bider_id INT NOT NULL,
+    bid_date DATETIME(6) NOT NULL,
+    bid_price DECIMAL(9,2) NOT NULL,
+    auction_id INT NOT NULL,
+    FOREIGN KEY (bider_id) REFERENCES dbapp_user(id),
+    FOREIGN KEY (auction_id) REFERENCES dbapp_auction(id)
+);
+
+CREATE TABLE dbapp_comment (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    headline VARCHAR(64) NOT NULL,
+    message TEXT NOT NULL,
+    cm_date DATETIME(6) NOT NULL,
+    auction_id INT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES dbapp_user(id),
+    FOREIGN KEY (auction_id) REFERENCES dbapp_auction(id)
+);
+
+CREATE TABLE dbapp_watchlist (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL UNIQUE,
+    FOREIGN KEY (user_id) REFERENCES dbapp_user(id)
+);
+
+CREATE TABLE dbapp_watchlist_auctions (
+    watchlist_id INT NOT NULL,
+    auction_id INT NOT NULL,
+    PRIMARY KEY (watchlist_id, auction_id),
+    FOREIGN KEY (watchlist_id) REFERENCES dbapp_watchlist(id),
+    FOREIGN KEY (auction_id) REFERENCES dbapp_auction(id)
+);
+"""
+
+PROMPT_TEMPLATE = """
+        Given the following SQL tables, your job is to write queries given a user’s request.
+{schema}
+        User's request: "{query}"
+        SQL Query:
+    """
+
+# leading phrases that do not change what is being asked
+_FILLER = re.compile(r"^(?:(?:please|kindly|can you|could you|would you|show me|give me|tell me)\s+)+")
+
+
+def normalize_query(query):
+    """Reduce a question to a canonical form so trivial rewordings share a cache entry."""
+    text = query.lower().strip()
+    text = re.sub(r"[^\w\s%<>=.'-]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip(" .")
+    text = _FILLER.sub("", text)
+    text = re.sub(r"\s+please$", "", text)
+    return text
+
+
+_default_schema = None
+_default_schema_lock = threading.Lock()
+
+
+def default_schema():
+    """``SCHEMA`` parsed once per process."""
+    global _default_schema
+    with _default_schema_lock:
+        if _default_schema is None:
+            _default_schema = Schema.from_ddl(SCHEMA)
+        return _default_schema
+
+
+def cache_key(query, model, schema_version):
+    raw = f"{schema_version}\n{model}\n{normalize_query(query)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def build_prompt(query, schema_text):
+    return PROMPT_TEMPLATE.format(schema=schema_text, query=query)
+
+
+class OpenAICompletionClient:
+    """The OpenAI completions endpoint with the parameters the app has always used."""
+
+    def __init__(self, model="text-davinci-002"):
+        self.model = model
+
+    def complete(self, prompt):
+        import openai
+
+        response = openai.Completion.create(
+            engine=self.model,
+            prompt=prompt,
+            temperature=0,
+            max_tokens=150,
+            top_p=1.0,
+            frequency_penalty=0.0,
+            presence_penalty=0.0,
+            stop=["#", ";"]
+        )
+        return response.choices[0].text
+
+
+class StubClient:
+    """Offline stand-in for the LLM: waits ``latency`` seconds and returns a canned query.
+
+    With ``error_rate`` set, that share of calls raises ``TimeoutError`` after
+    the wait, to exercise retries.
+    """
+
+    model = "stub"
+
+    def __init__(self, latency=1.0, sql="SELECT id, title, current_bid FROM dbapp_auction WHERE closed = 0",
+                 error_rate=0.0, seed=None):
+        self.latency = latency
+        self.sql = sql
+        self.error_rate = error_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def complete(self, prompt):
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.error_rate
+        time.sleep(self.latency)
+        if fail:
+            raise TimeoutError("stub LLM timed out")
+        return self.sql
+
+
+def format_sql(text):
+    # Format the SQL query for better readability
+    formatted_sql = text.strip()
+    return formatted_sql.replace("\\n", "\n").replace("\\t", "\t")
+
+
+def generate_sql(query, client, cache=None, schema=None):
+    """Return SQL for ``query``, from ``cache`` when an equivalent question was seen."""
+    schema = schema or default_schema()
+    key = cache_key(query, client.model, schema.fingerprint)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    sql = format_sql(client.complete(build_prompt(query, schema.describe_for(query))))
+    if cache is not None and sql:
+        cache.put(key, sql)
+    return sql
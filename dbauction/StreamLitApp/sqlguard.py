@@ -0,0 +1,153 @@
+"""Guarded, read-only execution of generated SQL.
+
+Generated SQL runs against the database the auction site serves from, so
+before anything reaches it ``check_statement`` makes sure it is one plain
+SELECT, ``limit_statement`` caps the rows it can return, and
+``run_guarded`` asks the optimizer for its row estimate and refuses plans
+that would examine more than ``max_explain_rows``. What passes runs in a
+read-only transaction under the session's ``MAX_EXECUTION_TIME``.
+"""
+import re
+
+import db
+
+_TOKEN = re.compile(
+    r"""(?P<literal>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|`[^`]*`)"""
+    r"""|(?P<comment>/\*.*?\*/|--[ \t][^\n]*|--$|\#[^\n]*)"""
+    r"""|(?P<code>[^'"`/\-#]+|.)""",
+    re.S | re.M,
+)
+
+# what a statement starting with SELECT or WITH can still do besides reading:
+# write files or variables (INTO), take row locks, modify rows after a WITH
+# clause, or stall the server. INSERT() and REPLACE() are string functions.
+_FORBIDDEN = re.compile(
+    r"\b(?:into|for\s+update|for\s+share|lock\s+in\s+share\s+mode|update|delete)\b"
+    r"|\b(?:insert|replace)\b(?!\s*\()"
+    r"|\b(?:sleep|benchmark|get_lock|load_file)\s*\(",
+    re.I,
+)
+
+
+class GuardError(Exception):
+    """The statement is not allowed to run."""
+
+
+def _split(sql):
+    # ``clean`` drops comments (optimizer hints and /*! */ included) and
+    # ``masked`` also blanks literals so keywords inside strings are ignored
+    clean, masked = [], []
+    for match in _TOKEN.finditer(sql):
+        if match.group("literal"):
+            clean.append(match.group("literal"))
+            masked.append("''")
+        elif match.group("comment"):
+            clean.append(" ")
+            masked.append(" ")
+        else:
+            clean.append(match.group("code"))
+            masked.append(match.group("code"))
+    return "".join(clean).strip(), "".join(masked).strip()
+
+
+def check_statement(sql):
+    """Return ``sql`` without comments, or raise ``GuardError`` unless it is a single SELECT."""
+    clean, masked = _split(sql)
+    clean, masked = clean.rstrip("; \t\n"), masked.rstrip("; \t\n")
+    if not masked:
+        raise GuardError("The statement is empty.")
+    if ";" in masked:
+        raise GuardError("Only a single statement may run.")
+    if not re.match(r"(?:\(\s*)*(?:select|with)\b", masked, re.I):
+        raise GuardError("Only SELECT statements may run.")
+    forbidden = _FORBIDDEN.search(masked)
+    if forbidden:
+        raise GuardError(f"{forbidden.group(0).split('(')[0].strip().upper()} is not allowed in a query.")
+    return clean
+
+
+def _has_top_level_limit(masked):
+    for match in re.finditer(r"\blimit\b", masked, re.I):
+        before = masked[:match.start()]
+        if before.count("(") == before.count(")"):
+            return True
+    return False
+
+
+# a top-level LIMIT as MySQL writes it, at the end of the statement
+_TAIL_LIMIT = re.compile(r"\blimit\s+(\d+)(?:\s*,\s*(\d+))?(?:\s+offset\s+(\d+))?$", re.I)
+
+
+def limit_statement(sql, max_rows):
+    """Make ``sql`` return at most ``max_rows`` rows.
+
+    A statement without a LIMIT gets ``LIMIT max_rows``; one with a larger
+    LIMIT of its own has it lowered to ``max_rows``, so the server never
+    sends rows past the cap. Comments and trailing semicolons are dropped
+    first, so the LIMIT can never end up after them.
+    """
+    clean, masked = _split(sql)
+    clean, masked = clean.rstrip("; \t\n"), masked.rstrip("; \t\n")
+    max_rows = int(max_rows)
+    if not _has_top_level_limit(masked):
+        return f"{clean} LIMIT {max_rows}"
+    tail = _TAIL_LIMIT.search(clean)
+    if tail is None:
+        # a LIMIT this cannot read (a placeholder, say): cap it from outside
+        return f"SELECT * FROM ({clean}) AS limited LIMIT {max_rows}"
+    if tail.group(2) is not None:
+        # LIMIT offset, count
+        offset, count = tail.group(1), tail.group(2)
+    else:
+        count, offset = tail.group(1), tail.group(3)
+    limit = f"LIMIT {min(int(count), max_rows)}"
+    return clean[:tail.start()] + (f"{limit} OFFSET {offset}" if offset else limit)
+
+
+def estimate_rows(conn, sql):
+    """Rows the optimizer expects to examine for ``sql``.
+
+    Within one SELECT the tables are read as nested loops, so their row
+    estimates multiply; the SELECTs of a query (subqueries, unions) add up.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("EXPLAIN " + sql)
+        columns = [col[0] for col in cursor.description]
+        plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    per_select = {}
+    for step in plan:
+        rows = step.get("rows") or 1
+        per_select[step.get("id")] = per_select.get(step.get("id"), 1) * int(rows)
+    return sum(per_select.values())
+
+
+def run_guarded(pool, sql, statement_timeout_ms=10000, max_rows=10000, chunk_size=1000, max_explain_rows=1000000):
+    """Check, limit, pre-check and run ``sql``; return a ``db.ResultSet``."""
+    statement = limit_statement(check_statement(sql), max_rows + 1)
+    with db.checkout(pool, statement_timeout_ms) as conn:
+        estimate = estimate_rows(conn, statement)
+        if estimate > max_explain_rows:
+            raise GuardError(
+                f"The query would examine about {estimate:,} rows, over the limit of {max_explain_rows:,}."
+            )
+        with conn.cursor() as cursor:
+            cursor.execute("START TRANSACTION READ ONLY")
+        try:
+            result = db.read_rows(conn, statement, max_rows, chunk_size)
+        except BaseException:
+            _rollback(conn, quiet=True)
+            raise
+        _rollback(conn)
+        return result
+
+
+def _rollback(conn, quiet=False):
+    # with ``quiet`` a failed ROLLBACK (the connection is likely gone) must
+    # not hide the error that got us here; the pool pings it before reuse
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("ROLLBACK")
+    except Exception:
+        if not quiet:
+            raise
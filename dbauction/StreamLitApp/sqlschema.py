@@ -0,0 +1,196 @@
+"""Schema description given to the SQL generator.
+
+The schema is read once from the live database's ``information_schema``
+(``introspect``), or parsed from ``CREATE TABLE`` text as an offline fallback
+(``Schema.from_ddl``). Each table is rendered as one compact line. For every
+question only the tables it is about are put in the prompt (``Schema.route``),
+so a short question does not pay for the whole schema in prompt tokens.
+``Schema.fingerprint`` hashes the full description and changes whenever the
+schema does, which keeps cached SQL from outliving the schema it was written
+for.
+"""
+import hashlib
+import re
+import threading
+from collections import namedtuple
+
+# ``references`` is "table(column)" for a foreign key, else None
+Column = namedtuple("Column", ["name", "type", "primary_key", "references"])
+Table = namedtuple("Table", ["name", "columns"])
+
+# question words that mean a table without naming it, mapped to a word of its name
+SYNONYMS = {
+    "seller": "user", "bidder": "user", "buyer": "user", "winner": "user",
+    "people": "user", "person": "user", "member": "user", "customer": "user",
+    "item": "auction", "listing": "auction", "lot": "auction", "product": "auction",
+    "offer": "bid", "review": "comment", "watch": "watchlist", "watching": "watchlist",
+    "watched": "watchlist", "watcher": "watchlist", "type": "category", "kind": "category",
+}
+
+# column name parts too generic to say which table a question is about
+_GENERIC = {"id", "date", "is", "of"}
+
+_COLUMNS_SQL = (
+    "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, COLUMN_KEY"
+    " FROM information_schema.COLUMNS"
+    " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME LIKE '{prefix}%'"
+    " ORDER BY TABLE_NAME, ORDINAL_POSITION"
+)
+_FOREIGN_KEYS_SQL = (
+    "SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME"
+    " FROM information_schema.KEY_COLUMN_USAGE"
+    " WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL"
+)
+
+
+def _stem(word):
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def _words(name, prefix=""):
+    if prefix and name.startswith(prefix):
+        name = name[len(prefix):]
+    return {_stem(part) for part in re.split(r"[_\W]+", name.lower()) if part}
+
+
+def _split_top_level(body):
+    # split on commas that are not inside parentheses, e.g. not DECIMAL(9,2)
+    parts, depth, current = [], 0, []
+    for char in body:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current).strip())
+    return [part for part in parts if part]
+
+
+class Schema:
+    def __init__(self, tables, prefix="dbapp_"):
+        self.tables = {table.name: table for table in tables}
+        self.prefix = prefix
+        self._lines = {table.name: self._render(table) for table in tables}
+        self.fingerprint = hashlib.sha256(self.describe().encode("utf-8")).hexdigest()[:16]
+        # link tables (only keys, like the many-to-many watchlist_auctions) are
+        # never routed to by themselves but join the tables they link
+        self._links = {
+            name: {c.references.split("(")[0] for c in table.columns if c.references}
+            for name, table in self.tables.items()
+            if sum(1 for c in table.columns if c.references) >= 2
+            and all(c.references or c.name == "id" for c in table.columns)
+        }
+        self._routing = {
+            name: self._routing_words(table) for name, table in self.tables.items() if name not in self._links
+        }
+        self._lock = threading.Lock()
+        self._described = {}
+
+    @classmethod
+    def from_ddl(cls, ddl, prefix="dbapp_"):
+        """Parse the ``CREATE TABLE`` statements of ``ddl``."""
+        tables = []
+        for name, body in re.findall(r"CREATE TABLE\s+`?(\w+)`?\s*\((.*?)\)\s*;", ddl, re.S | re.I):
+            columns, primary, references = [], set(), {}
+            for part in _split_top_level(body):
+                match = re.match(r"PRIMARY KEY\s*\(([^)]*)\)", part, re.I)
+                if match:
+                    primary.update(col.strip(" `") for col in match.group(1).split(","))
+                    continue
+                match = re.match(r"FOREIGN KEY\s*\(`?(\w+)`?\)\s*REFERENCES\s+`?(\w+)`?\s*\(`?(\w+)`?\)", part, re.I)
+                if match:
+                    references[match.group(1)] = f"{match.group(2)}({match.group(3)})"
+                    continue
+                match = re.match(r"`?(\w+)`?\s+(\w+(?:\([^)]*\))?(?:\s+UNSIGNED)?)", part, re.I)
+                if match:
+                    if re.search(r"\bPRIMARY KEY\b", part, re.I):
+                        primary.add(match.group(1))
+                    columns.append((match.group(1), match.group(2).lower()))
+            tables.append(Table(name, [
+                Column(col, type_, col in primary, references.get(col)) for col, type_ in columns
+            ]))
+        return cls(tables, prefix)
+
+    @staticmethod
+    def _render(table):
+        columns = []
+        for column in table.columns:
+            text = f"{column.name} {column.type}"
+            if column.primary_key:
+                text += " PRIMARY KEY"
+            if column.references:
+                text += f" REFERENCES {column.references}"
+            columns.append(text)
+        return f"CREATE TABLE {table.name} ({', '.join(columns)});"
+
+    def _routing_words(self, table):
+        words = _words(table.name, self.prefix)
+        for column in table.columns:
+            if column.references:
+                # seller_id says something about its table, auction_id does not
+                referenced = _words(column.references.split("(")[0], self.prefix)
+                words |= _words(column.name) - referenced
+            else:
+                words |= _words(column.name)
+        return words - _GENERIC
+
+    def route(self, question):
+        """Names of the tables ``question`` is about, in schema order.
+
+        A table is picked when a word of the question (or its synonym) matches
+        a word of its name or column names. Link tables joining two picked
+        tables come along. Every table is returned when nothing matches.
+        """
+        asked = set()
+        for word in re.findall(r"[a-z]+", question.lower()):
+            word = _stem(word)
+            asked.add(word)
+            if word in SYNONYMS:
+                asked.add(SYNONYMS[word])
+
+        picked = {name for name, words in self._routing.items() if words & asked}
+        if not picked:
+            return list(self.tables)
+        for name, targets in self._links.items():
+            if len(targets & picked) >= 2:
+                picked.add(name)
+        return [name for name in self.tables if name in picked]
+
+    def describe(self, names=None):
+        """Schema text for the prompt, limited to ``names`` when given."""
+        if names is None:
+            return "\n".join(self._lines.values())
+        key = tuple(names)
+        with self._lock:
+            text = self._described.get(key)
+            if text is None:
+                text = self._described[key] = "\n".join(self._lines[name] for name in key)
+        return text
+
+    def describe_for(self, question):
+        return self.describe(self.route(question))
+
+
+def introspect(pool, prefix="dbapp_"):
+    """Read the tables whose name starts with ``prefix`` from the live database."""
+    import db
+
+    like = prefix.replace("_", "\\\\_")
+    _, columns = db.run_query(pool, _COLUMNS_SQL.format(prefix=like))
+    _, foreign_keys = db.run_query(pool, _FOREIGN_KEYS_SQL)
+    references = {(table, column): f"{ref_table}({ref_column})" for table, column, ref_table, ref_column in foreign_keys}
+
+    tables = {}
+    for table, column, column_type, key in columns:
+        tables.setdefault(table, []).append(
+            Column(column, column_type, key == "PRI", references.get((table, column)))
+        )
+    return Schema([Table(name, cols) for name, cols in tables.items()], prefix)
@@ -0,0 +1,392 @@
+"""Offline tests of the Streamlit app's modules, with MySQL and the model stubbed out.
+
+Run from this directory: ``python -m unittest tests``.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import mysql.connector
+
+import db
+import sqlgen
+import sqlguard
+import sqlschema
+from pipeline import Pipeline, SQLiteExecutor
+from resultcache import ResultCache, normalize_sql
+from sqlcache import SQLCache
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append(sql if params is None else (sql, params))
+        result = self.conn.results.get(sql)
+        if isinstance(result, Exception):
+            raise result
+        if result is not None:
+            columns, rows = result
+            self.description = [(column,) for column in columns]
+            self._rows = list(rows)
+
+    def fetchmany(self, size):
+        chunk, self._rows = self._rows[:size], self._rows[size:]
+        self.conn.fetched.append(len(chunk))
+        return chunk
+
+    def fetchall(self):
+        return self.fetchmany(len(self._rows))
+
+
+class FakeConnection:
+    """A mysql.connector connection that answers the statements in ``results``."""
+
+    def __init__(self, pool=None, results=None):
+        self.pool = pool
+        self.results = results or {}
+        self.executed = []
+        self.fetched = []
+        self.pings = 0
+        self.consumed = False
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self.pings += 1
+
+    def cursor(self, buffered=None):
+        return FakeCursor(self)
+
+    def consume_results(self):
+        self.consumed = True
+
+    def close(self):
+        # a pooled connection goes back to its pool
+        if self.pool is not None:
+            self.pool.idle.append(self)
+
+
+class FakePool:
+    def __init__(self, size=1, results=None):
+        self.idle = [FakeConnection(self, results) for _ in range(size)]
+
+    def get_connection(self):
+        if not self.idle:
+            raise mysql.connector.errors.PoolError("Failed getting connection; pool exhausted")
+        return self.idle.pop()
+
+
+class PoolTests(unittest.TestCase):
+    def test_checkout_returns_the_connection(self):
+        pool = FakePool()
+        with db.checkout(pool, statement_timeout_ms=2500) as conn:
+            self.assertEqual(pool.idle, [])
+            self.assertEqual(conn.pings, 1)
+            self.assertEqual(conn.executed, [("SET SESSION MAX_EXECUTION_TIME = %s", (2500,))])
+        self.assertEqual(pool.idle, [conn])
+
+        # also when the block fails
+        with self.assertRaises(ZeroDivisionError):
+            with db.checkout(pool):
+                1 / 0
+        self.assertEqual(pool.idle, [conn])
+
+    def test_checkout_waits_for_a_connection(self):
+        pool = FakePool()
+        conn = pool.get_connection()
+        with self.assertRaises(mysql.connector.errors.PoolError):
+            with db.checkout(pool, wait=0):
+                pass
+
+        threading.Timer(0.1, conn.close).start()
+        started = time.monotonic()
+        with db.checkout(pool, wait=5) as borrowed:
+            self.assertIs(borrowed, conn)
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+
+    def test_rows_are_read_in_chunks_up_to_the_cap(self):
+        pool = FakePool(results={"SELECT id FROM t": (["id"], [(i,) for i in range(10)])})
+        result = db.fetch_rows(pool, "SELECT id FROM t", max_rows=4, chunk_size=3)
+        self.assertEqual(result, db.ResultSet(["id"], [(0,), (1,), (2,), (3,)], True))
+        conn = pool.idle[0]
+        # one row past the cap says there is more, and the rest is never fetched
+        self.assertEqual(conn.fetched, [3, 2])
+        self.assertTrue(conn.consumed)
+        self.assertEqual(db.run_query(pool, "SELECT id FROM t"), (["id"], [(i,) for i in range(10)]))
+
+
+class SQLCacheTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = SQLCache(os.path.join(directory.name, "cache.sqlite3"), max_entries=2, ttl=60)
+
+    def test_rewordings_share_a_key(self):
+        same = ["Show me all open auctions", "  please show me ALL open auctions? ", "all open auctions, please."]
+        self.assertEqual({sqlgen.normalize_query(question) for question in same}, {"all open auctions"})
+        # comparisons and literals are part of the question
+        self.assertEqual(sqlgen.normalize_query("Bids >= 10 by 'Ann'"), "bids >= 10 by 'ann'")
+        self.assertNotEqual(sqlgen.normalize_query("bids > 10"), sqlgen.normalize_query("bids < 10"))
+
+        key = sqlgen.cache_key(same[0], "stub", "v1")
+        self.assertEqual(sqlgen.cache_key(same[1], "stub", "v1"), key)
+        self.assertNotEqual(sqlgen.cache_key(same[0], "other-model", "v1"), key)
+        self.assertNotEqual(sqlgen.cache_key(same[0], "stub", "v2"), key)
+
+    def test_generate_sql_calls_the_model_once_per_question(self):
+        client = sqlgen.StubClient(latency=0)
+        schema = sqlgen.default_schema()
+        self.assertEqual(sqlgen.generate_sql("Show me all open auctions", client, self.cache, schema), client.sql)
+        self.assertEqual(sqlgen.generate_sql("all open auctions please", client, self.cache, schema), client.sql)
+        self.assertEqual(client.calls, 1)
+
+        # SQL written for another schema is not reused
+        other = sqlgen.Schema.from_ddl("CREATE TABLE dbapp_auction (id INT PRIMARY KEY, title TEXT);")
+        sqlgen.generate_sql("all open auctions", client, self.cache, other)
+        self.assertEqual(client.calls, 2)
+
+    def test_entries_expire_and_least_recently_used_go_first(self):
+        for key in ("a", "b"):
+            self.cache.put(key, f"SELECT '{key}'")
+        self.assertEqual(self.cache.get("a"), "SELECT 'a'")
+        self.cache.put("c", "SELECT 'c'")
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), "SELECT 'a'")
+
+        with mock.patch("sqlcache.time.time", return_value=time.time() + 61):
+            self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats()["entries"], 1)
+
+
+class ResultCacheTests(unittest.TestCase):
+    def test_keyed_by_normalized_sql_and_row_cap(self):
+        self.assertEqual(normalize_sql("SELECT  id\n FROM t WHERE s = 'a  b';; "), "SELECT id FROM t WHERE s = 'a  b'")
+        cache = ResultCache()
+        cache.put("SELECT id FROM t", "rows", max_rows=10)
+        self.assertEqual(cache.get("  SELECT id\n\tFROM t ;", max_rows=10), "rows")
+        self.assertIsNone(cache.get("SELECT id FROM t", max_rows=20))
+        # literals are compared as written
+        cache.put("SELECT id FROM t WHERE s = 'a  b'", "spaced")
+        self.assertIsNone(cache.get("SELECT id FROM t WHERE s = 'a b'"))
+
+    def test_entries_expire(self):
+        cache = ResultCache(ttl=60)
+        cache.put("SELECT 1", "one")
+        with mock.patch("resultcache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get("SELECT 1"))
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 1, "hit_rate": 0.0, "entries": 0})
+
+    def test_least_recently_used_are_evicted(self):
+        cache = ResultCache(max_entries=2)
+        cache.put("SELECT 1", "one")
+        cache.put("SELECT 2", "two")
+        cache.get("SELECT 1")
+        cache.put("SELECT 3", "three")
+        self.assertEqual([cache.get(f"SELECT {n}") for n in (1, 2, 3)], ["one", None, "three"])
+        cache.clear()
+        self.assertEqual(cache.stats()["entries"], 0)
+
+
+class SchemaTests(unittest.TestCase):
+    def setUp(self):
+        self.schema = sqlgen.default_schema()
+
+    def test_parsed_from_ddl(self):
+        auction = {column.name: column for column in self.schema.tables["dbapp_auction"].columns}
+        self.assertEqual(auction["starting_bid"].type, "decimal(9,2)")
+        self.assertEqual(auction["seller_id"].references, "dbapp_user(id)")
+        self.assertTrue(auction["id"].primary_key)
+        link = self.schema.tables["dbapp_watchlist_auctions"].columns
+        self.assertEqual([column.primary_key for column in link], [True, True])
+
+    def test_questions_get_only_their_tables(self):
+        self.assertEqual(self.schema.route("Which seller has the most auctions?"), ["dbapp_user", "dbapp_auction"])
+        self.assertEqual(self.schema.route("bids over 100 on closed items"), ["dbapp_auction", "dbapp_bid"])
+        # the link table comes along with both of the tables it joins
+        self.assertEqual(self.schema.route("Which users watched the most auctions?"),
+                         ["dbapp_user", "dbapp_auction", "dbapp_watchlist", "dbapp_watchlist_auctions"])
+        self.assertEqual(self.schema.route("hello there"), list(self.schema.tables))
+        self.assertEqual(self.schema.describe_for("list every category"),
+                         "CREATE TABLE dbapp_category (id int PRIMARY KEY, title varchar(64));")
+
+    def test_introspected_schema(self):
+        columns = [
+            ("dbapp_category", "id", "int", "PRI"), ("dbapp_category", "title", "varchar(64)", ""),
+            ("dbapp_auction", "id", "int", "PRI"), ("dbapp_auction", "category_id", "int", "MUL"),
+        ]
+        foreign_keys = [("dbapp_auction", "category_id", "dbapp_category", "id")]
+        with mock.patch("db.run_query", side_effect=[(None, columns), (None, foreign_keys)]):
+            schema = sqlschema.introspect(pool=None)
+        self.assertEqual(schema.describe(), "CREATE TABLE dbapp_category (id int PRIMARY KEY, title varchar(64));\n"
+                                            "CREATE TABLE dbapp_auction (id int PRIMARY KEY, category_id int "
+                                            "REFERENCES dbapp_category(id));")
+        # a changed schema gets a new fingerprint, and so new SQL cache keys
+        self.assertNotEqual(schema.fingerprint, self.schema.fingerprint)
+
+
+class GuardTests(unittest.TestCase):
+    def assertRefused(self, sql, reason):
+        with self.assertRaisesRegex(sqlguard.GuardError, reason):
+            sqlguard.check_statement(sql)
+
+    def test_only_one_plain_select(self):
+        self.assertRefused("SELECT 1; DROP TABLE dbapp_user", "single statement")
+        self.assertRefused("SELECT 1;\nSELECT 2", "single statement")
+        self.assertRefused("", "empty")
+        self.assertRefused("-- nothing", "empty")
+        for sql in ("DELETE FROM dbapp_bid", "UPDATE dbapp_auction SET closed = 1", "DROP TABLE dbapp_bid",
+                    "INSERT INTO dbapp_bid VALUES (1)", "TRUNCATE dbapp_bid", "SET @a = 1", "CALL p()"):
+            with self.subTest(sql=sql):
+                self.assertRefused(sql, "Only SELECT")
+        self.assertRefused("WITH b AS (SELECT 1) DELETE FROM dbapp_bid", "DELETE is not allowed")
+
+    def test_no_writes_or_locks_from_a_select(self):
+        self.assertRefused("SELECT * FROM dbapp_user INTO OUTFILE '/tmp/users'", "INTO is not allowed")
+        self.assertRefused("SELECT password INTO @secret FROM dbapp_user", "INTO is not allowed")
+        self.assertRefused("SELECT * FROM dbapp_auction FOR UPDATE", "FOR UPDATE is not allowed")
+        self.assertRefused("SELECT * FROM dbapp_auction FOR  SHARE", "FOR  SHARE is not allowed")
+        self.assertRefused("SELECT * FROM dbapp_auction LOCK IN SHARE MODE", "LOCK IN SHARE MODE is not allowed")
+        self.assertRefused("SELECT SLEEP(10)", "SLEEP is not allowed")
+        self.assertRefused("SELECT BENCHMARK(1000000, MD5('x'))", "BENCHMARK is not allowed")
+
+    def test_comments_hide_nothing(self):
+        # MySQL runs the body of a /*! */ comment, so comments are dropped, not trusted
+        self.assertEqual(sqlguard.check_statement("/*!50000 DELETE FROM dbapp_bid */ SELECT 1"), "SELECT 1")
+        self.assertRefused("SELECT 1 /*!50000 ; DROP TABLE dbapp_bid */ FOR UPDATE", "FOR UPDATE")
+        self.assertRefused("SELECT 1 FOR/* */UPDATE", "FOR UPDATE")
+        self.assertRefused("SEL/**/ECT 1", "Only SELECT")
+        self.assertEqual(sqlguard.check_statement("SELECT 1 -- ; DROP TABLE dbapp_bid"), "SELECT 1")
+        self.assertEqual(sqlguard.check_statement("SELECT 1 # ; DROP TABLE dbapp_bid\n;"), "SELECT 1")
+        # keywords inside strings are data
+        self.assertEqual(sqlguard.check_statement("SELECT 'a; DELETE' AS x, REPLACE(title, 'a', 'b') FROM t"),
+                         "SELECT 'a; DELETE' AS x, REPLACE(title, 'a', 'b') FROM t")
+
+    def test_limit(self):
+        self.assertEqual(sqlguard.limit_statement("SELECT id FROM t", 10), "SELECT id FROM t LIMIT 10")
+        self.assertEqual(sqlguard.limit_statement("SELECT id FROM t;  ", 10), "SELECT id FROM t LIMIT 10")
+        self.assertEqual(sqlguard.limit_statement("SELECT id FROM t -- last", 10), "SELECT id FROM t LIMIT 10")
+        self.assertEqual(sqlguard.limit_statement("SELECT id FROM t LIMIT 5;", 10), "SELECT id FROM t LIMIT 5")
+        # a LIMIT over the cap is lowered to it, keeping its offset
+        self.assertEqual(sqlguard.limit_statement("SELECT id FROM t LIMIT 1000000", 10), "SELECT id FROM t LIMIT 10")
+        self.assertEqual(sqlguard.limit_statement("SELECT id FROM t limit 20, 1000000", 10),
+                         "SELECT id FROM t LIMIT 10 OFFSET 20")
+        self.assertEqual(sqlguard.limit_statement("SELECT id FROM t LIMIT 1000000 OFFSET 3", 10),
+                         "SELECT id FROM t LIMIT 10 OFFSET 3")
+        self.assertEqual(sqlguard.limit_statement("SELECT id FROM t LIMIT ?", 10),
+                         "SELECT * FROM (SELECT id FROM t LIMIT ?) AS limited LIMIT 10")
+        # a LIMIT inside a subquery or a string does not limit the result
+        self.assertEqual(sqlguard.limit_statement("SELECT * FROM (SELECT id FROM t LIMIT 5) s", 10),
+                         "SELECT * FROM (SELECT id FROM t LIMIT 5) s LIMIT 10")
+        self.assertEqual(sqlguard.limit_statement("SELECT 'limit 5'", 10), "SELECT 'limit 5' LIMIT 10")
+
+    def test_run_guarded(self):
+        statement = "SELECT id FROM t LIMIT 3"
+        results = {"EXPLAIN " + statement: (["id", "rows"], [(1, 40), (1, 50), (2, 7)]),
+                   statement: (["id"], [(1,), (2,), (3,)])}
+        pool = FakePool(results=results)
+        self.assertEqual(sqlguard.run_guarded(pool, "SELECT id FROM t;", max_rows=2),
+                         db.ResultSet(["id"], [(1,), (2,)], True))
+        conn = pool.idle[0]
+        self.assertEqual(conn.executed[1:], ["EXPLAIN " + statement, "START TRANSACTION READ ONLY", statement,
+                                             "ROLLBACK"])
+        with self.assertRaisesRegex(sqlguard.GuardError, "about 2,007 rows"):
+            sqlguard.run_guarded(pool, "SELECT id FROM t", max_rows=2, max_explain_rows=2000)
+
+    def test_failed_rollback_does_not_hide_the_error(self):
+        statement = "SELECT id FROM t LIMIT 3"
+        lost = mysql.connector.errors.OperationalError("Lost connection to MySQL server during query")
+        pool = FakePool(results={"EXPLAIN " + statement: (["id", "rows"], [(1, 1)]),
+                                 statement: lost,
+                                 "ROLLBACK": mysql.connector.errors.OperationalError("MySQL server has gone away")})
+        with self.assertRaises(mysql.connector.errors.OperationalError) as raised:
+            sqlguard.run_guarded(pool, statement, max_rows=2)
+        self.assertIs(raised.exception, lost)
+        self.assertEqual(pool.idle[0].executed[-1], "ROLLBACK")
+
+
+class Flaky:
+    """Fails with each of ``errors`` in turn, then returns ``value``."""
+
+    def __init__(self, value, *errors):
+        self.value = value
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, arg):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.value
+
+
+class PipelineTests(unittest.TestCase):
+    def run_one(self, generate, execute, retries=2):
+        answers = list(Pipeline(generate, execute, retries=retries, backoff=0).run(["all auctions"]))
+        self.assertEqual(len(answers), 1)
+        return answers[0]
+
+    def test_transient_failures_are_retried(self):
+        generate = Flaky("SELECT 1", TimeoutError("model timed out"))
+        execute = Flaky("rows", mysql.connector.errors.OperationalError("Lost connection"))
+        answer = self.run_one(generate, execute)
+        self.assertEqual((answer.sql, answer.result, answer.error, answer.retries), ("SELECT 1", "rows", None, 2))
+
+    def test_an_answer_gives_up_after_its_retries(self):
+        error = TimeoutError("still down")
+        answer = self.run_one(Flaky("SELECT 1"), Flaky("rows", TimeoutError(), TimeoutError(), error), retries=2)
+        self.assertIs(answer.error, error)
+        self.assertEqual((answer.sql, answer.result, answer.retries), ("SELECT 1", None, 2))
+
+    def test_other_errors_are_not_retried(self):
+        execute = Flaky("rows", sqlguard.GuardError("Only SELECT statements may run."))
+        answer = self.run_one(Flaky("DELETE FROM t"), execute)
+        self.assertIsInstance(answer.error, sqlguard.GuardError)
+        self.assertEqual((execute.calls, answer.retries), (1, 0))
+
+    def test_statements_in_flight_are_capped(self):
+        running, most = [0], [0]
+        lock = threading.Lock()
+
+        def execute(sql):
+            with lock:
+                running[0] += 1
+                most[0] = max(most[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return sql
+
+        pipeline = Pipeline(lambda question: question, execute, concurrency=6, execute_concurrency=2)
+        answers = list(pipeline.run([f"SELECT {n}" for n in range(12)]))
+        self.assertEqual(sorted(answer.index for answer in answers), list(range(12)))
+        self.assertEqual(most[0], 2)
+
+    def test_sqlite_executor_runs_guarded_selects(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "offline.sqlite3")
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE t (id INTEGER)")
+            conn.executemany("INSERT INTO t VALUES (?)", [(n,) for n in range(5)])
+        conn.close()
+
+        execute = SQLiteExecutor(path, max_rows=3, chunk_size=2)
+        self.assertEqual(execute("SELECT id FROM t ORDER BY id;"), db.ResultSet(["id"], [(0,), (1,), (2,)], True))
+        answer = self.run_one(Flaky("DELETE FROM t"), execute)
+        self.assertIsInstance(answer.error, sqlguard.GuardError)
+
+
+if __name__ == "__main__":
+    unittest.main()
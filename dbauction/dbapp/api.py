@@ -0,0 +1,172 @@
+"""Read-only JSON API for the mobile client and partners (``/api/...``).
+
+Rows are read with ``values()`` and serialized as they are, without building
+model instances. Responses carry an ETag, and those of one auction a
+Last-Modified, taken from ``Auction.update_date``, which every bid and close
+moves; a client polling an unchanged resource gets an empty 304 back. Bodies
+are gzipped for clients that accept it.
+"""
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_safe
+
+from .bidhistory import HISTORY_KEYS, MAX_SUMMARY_BUCKETS, bid_history, price_summary
+from .models import Auction
+from .pagination import InvalidCursor, paginate
+from .search import SEARCH_KEYS, STATUSES
+from .search import search as search_auctions
+
+# columns of an auction in lists
+AUCTION_API_FIELDS = ("id", "title", "current_bid", "bid_count", "closed", "imageURL", "category_id", "creation_date", "update_date",
+                      "end_time")
+# and on its own
+AUCTION_DETAIL_API_FIELDS = AUCTION_API_FIELDS + (
+    "description", "starting_bid", "category__title", "seller__username", "highest_bidder__username")
+BID_API_FIELDS = ("id", "bid_price", "bid_date", "bider__username")
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, encoder=DjangoJSONEncoder,
+                        json_dumps_params={"separators": (",", ":")})
+
+
+def error(status, message):
+    return json_response({"error": message}, status=status)
+
+
+def bad_cursor(view):
+    """Answer a malformed ``after``/``before`` cursor with a 400 instead of a 500."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except InvalidCursor:
+            return error(400, "after and before must be cursors from a previous page.")
+    return wrapper
+
+
+def page_response(page):
+    return json_response({"results": page.object_list, "next": page.next_cursor, "previous": page.previous_cursor})
+
+
+def conditional(request, version, last_modified, build):
+    """Return 304 if the client's copy matches ``version``, otherwise ``build()``.
+
+    ``version`` is a tuple of whatever changes with the resource; it becomes
+    the ETag. ``build`` is only called when the body is actually needed.
+    """
+    etag = quote_etag(hashlib.md5(repr(version).encode()).hexdigest())
+    timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = build()
+    response["ETag"] = etag
+    if timestamp is not None:
+        response["Last-Modified"] = http_date(timestamp)
+    # clients may keep the body but must check it is current every time
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+@gzip_page
+@require_safe
+@bad_cursor
+def auctions(request):
+    queryset = Auction.objects.active()
+    category = request.GET.get("category")
+    if category:
+        if not category.isdigit():
+            return error(400, "category must be a category id.")
+        queryset = queryset.filter(category=category)
+
+    # the tag comes from the page itself, one LIMIT read of the index it is
+    # walked by: a bid or an edit moves a row's update_date, a new, closed or
+    # deleted listing the ids or the neighbouring pages. No Last-Modified: a
+    # close can take the newest date off the page, which would tell a client
+    # holding the closed auction its list is current
+    page = paginate(request, queryset.values(*AUCTION_API_FIELDS), ("-creation_date", "-id"), strict=True)
+    version = [(row["id"], row["update_date"]) for row in page.object_list]
+    return conditional(
+        request, ("auctions", category, version, page.next_cursor, page.previous_cursor), None,
+        lambda: page_response(page),
+    )
+
+
+@gzip_page
+@require_safe
+def auction(request, auction_id):
+    row = Auction.objects.filter(pk=auction_id).values(*AUCTION_DETAIL_API_FIELDS).first()
+    if row is None:
+        return error(404, "The auction does not exist.")
+    return conditional(request, ("auction", auction_id, row["update_date"]), row["update_date"], lambda: json_response(row))
+
+
+@gzip_page
+@require_safe
+@bad_cursor
+def bids(request, auction_id):
+    auction = Auction.objects.filter(pk=auction_id).values("update_date", "bid_count").first()
+    if auction is None:
+        return error(404, "The auction does not exist.")
+    return conditional(
+        request, ("bids", auction_id, auction["update_date"], auction["bid_count"]), auction["update_date"],
+        lambda: page_response(paginate(request, bid_history(auction_id).values(*BID_API_FIELDS), HISTORY_KEYS, strict=True)),
+    )
+
+
+@gzip_page
+@require_safe
+def bid_summary(request, auction_id):
+    buckets = request.GET.get("buckets", "100")
+    if not buckets.isdigit() or not 1 <= int(buckets) <= MAX_SUMMARY_BUCKETS:
+        return error(400, f"buckets must be between 1 and {MAX_SUMMARY_BUCKETS}.")
+    auction = Auction.objects.filter(pk=auction_id).values("update_date", "bid_count").first()
+    if auction is None:
+        return error(404, "The auction does not exist.")
+    return conditional(
+        request, ("bid_summary", auction_id, buckets, auction["update_date"], auction["bid_count"]), auction["update_date"],
+        lambda: json_response({"buckets": price_summary(auction_id, auction["bid_count"], int(buckets))}),
+    )
+
+
+@gzip_page
+@require_safe
+@bad_cursor
+def watchlist(request):
+    if not request.user.is_authenticated:
+        return error(401, "Sign in to see your watchlist.")
+
+    auctions = Auction.objects.filter(auctions_in_watchlist__user=request.user).values(*AUCTION_API_FIELDS)
+    response = page_response(paginate(request, auctions, ("-id",), strict=True))
+    # adding or removing an auction moves no update_date, so the tag comes from
+    # the body itself: this saves the transfer, not the query
+    response = conditional(request, ("watchlist", response.content), None, lambda: response)
+    patch_cache_control(response, private=True)
+    return response
+
+
+@gzip_page
+@require_safe
+@bad_cursor
+def search(request):
+    text = request.GET.get("q", "").strip()
+    category = request.GET.get("category") or None
+    status = request.GET.get("status") or "open"
+    if not text:
+        return error(400, "q must hold the words to search for.")
+    if category is not None and not category.isdigit():
+        return error(400, "category must be a category id.")
+    if status not in STATUSES:
+        return error(400, f"status must be one of {', '.join(STATUSES)}.")
+
+    auctions = search_auctions(text, category, status).values(*AUCTION_API_FIELDS, "score")
+    response = page_response(paginate(request, auctions, SEARCH_KEYS, strict=True))
+    # as for the watchlist, the tag comes from the body
+    return conditional(request, ("search", response.content), None, lambda: response)
@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class DbappConfig(AppConfig):
     name = 'dbapp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .profiling import install_query_recorder
+        from .search import repair_index
+
+        # let the profiling middleware see every query, whichever thread runs it
+        connection_created.connect(install_query_recorder, dispatch_uid="dbapp.profiling")
+        post_migrate.connect(repair_index, sender=self, dispatch_uid="dbapp.search")
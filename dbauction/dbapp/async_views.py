@@ -0,0 +1,148 @@
+"""Async versions of the hot read views, routed instead of the ones in views.py
+when ``ASYNC_VIEWS`` is on (it is under asgi.py).
+
+Each view starts the queries that do not depend on each other at the same
+time with ``parallel()`` and renders on a worker thread, so a request waiting
+on the database holds no thread of its own. Pages and context are the same as
+their sync counterparts.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+from django.shortcuts import render, resolve_url
+
+from .asyncdb import parallel, run_db
+from .categorycache import category_cache
+from .forms import NewBidForm, NewCommentForm
+from .models import Auction, Category, Comment
+from .pagecache import cache_anonymous_page
+from .pagination import paginate
+from .views import AUCTION_LIST_FIELDS, WATCHLIST_FIELDS
+from .watching import watch_count, watched, watched_auctions
+
+
+def _current_user(request):
+    # request.user is loaded lazily from the session, which takes queries
+    return request.user if request.user.is_authenticated else None
+
+
+def login_required(view):
+    """``django.contrib.auth.decorators.login_required`` for async views."""
+    @wraps(view)
+    async def wrapped(request, *args, **kwargs):
+        if await run_db(_current_user, request) is None:
+            return redirect_to_login(request.get_full_path(), resolve_url("login"))
+        return await view(request, *args, **kwargs)
+    return wrapped
+
+
+async def render_async(request, template_name, context):
+    # context processors and templates may still touch the database
+    return await run_db(render, request, template_name, context)
+
+
+@cache_anonymous_page(lambda: "index")
+async def index(request):
+    auctions = Auction.objects.active().select_related("category").only(*AUCTION_LIST_FIELDS)
+    page = await run_db(paginate, request, auctions, ("-creation_date", "-id"))
+    return await render_async(request, "dbapp/index.html", {
+        "auctions": page.object_list,
+        "page": page
+    })
+
+
+@cache_anonymous_page(lambda category_id: f"category:{category_id}")
+async def category(request, category_id):
+    auctions = Auction.objects.active().filter(category=category_id).select_related("category").only(*AUCTION_LIST_FIELDS)
+
+    # the category nearly always comes from the category cache, so fetching
+    # it first costs no query and spares the page query for unknown ids
+    category = await run_db(lambda: category_cache.get(category_id) or Category.objects.filter(pk=category_id).first())
+
+    if category is None:
+        return await render_async(request, "dbapp/error.html", {
+            "code": 404,
+            "message": f"The category does not exist."
+        })
+
+    page = await run_db(paginate, request, auctions, ("-creation_date", "-id"))
+
+    return await render_async(request, "dbapp/category.html", {
+        "auctions": page.object_list,
+        "page": page,
+        "category": category
+    })
+
+
+@login_required
+async def watchlist(request):
+    # a single query, see views.watchlist
+    def load():
+        auctions = watched_auctions(request)
+        if auctions is None:
+            return None, None, 0
+        page = paginate(request, auctions.select_related("category").only(*WATCHLIST_FIELDS), ("-id",))
+        return auctions, page, watch_count(request, page)
+
+    auctions, page, watchingNum = await run_db(load)
+
+    return await render_async(request, "dbapp/watchlist.html", {
+        "watchlist": auctions is not None,
+        "auctions": page.object_list if page else None,
+        "page": page,
+        "watchingNum": watchingNum
+    })
+
+
+def _watching(request, auction_id):
+    # from the session, which loading the user reads anyway
+    return _current_user(request) is not None and auction_id in watched(request)
+
+
+async def listing(request, auction_id):
+    # the auction with the users the page shows, its comments and whether the
+    # visitor watches it only depend on auction_id, so they are fetched at once
+    auction, comments, watching = await parallel(
+        lambda: Auction.objects.select_related("seller", "highest_bidder").filter(pk=auction_id).first(),
+        lambda: list(Comment.objects.filter(auction=auction_id).select_related("user").order_by("-cm_date")),
+        lambda: _watching(request, auction_id),
+    )
+
+    if auction is None:
+        return await render_async(request, "dbapp/error.html", {
+            "code": 404,
+            "message": "The auction does not exist."
+        })
+
+    # after the 404, as in views.listing
+    if request.method != "GET":
+        return await render_async(request, "dbapp/error.html", {
+            "code": 405,
+            "message": "The POST method is not allowed."
+        })
+
+    user = request.user
+    highest_bidder = None
+    if auction.closed:
+        if auction.highest_bidder_id is None:
+            messages.info(request, 'Current item bidding is closed.')
+        else:
+            highest_bidder = auction.highest_bidder
+            if user == highest_bidder:
+                messages.info(request, 'Congrats! You had won the bid!')
+            else:
+                messages.info(request, f'Winner is: {highest_bidder.username}')
+
+    return await render_async(request, "dbapp/listing.html", {
+        "auction": auction,
+        "form": NewBidForm(),
+        "user": user,
+        "bid_Num": auction.bid_count,
+        "highest_bidder": highest_bidder,
+        "commentForm": NewCommentForm(),
+        "comments": comments,
+        "watching": watching,
+        "live_updates": settings.AUCTION_EVENTS
+    })
@@ -0,0 +1,44 @@
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+
+def _released(func):
+    # a worker thread is not a request, so nothing else would give its
+    # connection back; do what the end of a request does (close it, keep it
+    # for CONN_MAX_AGE or return it to the pool)
+    @wraps(func)
+    def run(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return run
+
+
+async def run_db(func, *args, **kwargs):
+    """Call the blocking ``func`` from async code.
+
+    With ``ASYNC_PARALLEL_QUERIES`` it runs on a worker thread of its own, so
+    the queries of concurrent requests do not queue behind each other on the
+    one thread Django 3.1 gives all thread-sensitive code.
+    """
+    if settings.ASYNC_PARALLEL_QUERIES:
+        return await sync_to_async(_released(func), thread_sensitive=False)(*args, **kwargs)
+    return await sync_to_async(func)(*args, **kwargs)
+
+
+async def parallel(*calls):
+    """Run independent blocking calls at once and return their results in order.
+
+    Each call is a function taking no arguments. With
+    ``ASYNC_PARALLEL_QUERIES`` off they run one after the other on the
+    thread-sensitive thread instead, which is what a test needs: rows of its
+    open transaction are only visible on that thread's connection.
+    """
+    if settings.ASYNC_PARALLEL_QUERIES:
+        return await asyncio.gather(*(run_db(call) for call in calls))
+    return await sync_to_async(lambda: [call() for call in calls])()
@@ -0,0 +1,6 @@
+"""Synthetic data and a scripted request mix for measuring the site before a deploy.
+
+``data.generate`` bulk-loads users, categories, auctions, bids, comments and
+watchlists (``manage.py benchdata``); ``workload.run`` replays a weighted mix
+of page views, bids and comments against them (``manage.py benchload``).
+"""
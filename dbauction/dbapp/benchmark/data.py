@@ -0,0 +1,164 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from ..categorycache import category_cache
+from ..models import Auction, Bid, Category, Comment, User, Watchlist
+from ..pagecache import invalidate
+
+# generated users and categories are named with these, so they can be told
+# apart from real ones and cleared again
+USER_PREFIX = "bench"
+CATEGORY_PREFIX = "Bench category"
+# generated users also get an address in this reserved domain (RFC 2606), so
+# a real account that happens to be called bench<n> is never taken for one
+EMAIL_DOMAIN = "bench.invalid"
+# every generated user signs in with this password
+PASSWORD = "bench"
+
+
+class BulkWriter:
+    """Collect rows of one model and insert them with ``bulk_create`` every ``batch_size``.
+
+    With ``auto_flush`` off the caller flushes, so that rows are never
+    written before the rows of another writer they point at.
+    """
+
+    def __init__(self, model, batch_size, auto_flush=True):
+        self.model = model
+        self.batch_size = batch_size
+        self.auto_flush = auto_flush
+        self.rows = []
+        self.written = 0
+
+    @property
+    def full(self):
+        return len(self.rows) >= self.batch_size
+
+    def add(self, row):
+        self.rows.append(row)
+        if self.auto_flush and self.full:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            with transaction.atomic():
+                self.model.objects.bulk_create(self.rows, batch_size=self.batch_size)
+            self.written += len(self.rows)
+            self.rows = []
+
+
+def _next_id(model):
+    # rows get explicit ids: MySQL does not return the ids of a bulk insert,
+    # and the bids and comments have to point at the auctions just created
+    return (model.objects.aggregate(top=Max("id"))["top"] or 0) + 1
+
+
+def _skewed(rng, mean):
+    # most auctions get a few rows and a handful get very many, like real traffic
+    return int(rng.expovariate(1 / mean)) if mean else 0
+
+
+def generate(users=200, categories=20, auctions=10000, bids=100000, comments=20000, watched=10,
+             batch_size=5000, seed=0, progress=None):
+    """Bulk-create a synthetic data set and return the number of rows written per model.
+
+    ``bids`` and ``comments`` are totals spread unevenly over the auctions.
+    The auctions' denormalized ``current_bid``, ``bid_count`` and
+    ``highest_bidder`` match the bids generated for them, bids only ever
+    raise the price, and about one auction in ten is closed.
+    """
+    rng = random.Random(seed)
+    progress = progress or (lambda message: None)
+    now = timezone.now()
+
+    first_user = _next_id(User)
+    password = make_password(PASSWORD)
+    writer = BulkWriter(User, batch_size)
+    for n in range(first_user, first_user + users):
+        writer.add(User(id=n, username=f"{USER_PREFIX}{n}", email=f"{USER_PREFIX}{n}@{EMAIL_DOMAIN}", password=password))
+    writer.flush()
+    user_ids = list(range(first_user, first_user + users))
+    progress(f"users: {writer.written}")
+
+    first_category = _next_id(Category)
+    Category.objects.bulk_create(
+        [Category(id=n, title=f"{CATEGORY_PREFIX} {n}") for n in range(first_category, first_category + categories)])
+    category_ids = list(range(first_category, first_category + categories))
+
+    auction_writer = BulkWriter(Auction, batch_size, auto_flush=False)
+    bid_writer = BulkWriter(Bid, batch_size, auto_flush=False)
+    comment_writer = BulkWriter(Comment, batch_size, auto_flush=False)
+    first_auction = _next_id(Auction)
+    for n in range(first_auction, first_auction + auctions):
+        seller = rng.choice(user_ids)
+        price = Decimal(rng.randint(100, 10000)) / 100
+        starting_bid = price
+        leader = None
+        count = _skewed(rng, bids / auctions)
+        for _ in range(count):
+            price += Decimal(rng.randint(1, 500)) / 100
+            leader = rng.choice(user_ids)
+            bid_writer.add(Bid(auction_id=n, bider_id=leader, bid_price=price))
+        for _ in range(_skewed(rng, comments / auctions)):
+            comment_writer.add(Comment(auction_id=n, user_id=rng.choice(user_ids), headline="Question",
+                                       message="Is this still available?"))
+
+        closed = rng.random() < 0.1
+        auction_writer.add(Auction(
+            id=n, title=f"Item {n}", description="Generated for benchmarking. " * rng.randint(1, 8),
+            starting_bid=starting_bid, current_bid=price, category_id=rng.choice(category_ids) if category_ids else None,
+            seller_id=seller, closed=closed, bid_count=count, highest_bidder_id=leader,
+            end_time=None if closed else now + timedelta(minutes=rng.randint(60, 14 * 24 * 60)),
+        ))
+        # auctions go in before the bids and comments that point at them
+        if auction_writer.full or bid_writer.full or comment_writer.full:
+            auction_writer.flush()
+            bid_writer.flush()
+            comment_writer.flush()
+            progress(f"auctions: {auction_writer.written}, bids: {bid_writer.written}, comments: {comment_writer.written}")
+    auction_writer.flush()
+    bid_writer.flush()
+    comment_writer.flush()
+    progress(f"auctions: {auction_writer.written}, bids: {bid_writer.written}, comments: {comment_writer.written}")
+
+    first_watchlist = _next_id(Watchlist)
+    auction_ids = range(first_auction, first_auction + auctions)
+    Watchlist.objects.bulk_create(
+        [Watchlist(id=first_watchlist + i, user_id=user) for i, user in enumerate(user_ids)], batch_size=batch_size)
+    watch_writer = BulkWriter(Watchlist.auctions.through, batch_size)
+    for i in range(users):
+        for auction_id in rng.sample(auction_ids, min(watched, auctions)):
+            watch_writer.add(Watchlist.auctions.through(watchlist_id=first_watchlist + i, auction_id=auction_id))
+    watch_writer.flush()
+
+    # bulk_create sends no signals, so drop what the caches hold by hand
+    category_cache.invalidate()
+    invalidate("all")
+    return {
+        "users": users,
+        "categories": categories,
+        "auctions": auction_writer.written,
+        "bids": bid_writer.written,
+        "comments": comment_writer.written,
+        "watched": watch_writer.written,
+    }
+
+
+def generated_users():
+    return User.objects.filter(username__regex=rf"^{USER_PREFIX}[0-9]+$", email__endswith=f"@{EMAIL_DOMAIN}")
+
+
+def clear():
+    """Delete every generated user and category, and with them their auctions, bids and comments."""
+    deleted, _ = generated_users().delete()
+    # a category someone else has listed in since is left alone
+    deleted += Category.objects.filter(title__startswith=CATEGORY_PREFIX, auction_category__isnull=True).delete()[0]
+    category_cache.invalidate()
+    invalidate("all")
+    return deleted
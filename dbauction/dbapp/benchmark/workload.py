@@ -0,0 +1,277 @@
+import http.client
+import platform
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from decimal import Decimal
+from urllib.parse import urlencode, urlsplit
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.test import Client
+from django.urls import reverse
+
+from ..models import Auction, Category, User
+from .data import generated_users
+
+# share of each kind of request in the mix, in percent
+DEFAULT_MIX = {"index": 35, "category": 10, "listing": 30, "watchlist": 10, "bid": 10, "comment": 5}
+
+# the views need these statuses, anything else counts as an error
+OK_STATUSES = {200, 302, 304}
+
+# QueryProfileMiddleware reports the query count of every response here
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+Sample = namedtuple("Sample", ["kind", "latency", "queries"])
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def parse_mix(text):
+    """Parse ``"index=40,listing=30"`` into a mix, checking the request kinds."""
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in DEFAULT_MIX or not weight.strip().isdigit():
+            raise ValueError(f"{part!r}: expected <kind>=<weight> with kind one of {', '.join(DEFAULT_MIX)}")
+        mix[kind] = int(weight)
+    return mix
+
+
+class Scenario:
+    """What the simulated visitors look at and bid on.
+
+    Visitors favour a few hot auctions, like real ones do. Bid prices come
+    from a local copy of each auction's price that every bid raises, so most
+    bids are valid without the benchmark having to read the price back.
+    """
+
+    def __init__(self, mix, hot_auctions=1000):
+        self.mix = mix
+        self.lock = threading.Lock()
+        self.users = list(generated_users().values_list("id", flat=True)[:1000])
+        self.categories = list(Category.objects.values_list("id", flat=True))
+        if not self.categories:
+            self.mix = {kind: weight for kind, weight in mix.items() if kind != "category"}
+        self.prices = dict(Auction.objects.active().order_by("-id").values_list("id", "current_bid")[:hot_auctions])
+        self.auctions = list(self.prices)
+        if not self.users or not self.auctions:
+            raise ValueError("No generated users or active auctions; run `manage.py benchdata` first.")
+
+    def auction(self, rng):
+        # a power law: the first few auctions get most of the traffic
+        return self.auctions[min(int(rng.paretovariate(1.2)) - 1, len(self.auctions) - 1)]
+
+    def bid_price(self, auction_id, rng):
+        with self.lock:
+            self.prices[auction_id] += Decimal(rng.randint(1, 500)) / 100
+            return self.prices[auction_id]
+
+    def request(self, rng):
+        """Return ``(kind, method, path, data, signed_in)`` for the next request."""
+        kind = rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        if kind == "index":
+            return kind, "GET", reverse("index"), None, rng.random() < 0.3
+        if kind == "category":
+            return kind, "GET", reverse("category", args=(rng.choice(self.categories),)), None, rng.random() < 0.3
+        if kind == "listing":
+            return kind, "GET", reverse("listing", args=(self.auction(rng),)), None, rng.random() < 0.5
+        if kind == "watchlist":
+            return kind, "GET", reverse("watchlist"), None, True
+        auction_id = self.auction(rng)
+        if kind == "bid":
+            return kind, "POST", reverse("bid", args=(auction_id,)), {"bid_price": str(self.bid_price(auction_id, rng))}, True
+        return kind, "POST", reverse("comment", args=(auction_id,)), {"headline": "Question", "message": "Does it ship abroad?"}, True
+
+
+def _queries(response_header):
+    match = SERVER_TIMING_QUERIES.search(response_header or "")
+    return int(match.group(1)) if match else None
+
+
+class ClientTransport:
+    """Send requests in process through the Django test client, one visitor per thread."""
+
+    label = "client"
+
+    def __init__(self, user_id):
+        self.anonymous = Client()
+        self.signed_in = Client()
+        self.signed_in.force_login(User.objects.get(pk=user_id))
+
+    def send(self, method, path, data, signed_in):
+        client = self.signed_in if signed_in else self.anonymous
+        if method == "GET":
+            response = client.get(path)
+        else:
+            response = client.post(path, data)
+        return response.status_code, _queries(response.get("Server-Timing"))
+
+    def close(self):
+        pass
+
+
+class HttpTransport:
+    """Send requests over HTTP to a running server, one keep-alive connection per thread.
+
+    The server must share this process's database and ``SECRET_KEY`` so that
+    it accepts the session created here.
+    """
+
+    label = "http"
+
+    def __init__(self, user_id, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        client = Client()
+        client.force_login(User.objects.get(pk=user_id))
+        session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        # any well-formed token passes the CSRF check if cookie and header agree;
+        # get_token() makes one for a request that has none yet
+        self.csrf_token = get_token(HttpRequest())
+        self.cookie = f"{settings.SESSION_COOKIE_NAME}={session}; {settings.CSRF_COOKIE_NAME}={self.csrf_token}"
+
+    def send(self, method, path, data, signed_in):
+        headers = {"Cookie": self.cookie} if signed_in else {}
+        body = None
+        if method == "POST":
+            body = urlencode(data)
+            headers.update({"Content-Type": "application/x-www-form-urlencoded", "X-CSRFToken": self.csrf_token})
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            # start over on a fresh connection and count the failure
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            raise
+        return response.status, _queries(response.getheader("Server-Timing"))
+
+    def close(self):
+        self.conn.close()
+
+
+def summarize(samples, elapsed):
+    latencies = [sample.latency for sample in samples]
+    queries = [sample.queries for sample in samples if sample.queries is not None]
+    return {
+        "requests": len(samples),
+        "rps": round(len(samples) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def run(scenario, make_transport, threads=8, requests=2000, warmup=50, seed=0):
+    """Replay ``requests`` requests of ``scenario`` from ``threads`` threads and return the results.
+
+    ``make_transport(user_id)`` gives each thread its own visitor. The first
+    ``warmup`` requests of every thread load templates, connections and
+    caches and are not measured.
+    """
+    counter = iter(range(requests))
+    samples = []
+    errors = []
+    lock = threading.Lock()
+
+    def visitor(index):
+        rng = random.Random(seed * 1000 + index)
+        mine = []
+        failed = []
+        transport = None
+        try:
+            transport = make_transport(scenario.users[index % len(scenario.users)])
+            for _ in range(warmup):
+                kind, method, path, data, signed_in = scenario.request(rng)
+                if method == "GET":
+                    transport.send(method, path, data, signed_in)
+        except Exception as exc:
+            failed.append(f"warm-up: {exc}")
+            barrier.abort()
+        try:
+            barrier.wait()
+            for _ in counter:
+                kind, method, path, data, signed_in = scenario.request(rng)
+                started = time.perf_counter()
+                try:
+                    status, queries = transport.send(method, path, data, signed_in)
+                except Exception as exc:
+                    failed.append(f"{kind} {path}: {exc}")
+                    continue
+                latency = time.perf_counter() - started
+                if status in OK_STATUSES:
+                    mine.append(Sample(kind, latency, queries))
+                else:
+                    failed.append(f"{kind} {path}: HTTP {status}")
+        except threading.BrokenBarrierError:
+            pass
+        finally:
+            if transport is not None:
+                transport.close()
+            connection.close()
+            with lock:
+                samples.extend(mine)
+                errors.extend(failed)
+
+    # every visitor is warm before the clock starts
+    barrier = threading.Barrier(threads + 1)
+    workers = [threading.Thread(target=visitor, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    if not samples:
+        raise RuntimeError(f"every request failed: {errors[0] if errors else 'no requests made'}")
+    return {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "threads": threads,
+        "elapsed_s": round(elapsed, 3),
+        "errors": len(errors),
+        "first_errors": errors[:5],
+        "mix": scenario.mix,
+        "environment": {
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "conn_mode": getattr(settings, "DB_CONN_MODE", None),
+            "page_cache": settings.PAGE_CACHE_ENABLED,
+            "async_views": settings.ASYNC_VIEWS,
+        },
+        "overall": summarize(samples, elapsed),
+        "endpoints": {
+            kind: summarize([sample for sample in samples if sample.kind == kind], elapsed)
+            for kind in scenario.mix if any(sample.kind == kind for sample in samples)
+        },
+    }
+
+
+def compare(current, baseline):
+    """Yield ``(name, metric, before, after, change in percent)`` for the headline numbers."""
+    names = ["overall"] + [kind for kind in current["endpoints"] if kind in baseline.get("endpoints", {})]
+    for name in names:
+        now = current["overall"] if name == "overall" else current["endpoints"][name]
+        before = baseline["overall"] if name == "overall" else baseline["endpoints"][name]
+        for metric in ("rps", "p95_ms", "queries_per_request"):
+            if now.get(metric) is not None and before.get(metric):
+                yield name, metric, before[metric], now[metric], (now[metric] - before[metric]) / before[metric] * 100
@@ -0,0 +1,96 @@
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F, Q, sql
+from django.utils import timezone
+
+from .models import Auction, Bid
+
+
+# possible outcomes of a bid placement
+ACCEPTED = "accepted"
+TOO_LOW = "too_low"
+CLOSED = "closed"
+NOT_FOUND = "not_found"
+
+# the auction as an accepted bid left it
+AuctionState = namedtuple("AuctionState", ["category_id", "current_bid", "bid_count", "closed"])
+
+
+class BidResult(namedtuple("BidResult", ["status", "bid", "auction"], defaults=(None,))):
+    __slots__ = ()
+
+    @property
+    def accepted(self):
+        return self.status == ACCEPTED
+
+
+def _returns_from_update():
+    # UPDATE ... RETURNING: PostgreSQL, and SQLite from 3.35; not MySQL
+    return connection.vendor == "postgresql" or (
+        connection.vendor == "sqlite" and connection.Database.sqlite_version_info >= (3, 35))
+
+
+def _update_returning(queryset, values, returning):
+    # what QuerySet.update() runs, with the new values of ``returning`` sent back
+    query = queryset.query.chain(sql.UpdateQuery)
+    query.add_update_values(values)
+    statement, params = query.get_compiler(connection=connection).as_sql()
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"{statement} RETURNING {', '.join(quote(column) for column in returning)}", params)
+        return cursor.fetchone()
+
+
+def place_bid(auction_id, bidder, bid_price):
+    """Validate and apply a bid atomically.
+
+    The price check and the ``current_bid`` write happen in a single
+    conditional ``UPDATE ... WHERE current_bid < %s``, so the database row
+    lock decides which of several concurrent bidders wins; a losing bid
+    simply matches no row. Only ``current_bid``, the denormalized
+    ``bid_count``/``highest_bidder`` and ``update_date`` are written, and
+    the ``Bid`` row is inserted in the same transaction.
+
+    An accepted bid comes back with the auction's new state, which the
+    ``UPDATE`` returns where the database can (``RETURNING``) and a read
+    under its row lock gets elsewhere.
+    """
+    bid_price = Decimal(bid_price)
+    now = timezone.now()
+
+    with transaction.atomic():
+        auction = Auction.objects.filter(
+            # an auction past its end time takes no more bids, even before
+            # close_auctions has got round to closing it
+            Q(end_time__isnull=True) | Q(end_time__gt=now),
+            pk=auction_id,
+            closed=False,
+            starting_bid__lt=bid_price,
+            current_bid__lt=bid_price,
+        )
+        values = {
+            "current_bid": bid_price,
+            "bid_count": F("bid_count") + 1,
+            "highest_bidder": bidder,
+            "update_date": now,
+        }
+        if _returns_from_update():
+            row = _update_returning(auction, values, ("category_id", "bid_count"))
+        else:
+            row = Auction.objects.filter(pk=auction_id).values_list("category_id", "bid_count").first() \
+                if auction.update(**values) else None
+
+        if row is not None:
+            bid = Bid.objects.create(auction_id=auction_id, bider=bidder, bid_price=bid_price)
+            return BidResult(ACCEPTED, bid, AuctionState(row[0], bid_price, row[1], False))
+
+    # the bid was rejected, look up why (only paid on the losing path)
+    row = Auction.objects.filter(pk=auction_id).values_list("closed", "end_time").first()
+    if row is None:
+        return BidResult(NOT_FOUND, None)
+    closed, end_time = row
+    if closed or (end_time is not None and end_time <= now):
+        return BidResult(CLOSED, None)
+    return BidResult(TOO_LOW, None)
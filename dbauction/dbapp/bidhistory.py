@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, FloatField, Func, IntegerField, Max, Min, Value
+from django.db.models.functions import Floor, Least
+
+from .models import Bid
+
+# bids of an auction in the order they were placed; bid_auction_date_idx
+# serves both the ordering and the keyset seek
+HISTORY_KEYS = ("bid_date", "id")
+
+# most buckets a price summary may be split into
+MAX_SUMMARY_BUCKETS = 500
+
+
+class Epoch(Func):
+    """Seconds since 1970 of a datetime column, computed by the database."""
+    output_field = FloatField()
+    template = "EXTRACT(EPOCH FROM %(expressions)s)"
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="UNIX_TIMESTAMP(%(expressions)s)", **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="((julianday(%(expressions)s) - 2440587.5) * 86400.0)", **extra_context)
+
+
+def bid_history(auction_id):
+    return Bid.objects.filter(auction=auction_id).order_by(*HISTORY_KEYS)
+
+
+def price_summary(auction_id, bid_count, buckets=100):
+    """Price of an auction over time, downsampled to at most ``buckets`` points.
+
+    The time between the first and the last bid is cut into equal buckets,
+    each with its start, lowest and highest price and number of bids; empty
+    buckets are left out. Accepted bids only ever raise the price, so a
+    bucket opens at its low and closes at its high. The database does the
+    grouping in one pass over the auction's slice of bid_auction_date_idx, and
+    the result is cached under the auction's ``bid_count``, so it is only
+    recomputed after a new bid.
+    """
+    key = f"bidsummary:{auction_id}:{bid_count}:{buckets}"
+    summary = cache.get(key)
+    if summary is None:
+        summary = _summarize(auction_id, buckets)
+        cache.set(key, summary)
+    return summary
+
+
+def _summarize(auction_id, buckets):
+    bids = bid_history(auction_id).annotate(epoch=Epoch("bid_date"))
+    first = bids.values_list("bid_date", "epoch").first()
+    if first is None:
+        return []
+    start, start_epoch = first
+    width = (bids.values_list("epoch", flat=True).last() - start_epoch) / buckets
+
+    if width:
+        # the last bid falls exactly on the end of the range
+        bucket = Least(Floor((Epoch("bid_date") - Value(start_epoch)) / Value(width)), Value(buckets - 1),
+                       output_field=IntegerField())
+    else:
+        bucket = Value(0, output_field=IntegerField())
+    rows = (
+        Bid.objects.filter(auction=auction_id)
+        .annotate(bucket=bucket)
+        .values("bucket")
+        .annotate(count=Count("id"), low=Min("bid_price"), high=Max("bid_price"))
+        .order_by("bucket")
+    )
+    return [
+        {"start": start + timedelta(seconds=width * int(row["bucket"])), "count": row["count"],
+         "low": row["low"], "high": row["high"]}
+        for row in rows
+    ]
@@ -0,0 +1,77 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import Category
+
+
+class CachedCategory:
+    __slots__ = ("id", "title", "active_count")
+
+    def __init__(self, id, title, active_count):
+        self.id = id
+        self.title = title
+        self.active_count = active_count
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return f"{self.title}"
+
+
+class CategoryCache:
+    """In-process cache of every category with its number of active auctions.
+
+    The list is loaded with one aggregate query and then kept current by
+    ``adjust()`` as auctions are created and closed, instead of being
+    recounted. It is reloaded when ``invalidate()`` bumps the version
+    (a category was added, renamed or removed) or after
+    ``CATEGORY_CACHE_TTL`` seconds, which also bounds how long counts
+    changed by other processes can lag behind.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._categories = {}
+        self._version = 0
+        self._loaded_version = None
+        self._expires = 0.0
+
+    def _load(self):
+        rows = Category.objects.annotate(
+            active_count=Count("auction_category", filter=Q(auction_category__closed=False))
+        ).order_by("pk").values_list("id", "title", "active_count")
+        self._categories = {pk: CachedCategory(pk, title, count) for pk, title, count in rows}
+        self._loaded_version = self._version
+        self._expires = time.monotonic() + settings.CATEGORY_CACHE_TTL
+
+    def _fresh(self):
+        if self._loaded_version != self._version or time.monotonic() >= self._expires:
+            self._load()
+        return self._categories
+
+    def all(self):
+        with self._lock:
+            return list(self._fresh().values())
+
+    def get(self, category_id):
+        with self._lock:
+            return self._fresh().get(category_id)
+
+    def adjust(self, category_id, delta):
+        """Add ``delta`` to the active auction count of ``category_id``."""
+        with self._lock:
+            category = self._categories.get(category_id)
+            if category is not None and self._loaded_version == self._version:
+                category.active_count = max(category.active_count + delta, 0)
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+
+
+category_cache = CategoryCache()
@@ -0,0 +1,41 @@
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .categorycache import category_cache
+from .events import publish_auction
+from .models import Auction
+from .pagecache import invalidate_auction
+
+ClosedAuction = namedtuple("ClosedAuction", ["id", "category_id", "current_bid", "bid_count", "highest_bidder_id"])
+
+
+def close_expired(batch_size=500, now=None):
+    """Close up to ``batch_size`` auctions whose end time has passed.
+
+    The earliest expired auctions are read through auction_open_end_idx and,
+    where the database supports it, locked ``FOR UPDATE SKIP LOCKED``: several
+    workers then take disjoint batches instead of queueing on each other's
+    rows, and a bid holding a row lock is simply left for the next batch.
+    Closing only matches open auctions, so running it again (or in another
+    replica) closes nothing twice. The leader at that point,
+    ``highest_bidder``, is the winner. Returns the auctions closed.
+    """
+    now = now or timezone.now()
+    expired = Auction.objects.active().filter(end_time__lte=now).order_by("end_time")
+    if connection.features.has_select_for_update_skip_locked:
+        expired = expired.select_for_update(skip_locked=True)
+
+    with transaction.atomic():
+        batch = [ClosedAuction(*row) for row in expired.values_list(*ClosedAuction._fields)[:batch_size]]
+        if batch:
+            Auction.objects.active().filter(pk__in=[auction.id for auction in batch]).update(closed=True, update_date=now)
+
+    # what views.close does for one auction, once the batch is committed
+    for auction in batch:
+        category_cache.adjust(auction.category_id, -1)
+        publish_auction(auction.id, auction.current_bid, auction.bid_count, True)
+    for category_id in {auction.category_id for auction in batch}:
+        invalidate_auction(category_id)
+    return batch
@@ -0,0 +1,6 @@
+from .categorycache import category_cache
+
+
+def categories(request):
+    # passed uncalled so the template only reads the cache if it needs the list
+    return {"category_list": category_cache.all}
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+def _order(event):
+    # an auction only moves forward: every accepted bid adds one to bid_count
+    # and a close keeps it, so this orders its states however late they come
+    return event.get("bid_count", 0), bool(event.get("closed"))
+
+
+class Subscription:
+    """What one listener has not consumed yet, kept on its own event loop.
+
+    Only the latest event is kept: a listener that falls behind skips
+    straight to the current price instead of building up a backlog. States
+    are published after commit from separate reads, so two bids can arrive
+    in either order; one no newer than what the listener already has or
+    has seen (``seen``) is dropped, and the price never goes back.
+    """
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self._latest = None
+        self._newest = None
+        self._ready = asyncio.Event()
+
+    def offer(self, event):
+        # always called on self.loop
+        if self._newest is not None and _order(event) <= self._newest:
+            return
+        self._newest = _order(event)
+        self._latest = event
+        self._ready.set()
+
+    def seen(self, event):
+        """Note that the listener has ``event`` from elsewhere (a snapshot); older ones are dropped."""
+        if self._newest is None or _order(event) >= self._newest:
+            self._newest = _order(event)
+            self._latest = None
+            self._ready.clear()
+
+    async def get(self):
+        await self._ready.wait()
+        self._ready.clear()
+        return self._latest
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+def _deliver(subscriptions, event):
+    for subscription in subscriptions:
+        subscription.offer(event)
+
+
+class InProcessBroker:
+    """Fan events out to the subscriptions of this process.
+
+    ``publish`` may be called from any thread (sync views run on worker
+    threads under ASGI). It hands the whole list of a channel's listeners to
+    each event loop in one ``call_soon_threadsafe``, so one bid reaches
+    thousands of open streams without a query or a wake-up per stream.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # channel -> event loop -> subscriptions on that loop
+        self._channels = {}
+
+    def subscribe(self, channel):
+        """Subscribe the running event loop to ``channel``."""
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._channels.setdefault(channel, {}).setdefault(subscription.loop, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            loops = self._channels.get(subscription.channel, {})
+            listeners = loops.get(subscription.loop)
+            if listeners is not None:
+                listeners.discard(subscription)
+                if not listeners:
+                    del loops[subscription.loop]
+            if not loops:
+                self._channels.pop(subscription.channel, None)
+
+    def publish(self, channel, event):
+        with self._lock:
+            targets = [(loop, list(listeners)) for loop, listeners in self._channels.get(channel, {}).items()]
+        for loop, listeners in targets:
+            try:
+                loop.call_soon_threadsafe(_deliver, listeners, event)
+            except RuntimeError:
+                # the loop was closed without its streams unsubscribing
+                pass
+
+    def subscribers(self, channel):
+        with self._lock:
+            return sum(len(listeners) for listeners in self._channels.get(channel, {}).values())
+
+
+class RedisBroker(InProcessBroker):
+    """Relay events through Redis pub/sub so every server process sees every bid.
+
+    Publishing goes to Redis; one listener thread per process receives the
+    messages and fans them out in process. Needs the optional ``redis``
+    package and ``EVENT_BROKER_URL`` (or ``REDIS_URL``).
+    """
+
+    prefix = "dbapp:events:"
+
+    def __init__(self):
+        super().__init__()
+        import redis
+
+        self._redis = redis.Redis.from_url(settings.EVENT_BROKER_URL)
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def subscribe(self, channel):
+        with self._listener_lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="dbapp-events", daemon=True)
+                self._listener.start()
+        return super().subscribe(channel)
+
+    def publish(self, channel, event):
+        self._redis.publish(self.prefix + channel, json.dumps(event))
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(self.prefix + "*")
+        for message in pubsub.listen():
+            channel = message["channel"].decode()[len(self.prefix):]
+            super().publish(channel, json.loads(message["data"]))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process-wide broker, an instance of ``settings.EVENT_BROKER``."""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.EVENT_BROKER)()
+        return _broker
+
+
+@receiver(setting_changed)
+def _reset_broker(setting, **kwargs):
+    global _broker
+    if setting in ("EVENT_BROKER", "EVENT_BROKER_URL"):
+        with _broker_lock:
+            _broker = None
+
+
+def auction_channel(auction_id):
+    return f"auction:{auction_id}"
+
+
+def auction_state(auction_id, current_bid, bid_count, closed):
+    return {"id": auction_id, "current_bid": str(current_bid), "bid_count": bid_count, "closed": closed}
+
+
+def publish_auction(auction_id, current_bid, bid_count, closed):
+    """Push the live state of an auction to everyone streaming it."""
+    get_broker().publish(auction_channel(auction_id), auction_state(auction_id, current_bid, bid_count, closed))
@@ -1,5 +1,6 @@
 from django.forms import ModelForm
 from django import forms
+from django.utils import timezone
 from .models import Auction, Bid, Comment 
 
 # create a new auction listing model form class
@@ -7,7 +8,7 @@ class NewListingForm(ModelForm):
     # specifiy the name of model to use
     class Meta:
         model = Auction
-        fields = ["title", "description", "starting_bid", "category", "imageURL"]
+        fields = ["title", "description", "starting_bid", "category", "imageURL", "end_time"]
         widgets = {
             "title": forms.TextInput(
                 attrs={
@@ -30,9 +31,22 @@ class NewListingForm(ModelForm):
                     'class': 'form-control',
                     "placeholder": "Enter the image URL",
                     }
-                ) 
+                ),
+            "end_time": forms.DateTimeInput(
+                attrs={'class': 'form-control', 'type': 'datetime-local'}
+                )
+        }
+        labels = {
+            "end_time": "Ends on (optional)"
         }
 
+    # an auction must not end before anyone could bid on it
+    def clean_end_time(self):
+        end_time = self.cleaned_data["end_time"]
+        if end_time is not None and end_time <= timezone.now():
+            raise forms.ValidationError("The end time must be in the future.")
+        return end_time
+
 # create a new Bid model form class
 class NewBidForm(ModelForm):
     # specify the name of model to use
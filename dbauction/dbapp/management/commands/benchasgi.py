@@ -0,0 +1,150 @@
+import http.client
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from dbapp.benchmark.workload import percentile
+from dbapp.models import Auction, Category, User
+
+
+class Command(BaseCommand):
+    help = ("Compare throughput and latency of the WSGI deployment (main.py, sync views) with "
+            "the ASGI one (dbauction/asgi.py, async views) by serving both over HTTP.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000, help="requests per server")
+        parser.add_argument("--concurrency", type=int, default=32, help="concurrent client connections")
+        parser.add_argument("--threads", type=int, default=8, help="worker threads of the WSGI server")
+        parser.add_argument("--port", type=int, default=8701, help="first of the two ports to serve on")
+
+    def handle(self, *args, **options):
+        # neither server is a dependency of the site itself (requirements.txt)
+        if not importlib.util.find_spec("uvicorn"):
+            raise CommandError("benchasgi serves the ASGI deployment with uvicorn: pip install uvicorn "
+                               "(and gunicorn to serve the WSGI one as App Engine does).")
+        urls = self.workload()
+        if importlib.util.find_spec("gunicorn"):
+            # what App Engine runs for main.py, with request threads
+            wsgi = [sys.executable, "-m", "gunicorn", "main:app", "--workers", "1",
+                    "--threads", str(options["threads"]), "--bind"]
+        else:
+            self.stderr.write("gunicorn is not installed, serving main.py with uvicorn's WSGI interface")
+            wsgi = [sys.executable, "-m", "uvicorn", "main:app", "--interface", "wsgi", "--no-access-log", "--bind"]
+        servers = [
+            ("wsgi", wsgi, "0"),
+            ("asgi", [sys.executable, "-m", "uvicorn", "dbauction.asgi:application", "--no-access-log", "--bind"], "1"),
+        ]
+
+        for offset, (label, command, async_views) in enumerate(servers):
+            port = options["port"] + offset
+            if command[2] == "uvicorn":
+                command = command[:-1] + ["--port", str(port)]
+            else:
+                command = command + [f"127.0.0.1:{port}"]
+            env = dict(
+                os.environ,
+                DJANGO_ASYNC_VIEWS=async_views,
+                # the servers must accept the session signed here in workload()
+                DJANGO_SECRET_KEY=settings.SECRET_KEY,
+                # measure the views, not the page cache in front of them
+                PAGE_CACHE_ENABLED="0",
+                DJANGO_PROFILE_LOG_LEVEL="WARNING",
+            )
+            # a file rather than a pipe: nobody reads stderr while the server
+            # runs, and a full pipe would stall it mid-measurement
+            with tempfile.TemporaryFile() as log:
+                process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env,
+                                           stdout=subprocess.DEVNULL, stderr=log)
+                try:
+                    self.wait_until_up(port, process, log)
+                    self.run(label, port, urls, options["requests"], options["concurrency"])
+                finally:
+                    process.terminate()
+                    process.wait()
+
+    def workload(self):
+        user, _ = User.objects.get_or_create(username="benchasgi", defaults={"email": "benchasgi@example.com"})
+        client = Client()
+        client.force_login(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+        pages = [reverse("index")]
+        pages += [reverse("category", args=(pk,)) for pk in Category.objects.values_list("pk", flat=True)[:3]]
+        pages += [reverse("listing", args=(pk,)) for pk in Auction.objects.values_list("pk", flat=True)[:5]]
+        if len(pages) == 1:
+            raise CommandError("No categories or auctions to request; load some data first.")
+        # every page both anonymous and signed in, plus the watchlist
+        return [(url, None) for url in pages] + [(url, cookie) for url in pages] + [(reverse("watchlist"), cookie)]
+
+    def wait_until_up(self, port, process, log, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                log.seek(0)
+                raise CommandError(f"server exited: {log.read().decode(errors='replace')[-2000:]}")
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+                conn.request("GET", "/")
+                conn.getresponse().read()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"server on port {port} did not start")
+
+    def run(self, label, port, urls, requests, concurrency):
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        counter = iter(range(requests))
+
+        def worker():
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            samples = []
+            for n in counter:
+                url, cookie = urls[n % len(urls)]
+                started = time.perf_counter()
+                try:
+                    conn.request("GET", url, headers={"Cookie": cookie} if cookie else {})
+                    response = conn.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        raise RuntimeError(f"{url}: HTTP {response.status}")
+                    samples.append(time.perf_counter() - started)
+                except Exception as exc:
+                    conn.close()
+                    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                    with lock:
+                        errors.append(exc)
+            conn.close()
+            with lock:
+                latencies.extend(samples)
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        if not latencies:
+            self.stderr.write(f"{label}: every request failed ({errors[0] if errors else 'no samples'})")
+            return
+        self.stdout.write(
+            f"{label}  {len(latencies) / elapsed:8.1f} req/s  "
+            f"p50 {percentile(latencies, 50) * 1000:7.2f} ms  "
+            f"p95 {percentile(latencies, 95) * 1000:7.2f} ms  "
+            f"p99 {percentile(latencies, 99) * 1000:7.2f} ms  "
+            f"errors {len(errors)}"
+        )
+        if errors:
+            self.stderr.write(f"{label}: first error: {errors[0]}")
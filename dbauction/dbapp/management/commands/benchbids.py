@@ -0,0 +1,105 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from dbapp.bidding import ACCEPTED, CLOSED, TOO_LOW, BidResult, place_bid
+from dbapp.models import User, Auction, Bid
+
+
+# the read-modify-write sequence the bid view used before the bidding service,
+# kept here so the benchmark can show the lost updates it produces
+def naive_bid(auction_id, bidder, bid_price):
+    auction = Auction.objects.get(pk=auction_id)
+    highest_bid = Bid.objects.filter(auction=auction_id).order_by("-bid_price").first()
+    highest_bid_price = auction.current_bid if highest_bid is None else highest_bid.bid_price
+    if auction.closed:
+        return BidResult(CLOSED, None)
+    if not (bid_price > auction.starting_bid and bid_price > (auction.current_bid or highest_bid_price)):
+        return BidResult(TOO_LOW, None)
+    bid = Bid.objects.create(auction=auction, bider=bidder, bid_price=bid_price)
+    auction.current_bid = bid_price
+    auction.save()
+    return BidResult(ACCEPTED, bid)
+
+
+class Command(BaseCommand):
+    help = "Fire many concurrent bids at a single auction and report bids/sec and lost updates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bids", type=int, default=2000, help="total number of bids to place")
+        parser.add_argument("--workers", type=int, default=32, help="number of concurrent bidder threads")
+        parser.add_argument("--bidders", type=int, default=50, help="number of distinct bidding users")
+        parser.add_argument("--mode", choices=["service", "naive"], default="service",
+                            help="use the row-locked bidding service or the old read-modify-write path")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--keep", action="store_true", help="keep the benchmark auction and its bids")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        bidders = [
+            User.objects.get_or_create(username=f"bench_bidder_{i}")[0]
+            for i in range(options["bidders"])
+        ]
+        auction = Auction.objects.create(
+            title="Benchmark auction",
+            description="Created by the benchbids command.",
+            starting_bid=Decimal("1.00"),
+            current_bid=Decimal("1.00"),
+            seller=bidders[0],
+        )
+
+        # random prices so that bids race each other and many must be rejected
+        prices = [Decimal(rng.randint(200, 10000 * 100)) / 100 for _ in range(options["bids"])]
+        chunks = [prices[i::options["workers"]] for i in range(options["workers"])]
+        attempt = place_bid if options["mode"] == "service" else naive_bid
+
+        def run(chunk):
+            accepted = errors = 0
+            try:
+                for price in chunk:
+                    try:
+                        result = attempt(auction.id, rng.choice(bidders), price)
+                    except DatabaseError:
+                        errors += 1
+                        continue
+                    accepted += result.accepted
+            finally:
+                # every thread owns its own connection
+                connection.close()
+            return accepted, errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            outcomes = list(pool.map(run, chunks))
+        elapsed = time.perf_counter() - started
+
+        accepted = sum(a for a, _ in outcomes)
+        errors = sum(e for _, e in outcomes)
+
+        # a lost update is an accepted bid that did not beat every bid accepted before it,
+        # or a final current_bid that disagrees with the highest stored bid
+        lost = 0
+        highest = auction.starting_bid
+        for price in Bid.objects.filter(auction=auction).order_by("id").values_list("bid_price", flat=True):
+            if price <= highest:
+                lost += 1
+            highest = max(highest, price)
+        auction.refresh_from_db(fields=["current_bid"])
+        if auction.current_bid != highest:
+            lost += 1
+
+        self.stdout.write(f"mode:          {options['mode']}")
+        self.stdout.write(f"bids:          {options['bids']} ({options['workers']} workers)")
+        self.stdout.write(f"accepted:      {accepted}")
+        self.stdout.write(f"errors:        {errors}")
+        self.stdout.write(f"elapsed:       {elapsed:.3f}s")
+        self.stdout.write(f"bids/sec:      {options['bids'] / elapsed:.1f}")
+        self.stdout.write(f"final price:   {auction.current_bid} (highest stored bid {highest})")
+        self.stdout.write(f"lost updates:  {lost}")
+
+        if not options["keep"]:
+            auction.delete()
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dbapp.benchmark import data
+
+
+class Command(BaseCommand):
+    help = ("Bulk-load synthetic users, categories, auctions, bids, comments and watchlists for "
+            "`manage.py benchload`; --clear removes them again.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--auctions", type=int, default=10000)
+        parser.add_argument("--bids", type=int, default=100000, help="total bids, spread unevenly over the auctions")
+        parser.add_argument("--comments", type=int, default=20000, help="total comments, spread like the bids")
+        parser.add_argument("--watched", type=int, default=10, help="auctions on each user's watchlist")
+        parser.add_argument("--batch-size", type=int, default=5000, help="rows per bulk insert")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--clear", action="store_true", help="delete the generated data instead")
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            self.stdout.write(self.style.SUCCESS(f"Deleted {data.clear()} generated rows."))
+            return
+
+        started = time.perf_counter()
+        written = data.generate(
+            users=options["users"],
+            categories=options["categories"],
+            auctions=options["auctions"],
+            bids=options["bids"],
+            comments=options["comments"],
+            watched=options["watched"],
+            batch_size=options["batch_size"],
+            seed=options["seed"],
+            progress=self.stdout.write if options["verbosity"] > 1 else None,
+        )
+        counts = ", ".join(f"{count} {name}" for name, count in written.items())
+        self.stdout.write(self.style.SUCCESS(f"Created {counts} in {time.perf_counter() - started:.1f}s."))
@@ -0,0 +1,91 @@
+import copy
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.utils import load_backend
+
+from dbapp.benchmark.workload import percentile
+from dbauction.backends.pool import pool_stats
+
+
+MODES = ("per-request", "persistent", "pool")
+
+
+class Command(BaseCommand):
+    help = "Compare per-request, persistent and pooled database connections under concurrent load."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16, help="concurrent request threads")
+        parser.add_argument("--requests", type=int, default=200, help="requests per thread and mode")
+        parser.add_argument("--pool-size", type=int, default=8, help="MAX_SIZE of the pool in pool mode")
+        parser.add_argument("--sql", default="SELECT id, title, current_bid FROM dbapp_auction ORDER BY id DESC LIMIT 20",
+                            help="statement each simulated request runs")
+
+    def settings_for(self, mode, pool_size):
+        settings_dict = copy.deepcopy(connections["default"].settings_dict)
+        settings_dict.pop("POOL", None)
+        settings_dict["HEALTH_CHECKS"] = False
+        if mode == "per-request":
+            settings_dict["CONN_MAX_AGE"] = 0
+        elif mode == "persistent":
+            settings_dict["CONN_MAX_AGE"] = None
+            settings_dict["HEALTH_CHECKS"] = True
+        else:
+            settings_dict["CONN_MAX_AGE"] = 0
+            settings_dict["POOL"] = {"MAX_SIZE": pool_size, "WAIT_TIMEOUT": 30}
+        return settings_dict
+
+    def handle(self, *args, **options):
+        for mode in MODES:
+            settings_dict = self.settings_for(mode, options["pool_size"])
+            backend = load_backend(settings_dict["ENGINE"])
+            latencies = []
+            errors = []
+            lock = threading.Lock()
+
+            def worker():
+                # each thread has its own wrapper, like Django's per-thread connections
+                wrapper = backend.DatabaseWrapper(settings_dict, alias=f"bench-{mode}")
+                samples = []
+                try:
+                    for _ in range(options["requests"]):
+                        started = time.perf_counter()
+                        # what request_started / request_finished do via close_old_connections()
+                        wrapper.close_if_unusable_or_obsolete()
+                        with wrapper.cursor() as cursor:
+                            cursor.execute(options["sql"])
+                            cursor.fetchall()
+                        wrapper.close_if_unusable_or_obsolete()
+                        samples.append(time.perf_counter() - started)
+                except Exception as exc:
+                    with lock:
+                        errors.append(exc)
+                finally:
+                    wrapper.close()
+                with lock:
+                    latencies.extend(samples)
+
+            threads = [threading.Thread(target=worker) for _ in range(options["threads"])]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            if not latencies:
+                self.stderr.write(f"{mode}: every request failed ({errors[0] if errors else 'no samples'})")
+                continue
+            self.stdout.write(
+                f"{mode:12} {len(latencies) / elapsed:9.1f} req/s  "
+                f"p50 {percentile(latencies, 50) * 1000:7.2f} ms  "
+                f"p99 {percentile(latencies, 99) * 1000:7.2f} ms  "
+                f"mean {statistics.mean(latencies) * 1000:7.2f} ms  "
+                f"errors {len(errors)}"
+            )
+
+        for name, stats in pool_stats().items():
+            self.stdout.write(f"pool {name}: {stats}")
@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from dbapp.benchmark import workload
+
+
+class Command(BaseCommand):
+    help = ("Replay a mix of index, category, listing, watchlist, bid and comment requests against the "
+            "data of `manage.py benchdata` and report req/s, p50/p95/p99 latency and queries per request.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000, help="measured requests in total")
+        parser.add_argument("--threads", type=int, default=8, help="concurrent visitors")
+        parser.add_argument("--warmup", type=int, default=20, help="unmeasured page views per visitor first")
+        parser.add_argument("--mix", type=workload.parse_mix, default=workload.DEFAULT_MIX,
+                            help='weights per request kind, e.g. "index=40,listing=40,bid=20"')
+        parser.add_argument("--hot-auctions", type=int, default=1000, help="newest active auctions the visitors pick from")
+        parser.add_argument("--url", help="base URL of a running server to load over HTTP instead of in process")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="write the results to this JSON file")
+        parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+
+    def handle(self, *args, **options):
+        try:
+            scenario = workload.Scenario(options["mix"], options["hot_auctions"])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        if options["url"]:
+            make_transport = lambda user_id: workload.HttpTransport(user_id, options["url"])
+        else:
+            make_transport = workload.ClientTransport
+
+        # the test client needs "testserver" to be an allowed host
+        with override_settings(ALLOWED_HOSTS=["*"]):
+            try:
+                results = workload.run(scenario, make_transport, options["threads"], options["requests"],
+                                       options["warmup"], options["seed"])
+            except RuntimeError as exc:
+                raise CommandError(exc)
+        results["transport"] = options["url"] or "client"
+
+        for name, summary in [("overall", results["overall"])] + list(results["endpoints"].items()):
+            queries = summary["queries_per_request"]
+            self.stdout.write(
+                f"{name:10} {summary['requests']:6} req  {summary['rps']:8.1f} req/s  "
+                f"p50 {summary['p50_ms']:7.2f} ms  p95 {summary['p95_ms']:7.2f} ms  p99 {summary['p99_ms']:7.2f} ms  "
+                f"{queries if queries is not None else '-':>5} queries/req"
+            )
+        if results["errors"]:
+            self.stderr.write(f"{results['errors']} requests failed, first: {results['first_errors'][0]}")
+
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+            for name, metric, before, after, change in workload.compare(results, baseline):
+                self.stdout.write(f"{name:10} {metric:20} {before:10} -> {after:10}  {change:+6.1f}%")
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"results written to {options['output']}")
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from dbapp.models import Category
+from dbapp.pagecache import page_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Compare anonymous requests/sec on the index and category pages with and without the page cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="requests per page and mode")
+
+    def handle(self, *args, **options):
+        urls = [reverse("index"), reverse("categories")]
+        urls += [reverse("category", args=(pk,)) for pk in Category.objects.values_list("pk", flat=True)[:5]]
+
+        # the test client needs "testserver" to be an allowed host
+        with override_settings(ALLOWED_HOSTS=["*"]):
+            for enabled in (False, True):
+                with override_settings(PAGE_CACHE_ENABLED=enabled):
+                    self.run(urls, options["requests"], "cached" if enabled else "uncached")
+
+        self.stdout.write(f"page cache counters: {page_cache_stats()}")
+
+    def run(self, urls, requests, label):
+        client = Client()
+        # warm up templates, connections and (when enabled) the cache
+        for url in urls:
+            client.get(url)
+
+        started = time.perf_counter()
+        for _ in range(requests):
+            for url in urls:
+                client.get(url)
+        elapsed = time.perf_counter() - started
+
+        total = requests * len(urls)
+        self.stdout.write(f"{label:9} {total} requests in {elapsed:.2f}s: {total / elapsed:.1f} req/s")
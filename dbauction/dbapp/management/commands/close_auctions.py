@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from dbapp.closing import close_expired
+
+
+class Command(BaseCommand):
+    help = ("Close the auctions whose end time has passed, in batches. Safe to run in several "
+            "replicas at once: each batch skips the rows another worker has locked.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="auctions closed per transaction")
+        parser.add_argument("--loop", action="store_true", help="keep running, checking every --interval seconds")
+        parser.add_argument("--interval", type=float, default=5.0, help="seconds between checks with --loop")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        while True:
+            # a long-running worker must not hold a connection the database has dropped
+            close_old_connections()
+            closed = won = 0
+            while True:
+                batch = close_expired(batch_size)
+                for auction in batch:
+                    if auction.highest_bidder_id is not None:
+                        won += 1
+                    if options["verbosity"] > 1:
+                        winner = (f"won by user {auction.highest_bidder_id} at {auction.current_bid}"
+                                  if auction.highest_bidder_id is not None else "no bids")
+                        self.stdout.write(f"Auction {auction.id}: {winner}")
+                closed += len(batch)
+                if len(batch) < batch_size:
+                    break
+
+            if closed or not options["loop"]:
+                self.stdout.write(self.style.SUCCESS(f"Closed {closed} auctions, {won} with a winner."))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
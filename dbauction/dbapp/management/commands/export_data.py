@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from dbapp import transfer
+
+
+class Command(BaseCommand):
+    help = ("Stream auctions, bids, comments or watchlists to newline-delimited JSON or CSV, "
+            "in primary key order and in constant memory.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=list(transfer.TABLES))
+        parser.add_argument("--output", "-o", help="file to write, standard output if left out")
+        parser.add_argument("--format", choices=transfer.FORMATS,
+                            help="ndjson or csv; by default taken from the --output extension, else ndjson")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="rows read per query")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or transfer.format_for(options["output"])
+        # progress goes to stderr, standard output may be the data itself
+        progress = self.stderr.write if options["verbosity"] > 1 else None
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as out:
+                written = transfer.export_rows(options["kind"], out, fmt, options["chunk_size"], progress)
+        else:
+            written = transfer.export_rows(options["kind"], sys.stdout, fmt, options["chunk_size"], progress)
+        self.stderr.write(self.style.SUCCESS(f"Exported {written} {options['kind']}."))
@@ -0,0 +1,43 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from dbapp import transfer
+
+
+class Command(BaseCommand):
+    help = ("Load auctions, bids, comments or watchlists written by export_data, in batches. "
+            "Import auctions first: the other kinds refer to them by id.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=list(transfer.TABLES))
+        parser.add_argument("input", help="file to read, - for standard input")
+        parser.add_argument("--format", choices=transfer.FORMATS,
+                            help="ndjson or csv; by default taken from the file extension, else ndjson")
+        parser.add_argument("--batch-size", type=int, default=1000, help="rows per bulk insert")
+        parser.add_argument("--ignore-conflicts", action="store_true",
+                            help="skip rows whose id already exists, e.g. to resume an interrupted import")
+
+    def handle(self, *args, **options):
+        path = options["input"]
+        fmt = options["format"] or transfer.format_for(path)
+        progress = self.stdout.write if options["verbosity"] > 1 else None
+        started = time.perf_counter()
+        try:
+            if path == "-":
+                read = self.load(sys.stdin, fmt, options, progress)
+            else:
+                with open(path, newline="", encoding="utf-8") as stream:
+                    read = self.load(stream, fmt, options, progress)
+        except IntegrityError as exc:
+            raise CommandError(f"{exc}. Auctions must be imported before what refers to them; "
+                               "--ignore-conflicts skips rows whose id exists already.")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {read} {options['kind']} in {elapsed:.1f}s ({read / elapsed if elapsed else 0:.0f} rows/s)."))
+
+    def load(self, stream, fmt, options, progress):
+        return transfer.import_rows(options["kind"], transfer.read_rows(stream, fmt), options["batch_size"],
+                                    options["ignore_conflicts"], progress)
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from dbapp.models import Auction, Bid
+
+
+class Command(BaseCommand):
+    help = "Backfill and reconcile Auction.bid_count and Auction.highest_bidder from the bid table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="number of auctions checked per batch")
+        parser.add_argument("--dry-run", action="store_true", help="report drifted auctions without writing")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        bids = Bid.objects.filter(auction=OuterRef("pk")).order_by()
+        bid_count = bids.values("auction").annotate(n=Count("id")).values("n")
+        # the leader is the earliest bid at the highest price, later equal bids are never accepted
+        leader = bids.order_by("-bid_price", "id").values("bider")[:1]
+
+        checked = fixed = 0
+        last_id = 0
+        while True:
+            # walk the auctions by primary key so every batch is an index range scan
+            batch = list(
+                Auction.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .annotate(
+                    actual_count=Coalesce(Subquery(bid_count, output_field=IntegerField()), Value(0)),
+                    actual_leader=Subquery(leader),
+                )
+                .only("id", "bid_count", "highest_bidder")[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            checked += len(batch)
+
+            # one statement reads each auction and its bids, so what it finds
+            # drifted was drifted at that moment
+            drifted = [auction for auction in batch
+                       if auction.bid_count != auction.actual_count or auction.highest_bidder_id != auction.actual_leader]
+            if options["dry_run"]:
+                fixed += len(drifted)
+                continue
+
+            now = timezone.now()
+            for auction in drifted:
+                # compare and set: place_bid moves bid_count with every bid it
+                # inserts, so a row bid on since the read matches nothing here
+                # and keeps the newer values, to be checked on the next run
+                # (update() skips auto_now, and the API's ETags follow update_date)
+                fixed += Auction.objects.filter(
+                    pk=auction.pk, bid_count=auction.bid_count, highest_bidder=auction.highest_bidder_id,
+                ).update(bid_count=auction.actual_count, highest_bidder=auction.actual_leader, update_date=now)
+
+        verb = "would fix" if options["dry_run"] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} auctions, {verb} {fixed}."))
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.7 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dbapp', '0003_auction_bid_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auction',
+            index=models.Index(fields=['closed', 'creation_date'], name='auction_open_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auction',
+            index=models.Index(fields=['category', 'closed', 'creation_date'], name='auction_cat_open_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['auction', 'bid_price'], name='bid_auction_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['auction', 'cm_date'], name='comment_auction_date_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.7 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dbapp', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['auction', 'bid_date', 'id'], name='bid_auction_date_idx'),
+        ),
+    ]
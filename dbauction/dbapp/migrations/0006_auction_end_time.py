@@ -0,0 +1,22 @@
+# Generated by Django 3.1.7 on 2026-10-18 14:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dbapp', '0005_bid_history_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auction',
+            name='end_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='auction',
+            index=models.Index(fields=['closed', 'end_time'], name='auction_open_end_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.1.7 on 2026-10-18 14:57
+
+import dbapp.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# the index itself is vendor specific SQL, see dbapp/search.py
+def create_index(apps, schema_editor):
+    from dbapp.search import create_index
+    create_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    from dbapp.search import drop_index
+    drop_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dbapp', '0006_auction_end_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuctionText',
+            fields=[
+                ('auction', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_text', serialize=False, to='dbapp.auction')),
+                ('document', dbapp.models.SearchDocumentField(db_column='dbapp_auction_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'dbapp_auction_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.7 on 2026-10-18 15:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dbapp', '0007_auction_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['bider', 'auction', 'bid_price'], name='bid_bidder_auction_price_idx'),
+        ),
+    ]
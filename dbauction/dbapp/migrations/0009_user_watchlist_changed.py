@@ -0,0 +1,18 @@
+# Generated by Django 3.1.7 on 2026-10-18 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dbapp', '0008_bid_bidder_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='watchlist_changed',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
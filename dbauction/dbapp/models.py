@@ -3,7 +3,8 @@ from django.db import models
 
 
 class User(AbstractUser):
-    pass
+    # time.time_ns() of the last change to the user's watchlist (dbapp.watching)
+    watchlist_changed = models.BigIntegerField(default=0)
 
     def __str__(self):
         return f"User id: {self.id} | Username: {self.username}"
@@ -20,6 +21,14 @@ class Category(models.Model):
         return f"{self.title}"
 
 
+# queries shared by the auction views
+class AuctionQuerySet(models.QuerySet):
+    def active(self):
+        # closed=False is rendered as "WHERE NOT closed", which the planner
+        # cannot match against the (closed, ...) indexes; IN (false) can
+        return self.filter(closed__in=[False])
+
+
 # define the model of a auction list
 class Auction(models.Model):
     title = models.CharField(max_length=64)
@@ -32,8 +41,26 @@ class Auction(models.Model):
     closed = models.BooleanField(default=False)
     creation_date = models.DateTimeField(auto_now_add=True)
     update_date = models.DateTimeField(auto_now=True, null=True)
+    # denormalized bid stats, kept in step with every accepted bid (see bidding.place_bid)
+    bid_count = models.PositiveIntegerField(default=0)
+    highest_bidder = models.ForeignKey(User, on_delete=models.SET_NULL, related_name="auction_leading", blank=True, null=True)
+    # bidding stops at end_time and the close_auctions worker then closes the
+    # auction; without one it runs until the seller closes it
+    end_time = models.DateTimeField(blank=True, null=True)
+
+    objects = AuctionQuerySet.as_manager()
     # lastBid = models.ForeignKey(Bid, on_delete=models.CASCADE, blank=True, null=True) 
 
+    class Meta:
+        indexes = [
+            # active listings, newest first (index page)
+            models.Index(fields=["closed", "creation_date"], name="auction_open_created_idx"),
+            # active listings of one category, newest first (category page)
+            models.Index(fields=["category", "closed", "creation_date"], name="auction_cat_open_created_idx"),
+            # active listings past their end time, soonest first (close_auctions)
+            models.Index(fields=["closed", "end_time"], name="auction_open_end_idx"),
+        ]
+
     def __str__(self):
         return f"Auction id: {self.id} | Title: {self.title} | Seller: {self.seller} | Closed: {self.closed}"
     
@@ -41,6 +68,35 @@ class Auction(models.Model):
         return [(field.name, getattr(self, field.name)) for field in Auction._meta.fields]
 
 
+# the text of the auctions as SQLite's full-text index sees it (see search.py);
+# on MySQL the FULLTEXT index sits on the auction table itself
+class SearchDocumentField(models.TextField):
+    """FTS5's hidden column named after its table, the left side of ``MATCH``."""
+
+
+@SearchDocumentField.register_lookup
+class FullTextMatch(models.Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+class AuctionText(models.Model):
+    auction = models.OneToOneField(Auction, on_delete=models.DO_NOTHING, primary_key=True, db_column="rowid",
+                                   related_name="search_text")
+    document = SearchDocumentField(db_column="dbapp_auction_fts")
+    # bm25 relevance to the query being matched, lower is better
+    rank = models.FloatField()
+
+    class Meta:
+        # an FTS5 virtual table, created by migration 0007 and kept in step by triggers
+        managed = False
+        db_table = "dbapp_auction_fts"
+
+
 # define the model of a bid
 class Bid(models.Model):
     bider = models.ForeignKey(User, on_delete=models.CASCADE, related_name="bids")
@@ -48,6 +104,16 @@ class Bid(models.Model):
     bid_price = models.DecimalField(max_digits=9, decimal_places=2)
     auction = models.ForeignKey(Auction, on_delete=models.CASCADE, related_name="auction_bids")
 
+    class Meta:
+        indexes = [
+            # highest bid of an auction
+            models.Index(fields=["auction", "bid_price"], name="bid_auction_price_idx"),
+            # bid history of an auction in time order, paged by (bid_date, id)
+            models.Index(fields=["auction", "bid_date", "id"], name="bid_auction_date_idx"),
+            # a user's highest bid on an auction (watchlist page)
+            models.Index(fields=["bider", "auction", "bid_price"], name="bid_bidder_auction_price_idx"),
+        ]
+
     def __str__(self):
         return f"{self.bider} bid ${self.bid_price} on {self.auction}"
 
@@ -60,6 +126,12 @@ class Comment(models.Model):
     cm_date = models.DateTimeField(auto_now_add=True)
     auction = models.ForeignKey(Auction, on_delete=models.CASCADE, related_name="auction_comments")
 
+    class Meta:
+        indexes = [
+            # comments of an auction, newest first (listing page)
+            models.Index(fields=["auction", "cm_date"], name="comment_auction_date_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user} comments on {self.auction}"
 
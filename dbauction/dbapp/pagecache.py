@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .asyncdb import run_db
+
+# hit/miss counters of this process, see page_cache_stats()
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[settings.PAGE_CACHE_ALIAS]
+
+
+def _generation_key(scope):
+    return f"pagecache:gen:{scope}"
+
+
+def _generation(cache, scope):
+    # a missing generation (first use, or evicted) starts from a fresh unique
+    # value so it can never line up with pages cached under an older one
+    key = _generation_key(scope)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def invalidate(*scopes):
+    """Drop every cached page of the given scopes by moving them to a new generation."""
+    cache = _cache()
+    for scope in scopes:
+        try:
+            cache.incr(_generation_key(scope))
+        except ValueError:
+            # nothing cached under this scope yet
+            pass
+
+
+def invalidate_auction(category_id):
+    """Invalidate the pages listing an auction of ``category_id``."""
+    # the categories page shows active auction counts, search results prices
+    scopes = ["index", "categories", "search"]
+    if category_id is not None:
+        scopes.append(f"category:{category_id}")
+    invalidate(*scopes)
+
+
+def page_cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def _cacheable(request):
+    # pages of signed-in users show their name and menu, and a pending flash
+    # message must be rendered for the visitor it belongs to
+    return (
+        settings.PAGE_CACHE_ENABLED
+        and request.method == "GET"
+        and not request.user.is_authenticated
+        and not len(messages.get_messages(request))
+    )
+
+
+def _lookup(request, name):
+    # returns (key, cached response); the key is None when the page may not be cached
+    if not _cacheable(request):
+        return None, None
+    cache = _cache()
+    # every page also depends on the category menu in layout.html
+    generations = f"{_generation(cache, 'all')}.{_generation(cache, name)}"
+    key = f"pagecache:page:{name}:{generations}:{request.GET.urlencode()}"
+
+    content = cache.get(key)
+    if content is None:
+        _count("misses")
+        return key, None
+    _count("hits")
+    response = HttpResponse(content)
+    response["X-Page-Cache"] = "hit"
+    return key, response
+
+
+def _store(key, response):
+    if response.status_code == 200 and not response.streaming:
+        _cache().set(key, response.content, settings.PAGE_CACHE_TIMEOUT)
+    response["X-Page-Cache"] = "miss"
+    return response
+
+
+def cache_anonymous_page(scope):
+    """Cache the rendered page of a view for anonymous visitors.
+
+    ``scope`` maps the view's URL kwargs to the name under which the page is
+    invalidated (``"index"``, ``"category:<id>"``...). The key also holds the
+    scope's generation and the query string, so each keyset page is cached
+    separately and ``invalidate(scope)`` drops all of them at once. Works on
+    sync and async views alike.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapped(request, *args, **kwargs):
+                key, response = await run_db(_lookup, request, scope(**kwargs))
+                if response is not None:
+                    return response
+                response = await view(request, *args, **kwargs)
+                return response if key is None else await run_db(_store, key, response)
+            return async_wrapped
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            key, response = _lookup(request, scope(**kwargs))
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            return response if key is None else _store(key, response)
+        return wrapped
+    return decorator
@@ -0,0 +1,134 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset, with cursors to its neighbours."""
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def encode_cursor(values):
+    # str() keeps full microsecond precision for datetimes, unlike DjangoJSONEncoder
+    raw = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def key_field(queryset, name):
+    # keys are model fields, or annotations such as a search score
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    return queryset.model._meta.get_field(name)
+
+
+class InvalidCursor(ValueError):
+    """A ``?after=``/``?before=`` token that is not one this module wrote."""
+
+
+def decode_cursor(token, fields):
+    """Turn a cursor token back into values of ``fields``, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        # encode_cursor only writes strings and numbers, and never a null:
+        # anything else would reach the WHERE clause as a bad or NULL bound
+        if not all(isinstance(value, (str, int, float)) and not isinstance(value, bool) for value in values):
+            return None
+        values = [field.to_python(value) for field, value in zip(fields, values)]
+    except (binascii.Error, TypeError, ValueError, ValidationError):
+        return None
+    return None if None in values else values
+
+
+def _seek(keys, values, backwards):
+    # row-value comparison "(k1, k2) < (v1, v2)" spelled out as
+    # k1 < v1 OR (k1 = v1 AND k2 < v2), which the planner turns into a range scan
+    condition = Q()
+    equal = Q()
+    for key, value in zip(keys, values):
+        name = key.lstrip("-")
+        descending = key.startswith("-")
+        op = "lt" if descending != backwards else "gt"
+        condition |= equal & Q(**{f"{name}__{op}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def paginate(request, queryset, keys, page_size=None, strict=False):
+    """Return one page of ``queryset`` ordered by ``keys``.
+
+    ``keys`` must end with a unique field (usually ``id``) so that every row
+    has a distinct position. The page after/before a cursor is fetched with a
+    ``WHERE`` on the key columns plus ``LIMIT``, so its cost does not grow with
+    the page number the way ``OFFSET`` does. The cursor comes from the
+    ``?after=`` or ``?before=`` query parameter; a malformed one gives the
+    first page, or with ``strict`` raises ``InvalidCursor``.
+    """
+    page_size = page_size or settings.AUCTION_PAGE_SIZE
+    names = [key.lstrip("-") for key in keys]
+    fields = [key_field(queryset, name) for name in names]
+
+    after = request.GET.get("after")
+    before = request.GET.get("before")
+    backwards = False
+    values = None
+    if after:
+        values = decode_cursor(after, fields)
+    elif before:
+        values = decode_cursor(before, fields)
+        backwards = values is not None
+
+    if (after or before) and values is None and strict:
+        raise InvalidCursor(after or before)
+
+    if backwards:
+        # walk the index the other way and flip the rows back afterwards
+        ordering = [key[1:] if key.startswith("-") else f"-{key}" for key in keys]
+    else:
+        ordering = list(keys)
+
+    queryset = queryset.order_by(*ordering)
+    if values is not None:
+        queryset = queryset.filter(_seek(keys, values, backwards))
+
+    rows = list(queryset[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if backwards:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, values is not None
+
+    def cursor(row):
+        # rows are model instances, or dicts for values() querysets
+        if isinstance(row, dict):
+            return encode_cursor([row[name] for name in names])
+        return encode_cursor([getattr(row, name) for name in names])
+
+    return KeysetPage(
+        rows,
+        has_next=has_next,
+        has_previous=has_previous,
+        next_cursor=cursor(rows[-1]) if has_next and rows else None,
+        previous_cursor=cursor(rows[0]) if has_previous and rows else None,
+    )
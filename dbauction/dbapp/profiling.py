@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger("dbapp.profiling")
+
+# profile of the request being handled; a context variable rather than a
+# thread-local so it follows the request into sync_to_async threads under ASGI
+current_profile = ContextVar("current_profile", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+        # async views run the queries of one request on several threads
+        self._lock = threading.Lock()
+
+    def add_query(self, sql, duration):
+        with self._lock:
+            self.queries += 1
+            self.db_time += duration
+            if duration >= self.slowest_time:
+                self.slowest_time = duration
+                self.slowest_sql = sql
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper that charges each query to the current request."""
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """``connection_created`` receiver adding ``record_query`` to every connection."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        profile = current_profile.get()
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            if profile is not None:
+                profile.template_time += time.perf_counter() - started
+
+
+class ProfilingDjangoTemplates(DjangoTemplates):
+    """Django template backend that charges render time to the current request."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def query_budget(view_name):
+    return settings.QUERY_BUDGETS.get(view_name, settings.QUERY_BUDGET_DEFAULT)
+
+
+def finish(request, response, profile):
+    match = getattr(request, "resolver_match", None)
+    view_name = match.url_name if match else None
+    total = profile.total_time
+
+    response["Server-Timing"] = ", ".join([
+        f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries"',
+        f"tpl;dur={profile.template_time * 1000:.1f}",
+        f"total;dur={total * 1000:.1f}",
+    ])
+
+    logger.info(json.dumps({
+        "event": "request_profile",
+        "method": request.method,
+        "path": request.path,
+        "view": view_name,
+        "status": response.status_code,
+        "queries": profile.queries,
+        "db_ms": round(profile.db_time * 1000, 2),
+        "template_ms": round(profile.template_time * 1000, 2),
+        "total_ms": round(total * 1000, 2),
+        "slowest_ms": round(profile.slowest_time * 1000, 2),
+        "slowest_sql": profile.slowest_sql[:500] if profile.slowest_sql else None,
+    }))
+
+    budget = query_budget(view_name)
+    if budget is not None and profile.queries > budget:
+        message = f"{view_name} ran {profile.queries} queries, over its budget of {budget}"
+        if settings.QUERY_BUDGET_MODE == "fail":
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+    return response
+
+
+@sync_and_async_middleware
+def QueryProfileMiddleware(get_response):
+    """Record query count, DB time, template time and the slowest SQL per request.
+
+    The numbers are sent back as ``Server-Timing`` headers and logged as one
+    JSON line per request. Views whose url name is in ``QUERY_BUDGETS`` (or
+    any view when ``QUERY_BUDGET_DEFAULT`` is set) are checked against that
+    query budget, logging a warning or raising ``QueryBudgetExceeded`` when
+    ``QUERY_BUDGET_MODE`` is ``"fail"``.
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            profile = RequestProfile()
+            token = current_profile.set(profile)
+            try:
+                response = await get_response(request)
+            finally:
+                current_profile.reset(token)
+            return finish(request, response, profile)
+    else:
+        def middleware(request):
+            profile = RequestProfile()
+            token = current_profile.set(profile)
+            try:
+                response = get_response(request)
+            finally:
+                current_profile.reset(token)
+            return finish(request, response, profile)
+
+    return middleware
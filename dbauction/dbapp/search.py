@@ -0,0 +1,133 @@
+"""Full-text search over auction titles and descriptions.
+
+MySQL answers from a FULLTEXT index on the auction table, SQLite from an
+FTS5 table (``AuctionText``) that triggers keep in step with it. Either way
+the database finds the auctions holding every word of the query through the
+index and ranks them by relevance, never scanning the auction table with
+``LIKE``. Results are annotated with ``score`` (higher is better) and paged by
+``SEARCH_KEYS``.
+"""
+import re
+
+from django.db import connections
+from django.db.models import ExpressionWrapper, F, FloatField, Func, Value
+
+from .models import Auction
+
+# best match first; ids break ties so that every row has a distinct position
+SEARCH_KEYS = ("-score", "-id")
+
+# only the words of a query are searched for, so that nothing a user types
+# is read as search syntax
+WORD = re.compile(r"\w+")
+MAX_WORDS = 8
+
+STATUSES = ("open", "closed", "all")
+
+FTS_TABLE = "dbapp_auction_fts"
+
+# the FTS5 table indexes the auction table's own columns ("external content")
+# instead of holding a second copy of the text
+SQLITE_INDEX = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"title, description, content='dbapp_auction', content_rowid='id')",
+]
+SQLITE_TRIGGERS = {
+    f"{FTS_TABLE}_insert": (
+        f"AFTER INSERT ON dbapp_auction BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description); END"
+    ),
+    f"{FTS_TABLE}_delete": (
+        f"AFTER DELETE ON dbapp_auction BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) "
+        f"VALUES ('delete', old.id, old.title, old.description); END"
+    ),
+    # Model.save() writes every column, so only a changed text is reindexed
+    f"{FTS_TABLE}_update": (
+        f"AFTER UPDATE OF title, description ON dbapp_auction "
+        f"WHEN old.title IS NOT new.title OR old.description IS NOT new.description BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) "
+        f"VALUES ('delete', old.id, old.title, old.description); "
+        f"INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description); END"
+    ),
+}
+MYSQL_INDEX = "CREATE FULLTEXT INDEX auction_search_idx ON dbapp_auction (title, description)"
+
+
+class Relevance(Func):
+    """MySQL's relevance of an auction's title and description to a boolean-mode query."""
+    output_field = FloatField()
+
+    def __init__(self, query):
+        super().__init__(F("title"), F("description"), Value(query))
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        (title, _), (description, _), (query, params) = (compiler.compile(arg) for arg in self.source_expressions)
+        # must name the columns of auction_search_idx exactly, in its order
+        return f"MATCH ({title}, {description}) AGAINST ({query} IN BOOLEAN MODE)", params
+
+
+def search(text, category=None, status="open", using="default"):
+    """Auctions containing every word of ``text``, annotated with their relevance as ``score``.
+
+    ``status`` is one of ``STATUSES``. Words are matched whole and without
+    regard to case; MySQL also drops its stopwords and words shorter than
+    ``innodb_ft_min_token_size``.
+    """
+    words = WORD.findall(text)[:MAX_WORDS]
+    auctions = Auction.objects.using(using)
+    if not words:
+        return auctions.none().annotate(score=Value(0.0, output_field=FloatField()))
+
+    if connections[using].vendor == "mysql":
+        # MATCH ... > 0 is what lets the optimizer read auction_search_idx
+        auctions = auctions.annotate(score=Relevance(" ".join(f"+{word}" for word in words))).filter(score__gt=0)
+    else:
+        # filtering first joins the FTS table with an INNER JOIN, which the
+        # planner then drives the query from
+        auctions = auctions.filter(search_text__document__match=" ".join(f'"{word}"' for word in words)).annotate(
+            score=ExpressionWrapper(-F("search_text__rank"), output_field=FloatField()))
+
+    if category is not None:
+        auctions = auctions.filter(category=category)
+    if status == "open":
+        auctions = auctions.active()
+    elif status == "closed":
+        auctions = auctions.filter(closed__in=[True])
+    return auctions
+
+
+def create_index(connection):
+    """Create the full-text index of the auctions, or on SQLite add whatever is missing of it."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "mysql":
+            cursor.execute(MYSQL_INDEX)
+        elif connection.vendor == "sqlite":
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'dbapp_auction'")
+            existing = {name for name, in cursor.fetchall()}
+            for sql in SQLITE_INDEX:
+                cursor.execute(sql)
+            missing = SQLITE_TRIGGERS.keys() - existing
+            for name in missing:
+                cursor.execute(f"CREATE TRIGGER {name} {SQLITE_TRIGGERS[name]}")
+            if missing:
+                # changes made while a trigger was missing never reached the index
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == "mysql":
+            cursor.execute("DROP INDEX auction_search_idx ON dbapp_auction")
+        elif connection.vendor == "sqlite":
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def repair_index(sender, using, **kwargs):
+    # SQLite alters a table by copying it into a new one, and the triggers of
+    # the old one are dropped with it; put them back after every migrate
+    connection = connections[using]
+    if connection.vendor == "sqlite" and FTS_TABLE in connection.introspection.table_names():
+        create_index(connection)
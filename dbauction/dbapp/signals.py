@@ -0,0 +1,37 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .categorycache import category_cache
+from .models import Category, User, Watchlist
+from .pagecache import invalidate
+from .watching import load as load_watching, touch
+
+
+# category names show in the menu of every page and counts on the categories page
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_caches(sender, instance, **kwargs):
+    category_cache.invalidate()
+    invalidate("all")
+
+
+# listing pages read the watched auctions from the session, so fill it at sign-in
+@receiver(user_logged_in)
+def load_watched_auctions(sender, request, user, **kwargs):
+    if request is not None:
+        load_watching(request, user)
+
+
+# changes made through the ORM, as the admin makes them, date the sessions' copies
+@receiver(m2m_changed, sender=Watchlist.auctions.through)
+def stamp_watchlist_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # before a clear, while its rows still tell whose watchlists it empties
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        touch(User.objects.filter(watchlist=instance))
+    elif pk_set is None:
+        touch(User.objects.filter(watchlist__auctions=instance))
+    else:
+        touch(User.objects.filter(watchlist__in=pk_set))
@@ -0,0 +1,91 @@
+"""Server-sent event stream of an auction's live state, served by asgi.py.
+
+``GET /listing/<id>/events`` is answered here, in front of Django, because
+Django 3.1 iterates streaming responses synchronously and so cannot wait on
+a subscription without blocking the event loop. The stream sends the current
+state once and then whatever ``events.publish_auction`` pushes, with a
+comment line every ``AUCTION_EVENTS_KEEPALIVE`` seconds to keep proxies from
+closing it. It ends after the auction closes or when the browser goes away.
+"""
+import asyncio
+import json
+import re
+
+from django.conf import settings
+
+from .asyncdb import run_db
+from .events import auction_channel, auction_state, get_broker
+from .models import Auction
+
+EVENTS_PATH = re.compile(r"^/listing/(?P<auction_id>\d+)/events$")
+
+HEADERS = [
+    (b"content-type", b"text/event-stream"),
+    (b"cache-control", b"no-cache"),
+    # nginx would otherwise buffer the stream
+    (b"x-accel-buffering", b"no"),
+]
+
+
+def auction_snapshot(auction_id):
+    row = Auction.objects.filter(pk=auction_id).values_list("current_bid", "bid_count", "closed").first()
+    return None if row is None else auction_state(auction_id, *row)
+
+
+def format_event(state):
+    return f"event: auction\ndata: {json.dumps(state)}\n\n"
+
+
+async def _disconnected(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def stream_auction(scope, receive, send, auction_id):
+    # subscribe before reading the snapshot so no bid falls in between
+    subscription = get_broker().subscribe(auction_channel(auction_id))
+    disconnected = asyncio.ensure_future(_disconnected(receive))
+    update = None
+    try:
+        state = await run_db(auction_snapshot, auction_id)
+        if state is None:
+            await send({"type": "http.response.start", "status": 404, "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": b"The auction does not exist."})
+            return
+
+        await send({"type": "http.response.start", "status": 200, "headers": HEADERS})
+        # what was published before the snapshot was read is no news
+        subscription.seen(state)
+        while not state["closed"]:
+            await send({"type": "http.response.body", "body": format_event(state).encode(), "more_body": True})
+            state = None
+            while state is None:
+                update = update or asyncio.ensure_future(subscription.get())
+                done, _ = await asyncio.wait(
+                    {update, disconnected},
+                    timeout=settings.AUCTION_EVENTS_KEEPALIVE,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if disconnected in done:
+                    return
+                if update in done:
+                    state, update = update.result(), None
+                else:
+                    await send({"type": "http.response.body", "body": b": keepalive\n\n", "more_body": True})
+        await send({"type": "http.response.body", "body": format_event(state).encode()})
+    finally:
+        subscription.close()
+        for task in (update, disconnected):
+            if task is not None:
+                task.cancel()
+
+
+def with_auction_events(application):
+    """Wrap the Django ASGI ``application`` to serve the auction event streams itself."""
+    async def app(scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "GET":
+            match = EVENTS_PATH.match(scope["path"])
+            if match:
+                return await stream_auction(scope, receive, send, int(match.group("auction_id")))
+        return await application(scope, receive, send)
+    return app
@@ -1,3 +1,1188 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, Max
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from dbauction.backends.pool import ConnectionPool, PoolTimeout
+from dbauction.backends.sqlite3.base import DatabaseWrapper as SQLiteWrapper
+
+from . import async_views, bidding, bidhistory, transfer
+from .benchmark import data as benchmark_data
+from .bidding import place_bid
+from .categorycache import category_cache
+from .closing import close_expired
+from .events import InProcessBroker, auction_channel, auction_state, get_broker
+from .management.commands import reconcile_bid_stats
+from .models import User, Auction, Bid, Category, Comment, Watchlist
+from .pagination import decode_cursor
+from .profiling import QueryBudgetExceeded
+from .sse import stream_auction
+from .urls import urlpatterns
+from .watching import watched_auctions
+
+
+# tables that grow with traffic; a full scan of any of them is a regression
+HOT_TABLES = {"dbapp_auction", "dbapp_bid", "dbapp_comment", "dbapp_watchlist_auctions"}
+
+
+def full_scans(sql):
+    """Return the plan lines of ``sql`` that read a hot table without an index."""
+    scans = []
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            for row in cursor.fetchall():
+                detail = row[-1]
+                match = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+                if match and match.group(1) in HOT_TABLES and "INDEX" not in detail:
+                    scans.append(detail)
+        elif connection.vendor == "mysql":
+            cursor.execute("EXPLAIN " + sql)
+            columns = [col[0] for col in cursor.description]
+            for row in cursor.fetchall():
+                plan = dict(zip(columns, row))
+                # tiny test tables may legitimately be read with type=ALL, so only
+                # flag the ones for which the optimizer had no usable index at all
+                if plan["table"] in HOT_TABLES and plan["type"] == "ALL" and not plan["possible_keys"]:
+                    scans.append(str(plan))
+    return scans
+
+
+# a view going over its QUERY_BUDGETS entry fails the request outright
+@override_settings(QUERY_BUDGET_MODE="fail")
+class QueryPlanTests(TestCase):
+    """Replay every view in dbapp/urls.py and EXPLAIN each statement it runs."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.category = Category.objects.create(title="Tables")
+        cls.auctions = [
+            Auction.objects.create(
+                title=f"Table {i}",
+                description="Solid oak.",
+                starting_bid=Decimal("10.00"),
+                current_bid=Decimal("10.00"),
+                category=cls.category,
+                seller=cls.seller,
+            )
+            for i in range(5)
+        ]
+        cls.auction = cls.auctions[0]
+        for price in ("11.00", "12.00"):
+            Bid.objects.create(auction=cls.auction, bider=cls.bidder, bid_price=Decimal(price))
+        Comment.objects.create(auction=cls.auction, user=cls.bidder, headline="Nice", message="Is it solid?")
+        Watchlist.objects.create(user=cls.bidder).auctions.add(*cls.auctions[1:])
+
+    def setUp(self):
+        # the in-process category cache outlives each test's rolled back data
+        category_cache.invalidate()
+        category_cache.all()
+
+    def requests(self):
+        auction_id = self.auction.id
+        # (url name, method, url kwargs, POST data)
+        return [
+            ("index", "get", {}, None),
+            ("login", "get", {}, None),
+            ("logout", "get", {}, None),
+            ("register", "get", {}, None),
+            ("create", "get", {}, None),
+            ("create", "post", {}, {"title": "Chair", "description": "Pine.", "starting_bid": "5.00"}),
+            ("listing", "get", {"auction_id": auction_id}, None),
+            ("auction_events", "get", {"auction_id": auction_id}, None),
+            ("bid", "post", {"auction_id": auction_id}, {"bid_price": "20.00"}),
+            ("comment", "post", {"auction_id": auction_id}, {"headline": "Hi", "message": "Still there?"}),
+            ("addWatchlist", "post", {"auction_id": auction_id}, None),
+            ("removeWatchlist", "post", {"auction_id": auction_id}, None),
+            ("close", "post", {"auction_id": auction_id}, None),
+            ("categories", "get", {}, None),
+            ("category", "get", {"category_id": self.category.id}, None),
+            ("watchlist", "get", {}, None),
+            ("api_auctions", "get", {}, None),
+            ("api_auction", "get", {"auction_id": auction_id}, None),
+            ("api_bids", "get", {"auction_id": auction_id}, None),
+            ("api_bid_summary", "get", {"auction_id": auction_id}, None),
+            ("bid_history", "get", {"auction_id": auction_id}, None),
+            ("api_watchlist", "get", {}, None),
+            ("search", "get", {}, {"q": "oak table", "category": self.category.id}),
+            ("api_search", "get", {}, {"q": "oak", "status": "all"}),
+        ]
+
+    def test_every_view_is_covered(self):
+        covered = {name for name, *_ in self.requests()}
+        self.assertEqual(covered, {pattern.name for pattern in urlpatterns})
+
+    def test_no_full_scans(self):
+        for name, method, kwargs, data in self.requests():
+            # the seller may close the auction, everything else runs as the bidder
+            self.client.force_login(self.seller if name == "close" else self.bidder)
+            with self.subTest(view=name, method=method):
+                with CaptureQueriesContext(connection) as ctx:
+                    getattr(self.client, method)(reverse(name, kwargs=kwargs), data or {})
+
+                for query in ctx.captured_queries:
+                    sql = query["sql"]
+                    if not sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                        continue
+                    self.assertEqual(full_scans(sql), [], sql)
+
+
+class QueryCountTests(TestCase):
+    """Read views must run a fixed number of queries however many rows they show."""
+
+    def assertMaxQueries(self, limit, url):
+        """Request ``url`` and fail if it ran more than ``limit`` queries."""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx), limit, "\n".join(query["sql"] for query in ctx.captured_queries))
+        return len(ctx)
+
+    def populate(self, rows):
+        user = User.objects.create_user(f"user{rows}", f"user{rows}@example.com", "pw")
+        category = Category.objects.create(title=f"Category {rows}")
+        auctions = [
+            Auction.objects.create(title=f"Item {i}", description="Pine.", category=category, seller=user)
+            for i in range(rows)
+        ]
+        for _ in auctions:
+            Comment.objects.create(auction=auctions[0], user=user, headline="Hi", message="Nice item.")
+        Watchlist.objects.create(user=user).auctions.add(*auctions)
+        # categories change rarely, so measure with the category cache warm
+        category_cache.all()
+        return user, category, auctions[0]
+
+    def test_query_count_is_independent_of_row_count(self):
+        counts = {}
+        for rows in (1, 10):
+            user, category, auction = self.populate(rows)
+            self.client.force_login(user)
+            urls = {
+                "index": reverse("index"),
+                "category": reverse("category", args=(category.id,)),
+                "listing": reverse("listing", args=(auction.id,)),
+                "watchlist": reverse("watchlist"),
+            }
+            for name, url in urls.items():
+                with self.subTest(view=name, rows=rows):
+                    counts.setdefault(name, set()).add(self.assertMaxQueries(settings.QUERY_BUDGETS[name], url))
+
+        for name, seen in counts.items():
+            self.assertEqual(len(seen), 1, f"{name} query count changed with row count: {seen}")
+
+
+def cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+class ProfilingTests(TestCase):
+    """QueryProfileMiddleware reports each request in a header and a log line, and polices budgets."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        cls.auction = Auction.objects.create(title="Clock", description="Brass.", seller=cls.seller)
+        Comment.objects.create(auction=cls.auction, user=cls.seller, headline="Age", message="About 1900.")
+
+    def setUp(self):
+        category_cache.invalidate()
+        category_cache.all()
+        self.url = reverse("listing", args=(self.auction.id,))
+
+    def test_header_and_log_line(self):
+        with self.assertLogs("dbapp.profiling", "INFO") as logs, CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        timing = dict(part.split(";", 1) for part in response["Server-Timing"].split(", "))
+        self.assertEqual(set(timing), {"db", "tpl", "total"})
+        self.assertIn(f'desc="{len(ctx)} queries"', timing["db"])
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["event"], line["view"], line["method"], line["status"]),
+                         ("request_profile", "listing", "GET", 200))
+        self.assertEqual(line["queries"], len(ctx))
+        self.assertGreater(line["template_ms"], 0)
+        self.assertGreaterEqual(line["db_ms"], line["slowest_ms"])
+        # the statement before its parameters, cut to 500 characters
+        self.assertLessEqual(len(line["slowest_sql"]), 500)
+        self.assertTrue(any(query["sql"].startswith(line["slowest_sql"][:100]) for query in ctx.captured_queries))
+
+    @override_settings(QUERY_BUDGETS={"listing": 1}, QUERY_BUDGET_MODE="warn")
+    def test_warn_mode_logs_an_overrun(self):
+        with self.assertLogs("dbapp.profiling", "WARNING") as logs:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([record.getMessage() for record in logs.records], ["listing ran 2 queries, over its budget of 1"])
+
+    @override_settings(QUERY_BUDGETS={"listing": 1}, QUERY_BUDGET_MODE="fail")
+    def test_fail_mode_raises(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "listing ran 2 queries, over its budget of 1"):
+            self.client.get(self.url)
+
+    @override_settings(QUERY_BUDGETS={"listing": 2}, QUERY_BUDGET_MODE="fail")
+    def test_within_budget(self):
+        with self.assertLogs("dbapp.profiling", "INFO") as logs:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual([record.levelname for record in logs.records], ["INFO"])
+
+
+@override_settings(AUCTION_PAGE_SIZE=2, PAGE_CACHE_ENABLED=False)
+class PaginationTests(TestCase):
+    """Keyset pages follow each other without gaps or repeats, and bad cursors never reach the query."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        cls.auctions = [
+            Auction.objects.create(title=f"Stool {i}", description="Pine.", seller=cls.seller) for i in range(5)
+        ]
+        # three rows share a creation date, so the pages must split them by id
+        Auction.objects.filter(pk__in=[a.pk for a in cls.auctions[1:4]]).update(creation_date=cls.auctions[1].creation_date)
+
+    def setUp(self):
+        category_cache.invalidate()
+        category_cache.all()
+
+    def page(self, **params):
+        content = self.client.get(reverse("index"), params).content.decode()
+        titles = re.findall(r"<strong>\s*(Stool \d)</strong>", content)
+        links = dict(re.findall(r'href="\?(after|before)=([\w-]+)"', content))
+        return titles, links
+
+    def test_next_and_previous_links(self):
+        titles, links = self.page()
+        self.assertEqual(titles, ["Stool 4", "Stool 3"])
+        self.assertEqual(links.keys(), {"after"})
+        seen = list(titles)
+        while "after" in links:
+            titles, links = self.page(after=links["after"])
+            seen += titles
+        # the last page has only a way back
+        self.assertEqual(seen, [f"Stool {i}" for i in range(4, -1, -1)])
+        self.assertEqual(links.keys(), {"before"})
+
+        titles, links = self.page(before=links["before"])
+        self.assertEqual(titles, ["Stool 2", "Stool 1"])
+        self.assertEqual(links.keys(), {"after", "before"})
+        titles, links = self.page(before=links["before"])
+        self.assertEqual(titles, ["Stool 4", "Stool 3"])
+        self.assertEqual(links.keys(), {"after"})
+
+    def test_malformed_cursors(self):
+        tokens = ["%%%", "bm90IGpzb24", cursor([None, None]), cursor([1, 2]), cursor([{"a": 1}, 1]),
+                  cursor(["2021-01-01T00:00:00", "x"]), cursor(["2021-01-01T00:00:00"]), cursor([True, 1])]
+        first = self.page()
+        for token in tokens:
+            for param in ("after", "before"):
+                with self.subTest(token=token, param=param):
+                    # the HTML pages start over at the first page
+                    self.assertEqual(self.page(**{param: token}), first)
+                    response = self.client.get(reverse("api_auctions"), {param: token})
+                    self.assertEqual(response.status_code, 400)
+        self.assertEqual(decode_cursor(cursor(["2021-01-01T00:00:00+00:00", 3]), [Auction._meta.get_field("creation_date"),
+                                                                                Auction._meta.get_field("id")])[1], 3)
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class PageCacheTests(TestCase):
+    """Bids, closes, new listings and category changes reach the cached anonymous pages."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.category = Category.objects.create(title="Clocks")
+        cls.auction = Auction.objects.create(title="Mantel clock", description="Brass.", starting_bid=Decimal("10.00"),
+                                             current_bid=Decimal("10.00"), category=cls.category, seller=cls.seller)
+
+    def setUp(self):
+        # pages cached by earlier tests would otherwise be served here
+        caches[settings.PAGE_CACHE_ALIAS].clear()
+        category_cache.invalidate()
+        self.visitor = self.client_class()
+
+    def pages(self):
+        """Fetch the cached pages as an anonymous visitor: {url name: (cache outcome, content)}."""
+        urls = {"index": reverse("index"), "categories": reverse("categories"),
+                "category": reverse("category", args=(self.category.id,))}
+        pages = {}
+        for name, url in urls.items():
+            response = self.visitor.get(url)
+            pages[name] = (response["X-Page-Cache"], response.content.decode())
+        return pages
+
+    def assertRefreshed(self, text, names=("index", "categories", "category")):
+        pages = self.pages()
+        for name in names:
+            self.assertEqual(pages[name][0], "miss", name)
+            self.assertIn(text, pages[name][1], name)
+        # and cached again from then on
+        self.assertEqual({outcome for outcome, _ in self.pages().values()}, {"hit"})
+
+    def test_bid_close_and_new_auction(self):
+        self.pages()
+        self.assertEqual({outcome for outcome, _ in self.pages().values()}, {"hit"})
+
+        self.client.force_login(self.bidder)
+        self.client.post(reverse("bid", args=(self.auction.id,)), {"bid_price": "15.00"})
+        self.assertRefreshed("US $ 15.00", names=("index", "category"))
+
+        self.client.force_login(self.seller)
+        self.client.post(reverse("create"), {"title": "Wall clock", "description": "Oak.", "starting_bid": "8.00",
+                                             "category": self.category.id})
+        self.assertRefreshed("Wall clock", names=("index", "category"))
+        self.assertIn("2 active", self.pages()["categories"][1])
+
+        self.client.post(reverse("close", args=(self.auction.id,)))
+        self.assertRefreshed("1 active", names=("categories",))
+        self.assertNotIn("Mantel clock", self.pages()["index"][1])
+
+    def test_category_changes_refresh_the_menu(self):
+        self.pages()
+        Category.objects.create(title="Barometers")
+        self.assertIn("Barometers", [category.title for category in category_cache.all()])
+        self.assertRefreshed("Barometers")
+
+        category = Category.objects.get(pk=self.category.pk)
+        category.title = "Timepieces"
+        category.save()
+        self.assertEqual(category_cache.get(self.category.id).title, "Timepieces")
+        self.assertRefreshed("Timepieces")
+
+
+class BiddingTests(TestCase):
+    """place_bid accepts a bid only above both prices of an open auction, and says why it refused one."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.auction = Auction.objects.create(title="Lamp", description="Brass.", starting_bid=Decimal("10.00"),
+                                             current_bid=Decimal("10.00"), seller=cls.seller)
+
+    def test_accepted(self):
+        result = place_bid(self.auction.id, self.bidder, Decimal("12.50"))
+        self.assertTrue(result.accepted)
+        self.assertEqual((result.bid.bid_price, result.bid.bider), (Decimal("12.50"), self.bidder))
+        auction = Auction.objects.get(pk=self.auction.pk)
+        self.assertEqual((auction.current_bid, auction.bid_count, auction.highest_bidder), (Decimal("12.50"), 1, self.bidder))
+
+    def test_accepted_bid_returns_the_new_state(self):
+        category = Category.objects.create(title="Lamps")
+        Auction.objects.filter(pk=self.auction.pk).update(category=category, bid_count=4)
+        with CaptureQueriesContext(connection) as ctx:
+            result = place_bid(self.auction.id, self.bidder, Decimal("12.50"))
+        self.assertEqual(result.auction, bidding.AuctionState(category.id, Decimal("12.50"), 5, False))
+        if bidding._returns_from_update():
+            # the UPDATE sends it back, no read follows
+            self.assertFalse([query["sql"] for query in ctx.captured_queries if query["sql"].startswith("SELECT")])
+
+    def test_too_low(self):
+        self.assertEqual(place_bid(self.auction.id, self.bidder, Decimal("9.00")).status, bidding.TOO_LOW)
+        # a bid must beat the price, not match it
+        self.assertEqual(place_bid(self.auction.id, self.bidder, Decimal("10.00")).status, bidding.TOO_LOW)
+        self.assertTrue(place_bid(self.auction.id, self.bidder, Decimal("11.00")).accepted)
+        self.assertEqual(place_bid(self.auction.id, self.seller, Decimal("11.00")).status, bidding.TOO_LOW)
+        self.assertEqual(Bid.objects.filter(auction=self.auction).count(), 1)
+
+    def test_below_starting_bid(self):
+        # a price left below the starting bid does not lower the bar
+        Auction.objects.filter(pk=self.auction.pk).update(current_bid=Decimal("0.00"))
+        self.assertEqual(place_bid(self.auction.id, self.bidder, Decimal("5.00")).status, bidding.TOO_LOW)
+        self.assertTrue(place_bid(self.auction.id, self.bidder, Decimal("10.01")).accepted)
+
+    def test_closed_and_expired(self):
+        Auction.objects.filter(pk=self.auction.pk).update(closed=True)
+        self.assertEqual(place_bid(self.auction.id, self.bidder, Decimal("20.00")).status, bidding.CLOSED)
+        Auction.objects.filter(pk=self.auction.pk).update(closed=False, end_time=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(place_bid(self.auction.id, self.bidder, Decimal("20.00")).status, bidding.CLOSED)
+        self.assertFalse(Bid.objects.exists())
+
+    def test_not_found(self):
+        self.assertEqual(place_bid(self.auction.id + 1, self.bidder, Decimal("20.00")).status, bidding.NOT_FOUND)
+
+
+class ReconcileBidStatsTests(TestCase):
+    """reconcile_bid_stats repairs drifted counts and leaders, and only those."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.auctions = [Auction.objects.create(title=f"Lamp {i}", description="Brass.", seller=cls.seller)
+                        for i in range(2)]
+        # bids written behind place_bid's back leave both auctions drifted
+        for auction in cls.auctions:
+            Bid.objects.create(auction=auction, bider=cls.seller, bid_price=Decimal("3.00"))
+
+    def reconcile(self, *args):
+        out = io.StringIO()
+        call_command("reconcile_bid_stats", *args, stdout=out)
+        return out.getvalue().strip()
+
+    def stats(self, auction):
+        return Auction.objects.values_list("bid_count", "highest_bidder").get(pk=auction.pk)
+
+    def test_dry_run_writes_nothing(self):
+        self.assertEqual(self.reconcile("--dry-run"), "Checked 2 auctions, would fix 2.")
+        self.assertEqual(self.stats(self.auctions[0]), (0, None))
+        self.assertEqual(self.reconcile(), "Checked 2 auctions, fixed 2.")
+        self.assertEqual(self.stats(self.auctions[0]), (1, self.seller.id))
+        self.assertEqual(self.reconcile(), "Checked 2 auctions, fixed 0.")
+
+    def test_a_bid_placed_meanwhile_is_kept(self):
+        class BidFirst:
+            # the batch is read, then a bid lands before the repair is written
+            @staticmethod
+            def now():
+                place_bid(self.auctions[0].id, self.bidder, Decimal("5.00"))
+                return timezone.now()
+
+        with mock.patch.object(reconcile_bid_stats, "timezone", BidFirst):
+            self.assertEqual(self.reconcile(), "Checked 2 auctions, fixed 1.")
+        self.assertEqual(self.stats(self.auctions[0]), (1, self.bidder.id))
+        self.assertEqual(self.stats(self.auctions[1]), (1, self.seller.id))
+        self.assertEqual(self.reconcile(), "Checked 2 auctions, fixed 1.")
+        self.assertEqual(self.stats(self.auctions[0]), (2, self.bidder.id))
+
+
+class CompetingBidTests(TransactionTestCase):
+    """Of two bids racing at the same price, the conditional UPDATE lets exactly one win."""
+
+    def test_only_one_of_two_equal_bids_wins(self):
+        seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        bidders = [User.objects.create_user(f"bidder{i}", f"bidder{i}@example.com", "pw") for i in range(2)]
+        auction = Auction.objects.create(title="Lamp", description="Brass.", starting_bid=Decimal("10.00"),
+                                         current_bid=Decimal("10.00"), seller=seller)
+        start = threading.Barrier(2)
+        results = []
+
+        def bid(bidder):
+            start.wait()
+            try:
+                while True:
+                    try:
+                        results.append(place_bid(auction.id, bidder, Decimal("11.00")).status)
+                        return
+                    except OperationalError:
+                        # SQLite refuses a second writer instead of queueing it
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=bid, args=(bidder,)) for bidder in bidders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results), [bidding.ACCEPTED, bidding.TOO_LOW])
+        self.assertEqual(Bid.objects.filter(auction=auction).count(), 1)
+        auction.refresh_from_db()
+        self.assertEqual((auction.current_bid, auction.bid_count), (Decimal("11.00"), 1))
+
+
+class ConnectionReuseTests(SimpleTestCase):
+    """Pooled and persistent connections are reused while they work and replaced once they do not."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "reuse.sqlite3")
+
+    def wrapper(self, **settings_dict):
+        wrapper = SQLiteWrapper({**connection.settings_dict, "NAME": self.path, "POOL": None, **settings_dict}, alias="reuse")
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_pool_reuses_and_replaces_connections(self):
+        pool = ConnectionPool(lambda: sqlite3.connect(self.path, check_same_thread=False), max_size=1,
+                              wait_timeout=0, check_after=0, check=self.wrapper().ping)
+        self.addCleanup(pool.close_all)
+        first = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+
+        # the server dropped it while it sat in the pool
+        first.close()
+        pool.release(first)
+        second = pool.acquire()
+        self.assertIsNot(second, first)
+        second.execute("SELECT 1")
+        pool.release(second, discard=True)
+        self.assertEqual({key: pool.stats()[key] for key in ("created", "discarded", "size")},
+                         {"created": 2, "discarded": 2, "size": 0})
+
+    def test_health_check_replaces_a_broken_connection(self):
+        wrapper = self.wrapper(CONN_MAX_AGE=60, HEALTH_CHECKS=True)
+        wrapper.ensure_connection()
+        broken = wrapper.connection
+        broken.close()
+
+        # the next request checks the connection before its first query
+        wrapper.close_if_unusable_or_obsolete()
+        wrapper.ensure_connection()
+        self.assertIsNot(wrapper.connection, broken)
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            self.assertEqual(cursor.fetchone(), (1,))
+
+
+class AsyncRoutes:
+    """dbapp/urls.py with ASYNC_VIEWS on, as asgi.py serves it."""
+    urlpatterns = [
+        path(str(pattern.pattern), getattr(async_views, pattern.name), name=pattern.name)
+        if pattern.name in {"index", "category", "listing", "watchlist"} else pattern
+        for pattern in urlpatterns
+    ]
+
+
+# rows of the test transaction are only visible on its own connection, so the
+# async views must not spread their queries over other threads here
+@override_settings(ASYNC_PARALLEL_QUERIES=False, QUERY_BUDGET_MODE="fail", PAGE_CACHE_ENABLED=False)
+class AsyncViewTests(TestCase):
+    """The async views must render the same pages as the sync ones, within the same budgets."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.category = Category.objects.create(title="Lamps")
+        cls.open = Auction.objects.create(title="Desk lamp", description="Brass.", category=cls.category, seller=cls.seller)
+        cls.closed = Auction.objects.create(
+            title="Floor lamp", description="Steel.", category=cls.category, seller=cls.seller,
+            closed=True, highest_bidder=cls.bidder, bid_count=1,
+        )
+        Comment.objects.create(auction=cls.open, user=cls.bidder, headline="Bulb", message="Which bulb?")
+        Watchlist.objects.create(user=cls.bidder).auctions.add(cls.open)
+
+    def setUp(self):
+        category_cache.invalidate()
+        category_cache.all()
+
+    def get(self, name, *args):
+        response = self.client.get(reverse(name, args=args))
+        # CSRF tokens are masked differently on every render
+        return response.status_code, re.sub(rb'name="csrfmiddlewaretoken" value="[^"]+"', b"", response.content)
+
+    def test_pages_match_sync_views(self):
+        pages = [
+            ("index",), ("category", self.category.id), ("category", 0),
+            ("listing", self.open.id), ("listing", self.closed.id), ("listing", 0), ("watchlist",),
+        ]
+        for user in (None, self.bidder):
+            if user:
+                self.client.force_login(user)
+            for page in pages:
+                with self.subTest(user=user, page=page):
+                    expected = self.get(*page)
+                    with override_settings(ROOT_URLCONF=AsyncRoutes):
+                        self.assertEqual(self.get(*page), expected)
+
+    def test_post_to_a_listing_matches_sync_view(self):
+        # 404 for a missing auction comes before 405 for the method, as in views.listing
+        for auction_id, code in ((self.open.id, "405"), (0, "404")):
+            with self.subTest(auction_id=auction_id):
+                expected = self.client.post(reverse("listing", args=(auction_id,))).content
+                self.assertIn(f"Not found {code}".encode(), expected)
+                with override_settings(ROOT_URLCONF=AsyncRoutes):
+                    self.assertEqual(self.client.post(reverse("listing", args=(auction_id,))).content, expected)
+
+
+class RecordingBroker(InProcessBroker):
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self, channel, event):
+        self.published.append((channel, event))
+        super().publish(channel, event)
+
+
+@override_settings(EVENT_BROKER="dbapp.tests.RecordingBroker", ASYNC_PARALLEL_QUERIES=False)
+class AuctionEventTests(TestCase):
+    """Bids and closes reach every open event stream of the auction."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.auction = Auction.objects.create(
+            title="Clock", description="Walnut.", starting_bid=Decimal("10.00"),
+            current_bid=Decimal("10.00"), seller=cls.seller,
+        )
+
+    def test_publish_reaches_every_subscriber(self):
+        async def scenario():
+            broker = InProcessBroker()
+            subscriptions = [broker.subscribe("auction:1") for _ in range(2000)]
+            # sync views publish from worker threads
+            publisher = threading.Thread(target=broker.publish, args=("auction:1", {"bid_count": 1}))
+            publisher.start()
+            received = await asyncio.wait_for(asyncio.gather(*(s.get() for s in subscriptions)), timeout=5)
+            publisher.join()
+            for subscription in subscriptions:
+                subscription.close()
+            return received, broker.subscribers("auction:1")
+
+        received, left = async_to_sync(scenario)()
+        self.assertEqual(received, [{"bid_count": 1}] * 2000)
+        self.assertEqual(left, 0)
+
+    def test_late_states_are_dropped(self):
+        def state(bid_count, closed=False):
+            return auction_state(1, Decimal(10 + bid_count), bid_count, closed)
+
+        async def scenario():
+            broker = InProcessBroker()
+            subscription = broker.subscribe("auction:1")
+            received = []
+
+            async def publish(*states):
+                for event in states:
+                    broker.publish("auction:1", event)
+                # let the loop run the deliveries
+                await asyncio.sleep(0)
+                received.append(await asyncio.wait_for(subscription.get(), timeout=5))
+
+            # the second bid's state is published first
+            await publish(state(2), state(1))
+            await publish(state(1), state(2), state(2, closed=True))
+            # a snapshot newer than what is pending replaces it
+            broker.publish("auction:1", state(3))
+            await asyncio.sleep(0)
+            subscription.seen(state(4))
+            await publish(state(4), state(5))
+            subscription.close()
+            return received
+
+        self.assertEqual(async_to_sync(scenario)(), [state(2), state(2, closed=True), state(5)])
+
+    def test_bid_and_close_publish(self):
+        channel = auction_channel(self.auction.id)
+        self.client.force_login(self.bidder)
+        self.client.post(reverse("bid", args=(self.auction.id,)), {"bid_price": "15.00"})
+        self.client.force_login(self.seller)
+        self.client.post(reverse("close", args=(self.auction.id,)))
+        self.assertEqual(get_broker().published, [
+            (channel, auction_state(self.auction.id, Decimal("15.00"), 1, False)),
+            (channel, auction_state(self.auction.id, Decimal("15.00"), 1, True)),
+        ])
+
+    def test_close_keeps_a_bid_accepted_meanwhile(self):
+        read = Auction.objects.get
+
+        def read_then_bid(*args, **kwargs):
+            # the seller's page read the auction, then a bid lands before the close
+            auction = read(*args, **kwargs)
+            place_bid(self.auction.id, self.bidder, Decimal("15.00"))
+            return auction
+
+        self.client.force_login(self.seller)
+        with mock.patch.object(Auction.objects, "get", read_then_bid):
+            self.client.post(reverse("close", args=(self.auction.id,)))
+        auction = Auction.objects.get(pk=self.auction.id)
+        self.assertEqual((auction.closed, auction.current_bid, auction.bid_count, auction.highest_bidder),
+                         (True, Decimal("15.00"), 1, self.bidder))
+        self.assertEqual(get_broker().published[-1],
+                         (auction_channel(self.auction.id), auction_state(self.auction.id, Decimal("15.00"), 1, True)))
+
+        # closing again changes and publishes nothing
+        published = len(get_broker().published)
+        self.client.post(reverse("close", args=(self.auction.id,)))
+        self.assertEqual(len(get_broker().published), published)
+
+    def test_stream_follows_auction_until_closed(self):
+        updates = [
+            auction_state(self.auction.id, Decimal("12.00"), 1, False),
+            auction_state(self.auction.id, Decimal("12.00"), 1, True),
+        ]
+
+        async def scenario():
+            sent = []
+            never = asyncio.Event()
+
+            async def receive():
+                await never.wait()
+
+            async def send(message):
+                sent.append(message)
+                if message.get("more_body") and updates:
+                    get_broker().publish(auction_channel(self.auction.id), updates.pop(0))
+
+            await asyncio.wait_for(stream_auction({"type": "http"}, receive, send, self.auction.id), timeout=5)
+            return sent
+
+        sent = async_to_sync(scenario)()
+        self.assertEqual(sent[0]["status"], 200)
+        body = b"".join(message.get("body", b"") for message in sent[1:]).decode()
+        self.assertEqual(body.count("event: auction"), 3)
+        self.assertIn('"current_bid": "10.00"', body)
+        self.assertTrue(body.rstrip().endswith('"closed": true}'))
+        self.assertFalse(sent[-1].get("more_body"))
+        self.assertEqual(get_broker().subscribers(auction_channel(self.auction.id)), 0)
+
+    def test_wsgi_fallback_sends_one_snapshot(self):
+        response = self.client.get(reverse("auction_events", args=(self.auction.id,)))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertTrue(response.content.startswith(b"retry: "))
+        self.assertEqual(self.client.get(reverse("auction_events", args=(0,))).status_code, 404)
+
+
+class ApiTests(TestCase):
+    """The JSON API answers unchanged resources with 304 and compresses bodies."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.auctions = [
+            Auction.objects.create(title=f"Vase {i}", description="Glass. " * 40, seller=cls.seller)
+            for i in range(3)
+        ]
+        Watchlist.objects.create(user=cls.bidder).auctions.add(cls.auctions[0])
+
+    def test_unchanged_resources_are_not_modified(self):
+        auction_id = self.auctions[0].id
+        urls = [reverse("api_auctions"), reverse("api_auction", args=(auction_id,)), reverse("api_bids", args=(auction_id,))]
+        tags = {url: self.client.get(url)["ETag"] for url in urls}
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=tags[url])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b"")
+
+        self.client.force_login(self.bidder)
+        self.client.post(reverse("bid", args=(auction_id,)), {"bid_price": "5.00"})
+        for url in urls:
+            with self.subTest(url=url, after="bid"):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=tags[url]).status_code, 200)
+        bids = self.client.get(urls[2]).json()["results"]
+        self.assertEqual([(bid["bid_price"], bid["bider__username"]) for bid in bids], [("5.00", "bidder")])
+
+    def test_closing_an_auction_changes_the_list(self):
+        url = reverse("api_auctions")
+        first = self.client.get(url)
+        # the newest update_date can go back when its auction closes, so the
+        # list is validated by its ETag only
+        self.assertNotIn("Last-Modified", first)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60)).status_code, 200)
+
+        newest = self.auctions[-1]
+        self.client.force_login(self.seller)
+        self.client.post(reverse("close", args=(newest.id,)))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(newest.id, [row["id"] for row in response.json()["results"]])
+
+    def test_list_tag_comes_from_the_page(self):
+        url = reverse("api_auctions")
+        with self.settings(AUCTION_PAGE_SIZE=1):
+            first = self.client.get(url)
+            # a bid on an auction further down leaves the first page as it was,
+            # and checking it is the page's own read
+            place_bid(self.auctions[0].id, self.bidder, Decimal("5.00"))
+            with self.assertNumQueries(1):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+            place_bid(self.auctions[-1].id, self.bidder, Decimal("5.00"))
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+
+    def test_reconciled_stats_change_the_etag(self):
+        auction = self.auctions[0]
+        Bid.objects.create(auction=auction, bider=self.bidder, bid_price=Decimal("3.00"))
+        url = reverse("api_auction", args=(auction.id,))
+        before = self.client.get(url)
+        call_command("reconcile_bid_stats", stdout=io.StringIO())
+        after = self.client.get(url, HTTP_IF_NONE_MATCH=before["ETag"])
+        self.assertEqual(after.status_code, 200)
+        self.assertEqual((after.json()["bid_count"], after.json()["highest_bidder__username"]), (1, "bidder"))
+
+    def test_auctions_are_paginated_and_gzipped(self):
+        with self.settings(AUCTION_PAGE_SIZE=2):
+            first = self.client.get(reverse("api_auctions"), HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(first["Content-Encoding"], "gzip")
+            first = self.client.get(reverse("api_auctions")).json()
+            rest = self.client.get(reverse("api_auctions"), {"after": first["next"]}).json()
+        titles = [row["title"] for row in first["results"] + rest["results"]]
+        self.assertEqual(titles, ["Vase 2", "Vase 1", "Vase 0"])
+        self.assertIsNone(rest["next"])
+        self.assertEqual(self.client.get(reverse("api_auction", args=(0,))).status_code, 404)
+
+    def test_watchlist_needs_a_user(self):
+        self.assertEqual(self.client.get(reverse("api_watchlist")).status_code, 401)
+        self.client.force_login(self.bidder)
+        response = self.client.get(reverse("api_watchlist"))
+        self.assertEqual([row["id"] for row in response.json()["results"]], [self.auctions[0].id])
+        self.assertEqual(self.client.get(reverse("api_watchlist"), HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+
+class BidHistoryTests(TestCase):
+    """Bid history pages in time order and its price summary."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.auction = Auction.objects.create(title="Rug", description="Wool.", seller=cls.seller, bid_count=10)
+        start = timezone.now() - timedelta(hours=10)
+        for hour in range(10):
+            bid = Bid.objects.create(auction=cls.auction, bider=cls.bidder, bid_price=Decimal(10 + hour))
+            # the last two bids land at the same moment, ordered by id
+            Bid.objects.filter(pk=bid.pk).update(bid_date=start + timedelta(hours=min(hour, 8)))
+
+    def test_history_is_paged_in_time_order(self):
+        url = reverse("api_bids", args=(self.auction.id,))
+        prices = []
+        cursor = None
+        with self.settings(AUCTION_PAGE_SIZE=3):
+            while True:
+                page = self.client.get(url, {"after": cursor} if cursor else {}).json()
+                prices += [bid["bid_price"] for bid in page["results"]]
+                cursor = page["next"]
+                if cursor is None:
+                    break
+        self.assertEqual(prices, [f"{10 + hour}.00" for hour in range(10)])
+        self.assertContains(self.client.get(reverse("bid_history", args=(self.auction.id,))), "US $ 19.00")
+
+    def test_history_is_read_in_index_order(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("checks the SQLite plan")
+        sql = str(bidhistory.bid_history(self.auction.id).values("id").query)
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertIn("bid_auction_date_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_price_summary_buckets(self):
+        buckets = self.client.get(reverse("api_bid_summary", args=(self.auction.id,)), {"buckets": 3}).json()["buckets"]
+        # eight hours cut into three buckets; the last one also holds the end
+        self.assertEqual([bucket["count"] for bucket in buckets], [3, 3, 4])
+        self.assertEqual([(Decimal(bucket["low"]), Decimal(bucket["high"])) for bucket in buckets][-1], (16, 19))
+        self.assertEqual(self.client.get(reverse("api_bid_summary", args=(self.auction.id,)), {"buckets": 0}).status_code, 400)
+
+
+@override_settings(EVENT_BROKER="dbapp.tests.RecordingBroker")
+class CloseAuctionsTests(TestCase):
+    """close_auctions closes expired auctions once, with their winners, and nothing else."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        cls.category = Category.objects.create(title="Clocks")
+        now = timezone.now()
+
+        def auction(title, end_time):
+            return Auction.objects.create(title=title, description="Brass.", category=cls.category,
+                                          seller=cls.seller, end_time=end_time)
+
+        cls.won = auction("Won", now + timedelta(hours=1))
+        cls.unsold = auction("Unsold", now - timedelta(hours=1))
+        cls.running = auction("Running", now + timedelta(days=1))
+        cls.open_ended = auction("Open ended", None)
+
+    def setUp(self):
+        category_cache.invalidate()
+        category_cache.all()
+
+    def test_expired_auctions_are_closed_once(self):
+        self.assertTrue(place_bid(self.won.id, self.bidder, Decimal("5.00")).accepted)
+        later = timezone.now() + timedelta(hours=2)
+
+        first = close_expired(batch_size=1, now=later) + close_expired(batch_size=1, now=later)
+        self.assertEqual([(auction.id, auction.highest_bidder_id) for auction in first],
+                         [(self.unsold.id, None), (self.won.id, self.bidder.id)])
+        self.assertEqual(close_expired(now=later), [])
+
+        self.assertEqual(set(Auction.objects.filter(closed=True).values_list("title", flat=True)), {"Won", "Unsold"})
+        self.assertEqual(category_cache.get(self.category.id).active_count, 2)
+        self.assertEqual([event["closed"] for _, event in get_broker().published], [True, True])
+
+    def test_no_bids_after_end_time(self):
+        self.assertEqual(place_bid(self.unsold.id, self.bidder, Decimal("5.00")).status, bidding.CLOSED)
+        self.assertEqual(self.unsold.auction_bids.count(), 0)
+
+    def test_expired_auctions_are_found_by_index(self):
+        with CaptureQueriesContext(connection) as ctx:
+            close_expired()
+        selects = [query["sql"] for query in ctx.captured_queries if query["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(full_scans(selects[0]), [])
+
+
+class BenchmarkDataTests(TestCase):
+    """The generated data set is consistent with what the views maintain."""
+
+    def test_generated_auctions_match_their_bids(self):
+        written = benchmark_data.generate(users=5, categories=2, auctions=30, bids=300, comments=30, watched=3,
+                                          batch_size=40)
+        self.assertEqual(written["bids"], Bid.objects.count())
+        actual = Auction.objects.annotate(bids=Count("auction_bids"), top=Max("auction_bids__bid_price"))
+        for auction in actual:
+            self.assertEqual(auction.bid_count, auction.bids)
+            self.assertEqual(auction.current_bid, auction.top or auction.starting_bid)
+        self.assertEqual(Watchlist.auctions.through.objects.count(), 15)
+
+        # a real account that happens to share the naming scheme stays
+        real = User.objects.create_user(f"{benchmark_data.USER_PREFIX}9999", "someone@example.com", "pw")
+        benchmark_data.clear()
+        self.assertFalse(Auction.objects.exists())
+        self.assertFalse(Category.objects.exists())
+        self.assertEqual(list(User.objects.all()), [real])
+
+
+class TransferTests(TestCase):
+    """What export_data writes, import_data loads back unchanged."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        cls.bidder = User.objects.create_user("bidder", "bidder@example.com", "pw")
+        category = Category.objects.create(title="Mirrors")
+        cls.auction = Auction.objects.create(title="Mirror", description="Gilt, \"antique\",\nheavy.",
+                                             category=category, seller=cls.seller)
+        place_bid(cls.auction.id, cls.bidder, Decimal("7.50"))
+        Comment.objects.create(auction=cls.auction, user=cls.bidder, headline="Size", message="How tall?")
+        Watchlist.objects.create(user=cls.bidder).auctions.add(cls.auction)
+
+    def export(self, kind, fmt):
+        out = io.StringIO()
+        transfer.export_rows(kind, out, fmt, chunk_size=1)
+        return out.getvalue()
+
+    def test_round_trip(self):
+        for fmt in transfer.FORMATS:
+            with self.subTest(fmt=fmt):
+                exported = {kind: self.export(kind, fmt) for kind in transfer.TABLES}
+                with transaction.atomic():
+                    # an empty database but for the users, which are matched by username
+                    Auction.objects.all().delete()
+                    Category.objects.all().delete()
+                    Watchlist.objects.all().delete()
+                    User.objects.filter(username="bidder").delete()
+                    for kind, text in exported.items():
+                        transfer.import_rows(kind, transfer.read_rows(io.StringIO(text), fmt), batch_size=1)
+                    self.assertEqual({kind: self.export(kind, fmt) for kind in transfer.TABLES}, exported)
+                    transaction.set_rollback(True)
+
+    def test_unknown_formats_are_refused(self):
+        with self.assertRaises(ValueError):
+            transfer.export_rows("auctions", io.StringIO(), "jsonl")
+        with self.assertRaises(ValueError):
+            transfer.read_rows(io.StringIO(""), "jsonl")
+
+    def test_saves_during_an_import_are_still_stamped(self):
+        auction_id, created = self.auction.id, timezone.now() - timedelta(days=30)
+        Auction.objects.filter(id=auction_id).update(creation_date=created)
+        text = self.export("auctions", "ndjson")
+        Auction.objects.filter(id=auction_id).delete()
+        saved = []
+
+        def progress(line):
+            # between two batches, as a request running alongside would
+            saved.append(Auction.objects.create(title="Lamp", description="Brass.", seller=self.seller))
+
+        transfer.import_rows("auctions", transfer.read_rows(io.StringIO(text + text.replace(
+            f'"id": {auction_id}', f'"id": {auction_id + 100}')), "ndjson"), batch_size=1, progress=progress)
+        self.assertEqual(Auction.objects.get(id=auction_id).creation_date.date(), created.date())
+        self.assertIsNotNone(saved[0].creation_date)
+        self.assertIsNotNone(saved[0].update_date)
+
+
+class SearchTests(TestCase):
+    """Search finds auctions by the words of their title and description, best match first."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        cls.chairs = Category.objects.create(title="Chairs")
+        make = lambda title, description, **kwargs: Auction.objects.create(
+            title=title, description=description, seller=cls.seller, **kwargs)
+        cls.best = make("Oak chair", "An oak chair, oak legs and an oak seat.", category=cls.chairs)
+        cls.good = make("Oak chair", "Sturdy.", category=cls.chairs)
+        cls.other = make("Kitchen chair", "Pine with oak trim.")
+        cls.closed = make("Oak chair", "Oak, oak, oak.", category=cls.chairs, closed=True)
+        make("Pine table", "No chairs included.")
+
+    def ids(self, **params):
+        return [row["id"] for row in self.client.get(reverse("api_search"), params).json()["results"]]
+
+    def test_ranks_filters_and_pages(self):
+        self.assertEqual(self.ids(q="oak chair"), [self.best.id, self.good.id, self.other.id])
+        self.assertEqual(self.ids(q="OAK Chair", category=self.chairs.id), [self.best.id, self.good.id])
+        self.assertEqual(self.ids(q="oak chair", status="closed"), [self.closed.id])
+        self.assertEqual(len(self.ids(q="oak chair", status="all")), 4)
+        # every word must be there, and nothing is read as search syntax
+        self.assertEqual(self.ids(q='oak "table" OR NEAR(*'), [])
+
+        with self.settings(AUCTION_PAGE_SIZE=1):
+            ids, cursor = [], None
+            while True:
+                page = self.client.get(reverse("api_search"), {"q": "oak chair", **({"after": cursor} if cursor else {})}).json()
+                ids += [row["id"] for row in page["results"]]
+                cursor = page["next"]
+                if cursor is None:
+                    break
+            back = self.client.get(reverse("api_search"), {"q": "oak chair", "before": page["previous"]}).json()
+        self.assertEqual(ids, [self.best.id, self.good.id, self.other.id])
+        self.assertEqual([row["id"] for row in back["results"]], [self.good.id])
+
+    def test_index_follows_changes(self):
+        Auction.objects.filter(pk=self.other.pk).update(title="Kitchen stool")
+        Auction.objects.filter(pk=self.good.pk).delete()
+        self.assertEqual(self.ids(q="oak chair"), [self.best.id])
+        self.assertEqual(self.ids(q="stool"), [self.other.id])
+
+    def test_search_page(self):
+        response = self.client.get(reverse("search"), {"q": "kitchen"})
+        self.assertContains(response, "Kitchen chair")
+        self.assertNotContains(response, "Oak chair")
+        self.assertContains(self.client.get(reverse("search"), {"q": "oak", "status": "sold"}), "Not a valid search.")
+
+
+@override_settings(QUERY_BUDGET_MODE="fail")
+class WatchingTests(TestCase):
+    """Watchlist clicks are one statement each, and listings read "watching" from the session."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "pw")
+        cls.watcher = User.objects.create_user("watcher", "watcher@example.com", "pw")
+        cls.auction = Auction.objects.create(title="Clock", description="Brass.", seller=cls.seller)
+
+    def setUp(self):
+        category_cache.invalidate()
+        category_cache.all()
+
+    def click(self, name, auction_id=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse(name, args=(auction_id or self.auction.id,)), follow=True)
+        writes = [query["sql"] for query in ctx.captured_queries if "dbapp_watchlist_auctions" in query["sql"]]
+        return response, writes
+
+    def test_add_and_remove(self):
+        self.client.force_login(self.watcher)
+        response, writes = self.click("addWatchlist")
+        self.assertContains(response, "Added list into your watchlist.")
+        self.assertEqual(len(writes), 1)
+        response, writes = self.click("addWatchlist")
+        self.assertContains(response, "Item is already in your watchlist")
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(list(self.watcher.watchlist.auctions.all()), [self.auction])
+
+        # the listing knows without asking the database
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("listing", args=(self.auction.id,)))
+        self.assertContains(response, "badge-dark")
+        self.assertFalse([query["sql"] for query in ctx.captured_queries if "dbapp_watchlist" in query["sql"]])
+
+        response, writes = self.click("removeWatchlist")
+        self.assertContains(response, "Removed the item from your watchlist.")
+        self.assertEqual(len(writes), 1)
+        self.assertNotContains(response, "badge-dark")
+        self.assertFalse(self.watcher.watchlist.auctions.exists())
+        self.assertContains(self.click("removeWatchlist")[0], "Removing the item from your watchlist failed")
+        self.assertContains(self.click("addWatchlist", self.auction.id + 1)[0], "The auction does not exist.")
+
+    def listing(self, client):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(reverse("listing", args=(self.auction.id,)))
+        return response, [query["sql"] for query in ctx.captured_queries]
+
+    def test_other_sessions_follow(self):
+        other = self.client_class()
+        self.client.force_login(self.watcher)
+        other.force_login(self.watcher)
+        self.click("addWatchlist")
+        response, queries = self.listing(other)
+        self.assertContains(response, "badge-dark")
+        # the out of date copy costs the listing a read, but no session write
+        self.assertFalse([sql for sql in queries if "django_session" in sql and not sql.startswith("SELECT")])
+        other.post(reverse("removeWatchlist", args=(self.auction.id + 1,)))
+        response, queries = self.listing(other)
+        self.assertContains(response, "badge-dark")
+        self.assertFalse([sql for sql in queries if "dbapp_watchlist" in sql])
+
+    def test_changes_outside_the_views_show(self):
+        self.client.force_login(self.watcher)
+        self.assertNotContains(self.listing(self.client)[0], "badge-dark")
+        Watchlist.objects.create(user=self.watcher).auctions.add(self.auction)
+        self.assertContains(self.listing(self.client)[0], "badge-dark")
+        self.auction.auctions_in_watchlist.clear()
+        self.assertNotContains(self.listing(self.client)[0], "badge-dark")
+
+    def test_watchlist_page(self):
+        others = [Auction.objects.create(title=f"Vase {i}", description="Glass.", seller=self.seller) for i in range(2)]
+        self.client.force_login(self.watcher)
+        for auction in [self.auction] + others:
+            self.click("addWatchlist", auction.id)
+        place_bid(self.auction.id, self.watcher, Decimal("3.00"))
+        place_bid(others[0].id, self.watcher, Decimal("4.00"))
+        place_bid(others[0].id, self.seller, Decimal("5.00"))
+
+        with self.settings(AUCTION_PAGE_SIZE=2):
+            response = self.client.get(reverse("watchlist"))
+        self.assertContains(response, "Your watchlist has 3 items.")
+        rows = re.findall(r"<tr>(.*?)</tr>", response.content.decode(), re.S)[1:]
+        cells = [re.sub(r"\s+", " ", re.sub(r"<[^>]+>", "|", row)) for row in rows]
+        # newest first: the seller outbid the watcher on the first vase
+        self.assertIn("|5.00| |0.00| |2| | 4.00 |", cells[1])
+        self.assertEqual(len(cells), 2)
+        self.assertIn("3.00 (highest)", self.client.get(reverse("watchlist")).content.decode())
+
+    def test_my_bid_is_blank_without_a_bid_of_mine(self):
+        outbid = Auction.objects.create(title="Vase", description="Glass.", seller=self.seller)
+        place_bid(outbid.id, self.seller, Decimal("5.00"))
+        self.client.force_login(self.watcher)
+        for auction in (self.auction, outbid):
+            self.click("addWatchlist", auction.id)
+
+        auctions = {auction.id: auction for auction in watched_auctions(self.client.get(reverse("watchlist")).wsgi_request)}
+        self.assertIsNone(auctions[self.auction.id].my_bid)
+        self.assertIsNone(auctions[outbid.id].my_bid)
+        rows = re.findall(r"<tr>(.*?)</tr>", self.client.get(reverse("watchlist")).content.decode(), re.S)[1:]
+        cells = [re.sub(r"\s+", " ", re.sub(r"<[^>]+>", "|", row)) for row in rows]
+        # the seller's bid is not the watcher's, and no bid at all shows nothing either
+        self.assertIn("|5.00| |0.00| |1| | |", cells[0])
+        self.assertIn("|0.00| |0.00| |0| | |", cells[1])
+
+    def test_count_of_a_paged_watchlist_comes_from_the_database(self):
+        others = [Auction.objects.create(title=f"Vase {i}", description="Glass.", seller=self.seller) for i in range(3)]
+        other = self.client_class()
+        self.client.force_login(self.watcher)
+        other.force_login(self.watcher)
+        for auction in [self.auction] + others:
+            self.click("addWatchlist", auction.id)
+        other.post(reverse("removeWatchlist", args=(others[0].id,)))
+        # deleting an auction takes it off watchlists without telling the sessions
+        others[1].delete()
+
+        with self.settings(AUCTION_PAGE_SIZE=1):
+            self.assertContains(self.client.get(reverse("watchlist")), "Your watchlist has 2 items.")
+            self.assertContains(other.get(reverse("watchlist")), "Your watchlist has 2 items.")
@@ -0,0 +1,232 @@
+"""Stream auctions, bids, comments and watchlists to and from NDJSON or CSV files.
+
+Rows keep their ids, so bids, comments and watchlist entries find their
+auction again after an import, and users and categories are written by
+username and title and matched (or created) by them on import. Both
+directions work in fixed-size chunks, so memory use does not grow with the
+table: exports walk the table by primary key, one index range scan per
+chunk, and imports insert each chunk with one multi-row ``INSERT``.
+"""
+import csv
+import json
+import time
+from collections import namedtuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import NotSupportedError, connection, transaction
+from django.utils import timezone
+
+from .categorycache import category_cache
+from .models import Auction, Bid, Category, Comment, User, Watchlist
+from .pagecache import invalidate
+from .watching import touch
+
+FORMATS = ("ndjson", "csv")
+
+# model, (column, lookup) pairs with the primary key first, and the columns
+# holding a username or category title, with the attribute they resolve to
+Table = namedtuple("Table", ["model", "columns", "users", "categories"])
+
+TABLES = {
+    "auctions": Table(
+        Auction,
+        (("id", "id"), ("title", "title"), ("description", "description"), ("starting_bid", "starting_bid"),
+         ("current_bid", "current_bid"), ("category", "category__title"), ("imageURL", "imageURL"),
+         ("seller", "seller__username"), ("closed", "closed"), ("creation_date", "creation_date"),
+         ("update_date", "update_date"), ("end_time", "end_time"), ("bid_count", "bid_count"),
+         ("highest_bidder", "highest_bidder__username")),
+        {"seller": "seller_id", "highest_bidder": "highest_bidder_id"},
+        {"category": "category_id"},
+    ),
+    "bids": Table(
+        Bid,
+        (("id", "id"), ("auction", "auction_id"), ("bider", "bider__username"), ("bid_price", "bid_price"),
+         ("bid_date", "bid_date")),
+        {"bider": "bider_id"},
+        {},
+    ),
+    "comments": Table(
+        Comment,
+        (("id", "id"), ("auction", "auction_id"), ("user", "user__username"), ("headline", "headline"),
+         ("message", "message"), ("cm_date", "cm_date")),
+        {"user": "user_id"},
+        {},
+    ),
+    # one row per watched auction; the watchlist itself is found by its user
+    "watchlists": Table(
+        Watchlist.auctions.through,
+        (("id", "id"), ("user", "watchlist__user__username"), ("auction", "auction_id")),
+        {"user": "watchlist_id"},
+        {},
+    ),
+}
+
+
+def format_for(path, default="ndjson"):
+    return "csv" if path and path.endswith(".csv") else default
+
+
+def _check_format(fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(FORMATS)}.")
+
+
+def export_rows(kind, out, fmt="ndjson", chunk_size=2000, progress=None):
+    """Write every row of ``kind`` to the text stream ``out`` and return how many there were."""
+    _check_format(fmt)
+    table = TABLES[kind]
+    names = [name for name, _ in table.columns]
+    queryset = table.model.objects.order_by("pk").values_list(*[lookup for _, lookup in table.columns])
+
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(names)
+        write = lambda row: writer.writerow(["" if value is None else value for value in row])
+    else:
+        write = lambda row: out.write(json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + "\n")
+
+    started = time.perf_counter()
+    written = 0
+    last_pk = None
+    while True:
+        # keyset chunks rather than one long cursor: MySQL drivers buffer a
+        # whole result set on the client, a LIMITed range scan they cannot
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(chunk[:chunk_size])
+        if not rows:
+            break
+        for row in rows:
+            write(row)
+        written += len(rows)
+        last_pk = rows[-1][0]
+        if progress:
+            progress(_rate(kind, written, started))
+    return written
+
+
+def read_rows(stream, fmt="ndjson"):
+    """Iterate over the rows of an NDJSON or CSV text stream as dicts, one at a time."""
+    _check_format(fmt)
+    if fmt == "csv":
+        return csv.DictReader(stream)
+    return (json.loads(line) for line in stream if line.strip())
+
+
+def import_rows(kind, rows, batch_size=1000, ignore_conflicts=False, progress=None):
+    """Insert ``rows`` (dicts as read by ``read_rows``) into ``kind`` and return how many were read.
+
+    Import auctions before the bids, comments and watchlists pointing at
+    them. Usernames and category titles are resolved once per batch; users
+    and categories that do not exist yet are created, users without a
+    usable password. With ``ignore_conflicts`` rows whose id is already
+    taken are skipped, so an interrupted import can simply be run again.
+    """
+    table = TABLES[kind]
+    fields = {name: table.model._meta.get_field(name) for name, _ in table.columns
+              if name not in table.users and name not in table.categories}
+    # rows exported before a creation timestamp existed get the time of the import
+    stamped = {name for name, field in fields.items() if getattr(field, "auto_now_add", False)}
+    started = time.perf_counter()
+    read = 0
+    batch = []
+
+    def flush():
+        users = _resolve_users({row[name] for row in batch for name in table.users if row.get(name)},
+                               watchlists=table.model is Watchlist.auctions.through)
+        categories = _resolve_categories({row[name] for row in batch for name in table.categories if row.get(name)})
+        objects = []
+        for row in batch:
+            values = {}
+            for name, field in fields.items():
+                value = row.get(name)
+                # CSV has no null; exports write it as an empty field
+                if value == "" and field.null:
+                    value = None
+                value = field.to_python(value)
+                if value is None and name in stamped:
+                    value = timezone.now()
+                values[field.attname] = value
+            for name, attname in table.users.items():
+                values[attname] = users.get(row.get(name))
+            for name, attname in table.categories.items():
+                values[attname] = categories.get(row.get(name))
+            objects.append(table.model(**values))
+        with transaction.atomic():
+            _insert(table.model, objects, batch_size, ignore_conflicts)
+        batch.clear()
+
+    for row in rows:
+        batch.append(row)
+        read += 1
+        if len(batch) >= batch_size:
+            flush()
+            if progress:
+                progress(_rate(kind, read, started))
+    if batch:
+        flush()
+
+    # raw inserts send no signals, so drop what the caches hold by hand
+    category_cache.invalidate()
+    invalidate("all")
+    if kind == "watchlists":
+        touch(User.objects.filter(watchlist__isnull=False))
+    return read
+
+
+def _rate(kind, count, started):
+    elapsed = time.perf_counter() - started
+    return f"{kind}: {count} rows, {count / elapsed if elapsed else 0:.0f} rows/s"
+
+
+def _insert(model, objects, batch_size, ignore_conflicts):
+    # bulk_create() runs each field's pre_save(), and auto_now(_add) fields
+    # would get the time of the import instead of the exported dates. A raw
+    # insert, as loaddata makes, writes the values the objects hold
+    if ignore_conflicts and not connection.features.supports_ignore_conflicts:
+        raise NotSupportedError("This database backend does not support ignoring conflicts.")
+    fields = model._meta.local_concrete_fields
+    size = min(batch_size, max(connection.ops.bulk_batch_size(fields, objects), 1))
+    for start in range(0, len(objects), size):
+        model._base_manager._insert(objects[start:start + size], fields=fields, raw=True,
+                                    ignore_conflicts=ignore_conflicts)
+
+
+def _resolve_users(usernames, watchlists=False):
+    """Map usernames to user ids (or to their watchlist ids), creating what is missing."""
+    if not usernames:
+        return {}
+    found = dict(User.objects.filter(username__in=usernames).values_list("username", "id"))
+    missing = usernames - found.keys()
+    if missing:
+        new_users = [User(username=username) for username in missing]
+        for user in new_users:
+            user.set_unusable_password()
+        User.objects.bulk_create(new_users, ignore_conflicts=True)
+        found = dict(User.objects.filter(username__in=usernames).values_list("username", "id"))
+    if not watchlists:
+        return found
+
+    owners = {user_id: username for username, user_id in found.items()}
+    lists = dict(Watchlist.objects.filter(user__in=owners).values_list("user_id", "id"))
+    if len(lists) < len(owners):
+        Watchlist.objects.bulk_create([Watchlist(user_id=user_id) for user_id in owners.keys() - lists.keys()],
+                                      ignore_conflicts=True)
+        lists = dict(Watchlist.objects.filter(user__in=owners).values_list("user_id", "id"))
+    return {owners[user_id]: watchlist_id for user_id, watchlist_id in lists.items()}
+
+
+def _resolve_categories(titles):
+    """Map category titles to ids, creating what is missing; duplicate titles map to the oldest."""
+    if not titles:
+        return {}
+    found = {}
+    for title, category_id in Category.objects.filter(title__in=titles).order_by("-id").values_list("title", "id"):
+        found[title] = category_id
+    missing = titles - found.keys()
+    if missing:
+        for category in Category.objects.bulk_create([Category(title=title) for title in missing]):
+            found[category.title] = category.id
+        if None in (found[title] for title in missing):
+            # the database did not return the new ids (MySQL)
+            found.update(Category.objects.filter(title__in=missing).values_list("title", "id"))
+    return found
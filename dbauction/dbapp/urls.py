@@ -1,21 +1,35 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import api, async_views, views
+
+# the hot read paths have async versions, used when served over ASGI
+reads = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path("", views.index, name="index"),
+    path("", reads.index, name="index"),
     path("login", views.login_view, name="login"),
     path("logout", views.logout_view, name="logout"),
     path("register", views.register, name="register"),
     path("create", views.create, name="create"),
-    path("listing/<int:auction_id>", views.listing, name="listing"),
+    path("listing/<int:auction_id>", reads.listing, name="listing"),
+    path("listing/<int:auction_id>/events", views.auction_events, name="auction_events"),
     path("listing/<int:auction_id>/bid", views.bid, name="bid"),
+    path("listing/<int:auction_id>/bids", views.bid_history, name="bid_history"),
     path("listing/<int:auction_id>/close", views.close, name="close"),
     path("listing/<int:auction_id>/comment", views.comment, name="comment"),
     path("listing/<int:auction_id>/addWatchlist", views.addWatchlist, name="addWatchlist"),
     path("listing/<int:auction_id>/removeWatchlist", views.removeWatchlist, name="removeWatchlist"),
     path("categories", views.categories, name="categories"),
-    path("categories/<int:category_id>", views.category, name="category"),
-    path("watchlist", views.watchlist, name="watchlist")
+    path("categories/<int:category_id>", reads.category, name="category"),
+    path("watchlist", reads.watchlist, name="watchlist"),
+    path("search", views.search, name="search"),
+    # JSON API
+    path("api/auctions", api.auctions, name="api_auctions"),
+    path("api/auctions/<int:auction_id>", api.auction, name="api_auction"),
+    path("api/auctions/<int:auction_id>/bids", api.bids, name="api_bids"),
+    path("api/auctions/<int:auction_id>/bids/summary", api.bid_summary, name="api_bid_summary"),
+    path("api/watchlist", api.watchlist, name="api_watchlist"),
+    path("api/search", api.search, name="api_search")
 
 ]
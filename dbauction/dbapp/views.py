@@ -1,14 +1,31 @@
+from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth.decorators import login_required
 from django.db import IntegrityError
 from django.http import HttpResponse, HttpResponseRedirect
 from django.shortcuts import render
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
 
-from .models import User, Auction, Bid, Category, Comment, Watchlist
+from .models import User, Auction, Category, Comment
 from .forms import NewCommentForm, NewListingForm, NewBidForm
-from django.contrib.auth.decorators import login_required
-from django.contrib import messages
-from django.core.exceptions import ObjectDoesNotExist
+from . import bidding, bidhistory
+from . import search as auction_search
+from .watching import unwatch, watch, watch_count, watched, watched_auctions
+from .pagination import paginate
+from .pagecache import cache_anonymous_page, invalidate_auction
+from .categorycache import category_cache
+from .events import publish_auction
+from .sse import auction_snapshot, format_event
+
+# columns rendered by the auction list templates (index.html, category.html)
+AUCTION_LIST_FIELDS = ("id", "title", "description", "imageURL", "current_bid", "creation_date", "category", "category__title")
+# columns rendered by watchlist.html, which does not show the description
+WATCHLIST_FIELDS = ("id", "title", "current_bid", "starting_bid", "closed", "bid_count", "highest_bidder_id", "category",
+                    "category__title")
+
 
 # use category to test the function
 def testmysql(request):
@@ -19,9 +36,13 @@ def testmysql(request):
     return render(request, 'home.html', context)
 
 # render the home page, showing all action items ordered by creation date
+@cache_anonymous_page(lambda: "index")
 def index(request):
+    auctions = Auction.objects.active().select_related("category").only(*AUCTION_LIST_FIELDS)
+    page = paginate(request, auctions, ("-creation_date", "-id"))
     return render(request, "dbapp/index.html", {
-        "auctions": Auction.objects.filter(closed=False).order_by('-creation_date')
+        "auctions": page.object_list,
+        "page": page
     })
 
 
@@ -82,16 +103,18 @@ def register(request):
         return render(request, "dbapp/register.html")
 
 # show all available categories
+@cache_anonymous_page(lambda: "categories")
 def categories(request):
     return render(request, "dbapp/categories.html", {
-        "categories": Category.objects.all()
+        "categories": category_cache.all()
     })
 
 # show all auction items under specific category
+@cache_anonymous_page(lambda category_id: f"category:{category_id}")
 def category(request, category_id):
     try:
         # list all available auction items under a specific category
-        auctions = Auction.objects.filter(category=category_id, closed=False).order_by('-creation_date')
+        auctions = Auction.objects.active().filter(category=category_id).select_related("category").only(*AUCTION_LIST_FIELDS)
          
     except Auction.DoesNotExist:
         return render(request, "dbapp/error.html", {
@@ -99,42 +122,65 @@ def category(request, category_id):
             "message": f"Not exist: the current category."
         })
    
-    try:
-        # get specific category
-        category = Category.objects.get(pk=category_id)
+    # get specific category, from the category cache when it is there
+    category = category_cache.get(category_id) or Category.objects.filter(pk=category_id).first()
 
-    except Category.DoesNotExist:
+    if category is None:
         return render(request, "dbapp/error.html", {
             "code": 404,
             "message": f"The category does not exist."
         })
 
+    page = paginate(request, auctions, ("-creation_date", "-id"))
+
     return render(request, "dbapp/category.html", {
-        "auctions": auctions,
+        "auctions": page.object_list,
+        "page": page,
         "category": category
     })
 
 
+# auctions whose title or description holds every word searched for, best match first
+@cache_anonymous_page(lambda: "search")
+def search(request):
+    text = request.GET.get("q", "").strip()
+    category = request.GET.get("category") or None
+    status = request.GET.get("status") or "open"
+    if (category is not None and not category.isdigit()) or status not in auction_search.STATUSES:
+        return render(request, "dbapp/error.html", {
+            "code": 400,
+            "message": "Not a valid search."
+        })
+
+    auctions = auction_search.search(text, category, status).select_related("category").only(*AUCTION_LIST_FIELDS)
+    page = paginate(request, auctions, auction_search.SEARCH_KEYS)
+    return render(request, "dbapp/search.html", {
+        "auctions": page.object_list,
+        "page": page,
+        "q": text,
+        "category_id": int(category) if category else None,
+        "status": status,
+        # the pagination links keep the search
+        "page_params": urlencode({"q": text, "category": category or "", "status": status})
+    })
+
+
 @login_required(login_url="login") 
 def watchlist(request):
-    # check if user has specific watchlist
-    try:
-        watchlist = Watchlist.objects.get(user=request.user)
-        auctions = watchlist.auctions.all().order_by('-id')
-        # count the number of auctions items in the user's watchlist
-        watchingNum = watchlist.auctions.all().count()
-
-    except ObjectDoesNotExist:
-        # if watchlist does not exist
-        watchlist = None
-        auctions = None
-        watchingNum = 0
-    
+    # one query for the page: prices, bid counts, status and the user's own
+    # bids come with the auctions, the watchlist from the session
+    auctions = watched_auctions(request)
+    page = None
+    watchingNum = 0
+    if auctions is not None:
+        page = paginate(request, auctions.select_related("category").only(*WATCHLIST_FIELDS), ("-id",))
+        watchingNum = watch_count(request, page)
 
     return render(request, "dbapp/watchlist.html", {
         # list all items in the watchlist
-        "watchlist": watchlist,
-        "auctions": auctions,
+        "watchlist": auctions is not None,
+        "auctions": page.object_list if page else None,
+        "page": page,
         "watchingNum": watchingNum
     })
 
@@ -155,6 +201,8 @@ def create(request):
             # store the starting bid as current price
             new_listing.current_bid = form.cleaned_data['starting_bid']
             new_listing.save()
+            invalidate_auction(new_listing.category_id)
+            category_cache.adjust(new_listing.category_id, 1)
 
             # return the sucessful message
             messages.success(request, 'Success: auction item created')
@@ -181,8 +229,8 @@ def create(request):
 
 def listing(request, auction_id):  
     try:
-        # fetch the auction items list by auction id
-        auction = Auction.objects.get(pk=auction_id)
+        # fetch the auction items list by auction id, with the users the page shows
+        auction = Auction.objects.select_related("seller", "highest_bidder").get(pk=auction_id)
         
     except Auction.DoesNotExist:
         return render(request, "dbapp/error.html", {
@@ -190,26 +238,20 @@ def listing(request, auction_id):
             "message": "The auction does not exist."
         })
 
-    # default watching flag 
-    watching = False
     # default highest bidder   
     highest_bidder = None
 
-    # check if the auction in the watchlist
-    if request.user.is_authenticated and Watchlist.objects.filter(user=request.user, auctions=auction):
-        watching = True
+    # check if the auction in the watchlist, which the session holds
+    watching = auction.id in watched(request)
     
     # get current user
     user = request.user
 
-    # get number of bids
-    bid_Num = Bid.objects.filter(auction=auction_id).count()
+    # get number of bids, maintained on the auction row by each accepted bid
+    bid_Num = auction.bid_count
 
     # get the item's comments
-    comments = Comment.objects.filter(auction=auction_id).order_by("-cm_date")
-
-    # get the auction highest bid
-    highest_bid = Bid.objects.filter(auction=auction_id).order_by("-bid_price").first()
+    comments = Comment.objects.filter(auction=auction_id).select_related("user").order_by("-cm_date")
     
     # check the request method is POST
     if request.method == "GET":
@@ -225,13 +267,14 @@ def listing(request, auction_id):
             "bid_Num": bid_Num,
             "commentForm": commentForm,
             "comments": comments,
-            "watching": watching
+            "watching": watching,
+            "live_updates": settings.AUCTION_EVENTS
             }) 
 
         # if it's closed
         else:
             # check if there exists highest bid
-            if highest_bid is None:
+            if auction.highest_bidder_id is None:
                 messages.info(request, 'Current item bidding is closed.')
 
                 return render(request, "dbapp/listing.html", {
@@ -242,12 +285,13 @@ def listing(request, auction_id):
                     "highest_bidder": highest_bidder,
                     "commentForm": commentForm,
                     "comments": comments,
-                    "watching": watching
+                    "watching": watching,
+                    "live_updates": settings.AUCTION_EVENTS
                 })
 
             else:
                 # set the highest_bidder
-                highest_bidder = highest_bid.bider
+                highest_bidder = auction.highest_bidder
 
                 # check the current if the bid winner    
                 if user == highest_bidder:
@@ -263,7 +307,8 @@ def listing(request, auction_id):
                 "bid_Num": bid_Num,
                 "commentForm": commentForm,
                 "comments": comments,
-                "watching": watching
+                "watching": watching,
+                "live_updates": settings.AUCTION_EVENTS
                 })
 
     
@@ -275,6 +320,37 @@ def listing(request, auction_id):
         })
         
         
+# list the bids of an auction in the order they were placed
+def bid_history(request, auction_id):
+    auction = Auction.objects.filter(pk=auction_id).only("id", "title", "bid_count").first()
+    if auction is None:
+        return render(request, "dbapp/error.html", {
+            "code": 404,
+            "message": "The auction does not exist."
+        })
+
+    page = paginate(request, bidhistory.bid_history(auction_id).select_related("bider").only(
+        "bid_date", "bid_price", "bider__username"), bidhistory.HISTORY_KEYS)
+    return render(request, "dbapp/bids.html", {
+        "auction": auction,
+        "bids": page.object_list,
+        "page": page
+    })
+
+
+def auction_events(request, auction_id):
+    # asgi.py streams this path itself (dbapp.sse); under WSGI a stream would
+    # hold a request thread for as long as the page is open, so send the
+    # current state once and let the browser reconnect after a while
+    state = auction_snapshot(auction_id)
+    if state is None:
+        return HttpResponse("The auction does not exist.", status=404, content_type="text/plain")
+    body = f"retry: {settings.AUCTION_EVENTS_RETRY_MS}\n" + format_event(state)
+    response = HttpResponse(body, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
 
 @login_required(login_url="login")
 def close(request, auction_id):
@@ -295,9 +371,17 @@ def close(request, auction_id):
             return HttpResponseRedirect(reverse("listing", args=(auction.id,)))
 
         else:
-            # update the status
-            auction.closed = True
-            auction.save()
+            # only the status and its date: a full save would write back the
+            # price read above over any bid accepted since, and an auction
+            # someone else closed first matches no row
+            was_open = Auction.objects.filter(pk=auction.id, closed=False).update(
+                closed=True, update_date=timezone.now())
+            invalidate_auction(auction.category_id)
+            if was_open:
+                category_cache.adjust(auction.category_id, -1)
+                # closed now, so no bid can move what this reads
+                current_bid, bid_count = Auction.objects.values_list("current_bid", "bid_count").get(pk=auction.id)
+                publish_auction(auction.id, current_bid, bid_count, True)
             
             # prompt with the  message
             messages.success(request, 'Success: auction list closed')
@@ -313,63 +397,41 @@ def close(request, auction_id):
 @login_required(login_url="login")
 def bid(request, auction_id):  
     if request.method == "POST":
-        try:
-            # fetch auction item with id
-            auction = Auction.objects.get(pk=auction_id)     
-            
-        except Auction.DoesNotExist:
+        # generate a new bid form
+        form = NewBidForm(request.POST, request.FILES)
+
+        if not form.is_valid():
+            messages.error(request, 'Please submit a valid bid offer. Your bid offer must be higher than the starting bid and current price.')
+            return HttpResponseRedirect(reverse("listing", args=(auction_id,)))
+
+        # validate and apply the bid in one locked round trip
+        result = bidding.place_bid(auction_id, request.user, form.cleaned_data["bid_price"])
+
+        if result.status == bidding.NOT_FOUND:
             return render(request, "dbapp/error.html", {
                 "code": 404,
                 "message": "The auction does not exist."
             })
 
-        # fetch the highest bid
-        highest_bid = Bid.objects.filter(auction=auction_id).order_by("-bid_price").first()
-        if highest_bid is None:
-            highest_bid_price = auction.current_bid
-        else:
-            highest_bid_price = highest_bid.bid_price
-
-        # generate a new bid form
-        form = NewBidForm(request.POST, request.FILES)
-
         # if auction is closed
-        if auction.closed is True:
+        if result.status == bidding.CLOSED:
             messages.error(request, 'Closed the auction')
-            return HttpResponseRedirect(reverse("listing", args=(auction.id,))) 
-        
-        # the auction item is still active
-        else:
-            if form.is_valid():
-                # create an isolated environment for a clean version of form data
-                bid_price = form.cleaned_data["bid_price"]
-
-                # check if it is the highest bid price so far
-                if bid_price > auction.starting_bid and bid_price > (auction.current_bid or highest_bid_price):
-                    # store the data
-                    new_bid = form.save(commit=False)
-                    # save the request user as new bider
-                    new_bid.bider = request.user
-                    # store the auction item
-                    new_bid.auction = auction
-                    new_bid.save()
-
-                    # update the bid price
-                    auction.current_bid = bid_price
-                    auction.save()
-
-                    # return a sucessful message
-                    messages.success(request, 'Success: Bid offered.')
-
-                # if the bid offer is invalid
-                else:
-                    messages.error(request, 'Please submit a valid bid offer. Your bid offer must be higher than the starting bid and current price.')
 
-                return HttpResponseRedirect(reverse("listing", args=(auction.id,)))    
+        elif result.accepted:
+            auction = result.auction
+            # the new price shows on the index and category pages
+            invalidate_auction(auction.category_id)
+            # and is pushed to everyone who has the listing open
+            publish_auction(auction_id, auction.current_bid, auction.bid_count, auction.closed)
 
-            else:
-                messages.error(request, 'Please submit a valid bid offer. Your bid offer must be higher than the starting bid and current price.')
-                return HttpResponseRedirect(reverse("listing", args=(auction.id,)))
+            # return a sucessful message
+            messages.success(request, 'Success: Bid offered.')
+
+        # if the bid offer is invalid
+        else:
+            messages.error(request, 'Please submit a valid bid offer. Your bid offer must be higher than the starting bid and current price.')
+
+        return HttpResponseRedirect(reverse("listing", args=(auction_id,)))
     
     else:
         return render(request, "dbapp/error.html", {
@@ -422,36 +484,24 @@ def comment(request, auction_id):
 @login_required(login_url="login")
 def addWatchlist(request, auction_id):   
     if request.method == "POST":
-        try:
-            # fetch the auction item with its id
-            auction = Auction.objects.get(pk=auction_id)     
-            
-        except Auction.DoesNotExist:
+        # add the item, unless it is there already, in one statement
+        added = watch(request, auction_id)
+
+        if added is None:
             return render(request, "dbapp/error.html", {
                 "code": 404,
                 "message": "The auction does not exist."
             })
 
-        # check if user has created his/her watchlist
-        try:
-            watchlist = Watchlist.objects.get(user=request.user)
-
-        except ObjectDoesNotExist:
-            # create a new watchlist if it doesn't exist
-            watchlist = Watchlist.objects.create(user=request.user)
-        
         # check if the item exists already
-        if Watchlist.objects.filter(user=request.user, auctions=auction):
+        if not added:
             messages.error(request, 'Item is already in your watchlist')
-            return HttpResponseRedirect(reverse("listing", args=(auction.id,)))
+            return HttpResponseRedirect(reverse("listing", args=(auction_id,)))
 
-        # if the item not exists
-        watchlist.auctions.add(auction)
-            
         # return a sucessful message
         messages.success(request, 'Added list into your watchlist.')
 
-        return HttpResponseRedirect(reverse("listing", args=(auction.id,)))
+        return HttpResponseRedirect(reverse("listing", args=(auction_id,)))
         
     else:
         return render(request, "dbapp/error.html", {
@@ -463,47 +513,27 @@ def addWatchlist(request, auction_id):
 @login_required(login_url="login")
 def removeWatchlist(request, auction_id):   
     if request.method == "POST":
-        try:
-            # fetch the auction item with its id
-            auction = Auction.objects.get(pk=auction_id)     
-            
-        except Auction.DoesNotExist:
+        # delete the item from the users watchlist, if it is there
+        if unwatch(request, auction_id):
+            # return a sucessful message
+            messages.success(request, 'Removed the item from your watchlist.')
+
+            return HttpResponseRedirect(reverse("listing", args=(auction_id,)))
+
+        # nothing was removed: check the item exists at all
+        if not Auction.objects.filter(pk=auction_id).exists():
             return render(request, "dbapp/error.html", {
                 "code": 404,
                 "message": "The auction does not exist."
             })
-        
-        # check if the item already exists in the watchlist
-        if Watchlist.objects.filter(user=request.user, auctions=auction):
-            # fetch the user's watchlist
-            watchlist = Watchlist.objects.get(user=request.user)
-           
-            # delete the item from the users watchlist
-            watchlist.auctions.remove(auction)
-                
-            # return a sucessful message
-            messages.success(request, 'Removed the item from your watchlist.')
 
-            return HttpResponseRedirect(reverse("listing", args=(auction.id,)))
-        
-        else:
-            # return an error message
-            messages.success(request, 'Removing the item from your watchlist failed')
+        # return an error message
+        messages.success(request, 'Removing the item from your watchlist failed')
 
-            return HttpResponseRedirect(reverse("listing", args=(auction.id,)))
+        return HttpResponseRedirect(reverse("listing", args=(auction_id,)))
    
     else:
         return render(request, "dbapp/error.html", {
             "code": 405,
             "message": "The GET method is not allowed."
         })
-
-
-
-
-
-
-
-
-
-
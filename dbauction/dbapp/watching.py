@@ -0,0 +1,149 @@
+"""Which auctions a user watches, read and written on the watchlist's through table.
+
+The ids of the watched auctions and of the user's watchlist are kept in the
+session, loaded when the user signs in, so a listing page knows whether
+its viewer watches the auction without a query. ``watch`` and ``unwatch``
+change the through table with one idempotent statement each and update the
+session copy as they go.
+
+Each change also stamps ``User.watchlist_changed``, which every request
+reads with the user anyway, and a session whose copy carries another stamp
+(the user changed the watchlist on another device, or the admin did) is out
+of date. Pages that only show the watchlist then read it for themselves, one
+query that leaves the session alone; the watch buttons, which write anyway,
+load the session copy again.
+"""
+import time
+
+from django.db import connection
+from django.db.models import Count, OuterRef, Subquery
+
+from .models import Auction, Bid, User, Watchlist
+
+SESSION_KEY = "watching"
+
+Through = Watchlist.auctions.through
+
+
+def _read(user):
+    # LEFT JOINs, so a user without a watchlist, or with an empty one, still
+    # gives a row with the stamp
+    rows = list(User.objects.filter(pk=user.pk).values_list("watchlist_changed", "watchlist", "watchlist__auctions"))
+    return {
+        "user": user.pk,
+        "changed": rows[0][0] if rows else 0,
+        "watchlist": rows[0][1] if rows else None,
+        "auctions": sorted(auction_id for _, _, auction_id in rows if auction_id is not None),
+    }
+
+
+def load(request, user):
+    """Read ``user``'s watchlist into the session with one query and return the session copy."""
+    state = request.session[SESSION_KEY] = _read(user)
+    return state
+
+
+def _state(request, store=False):
+    state = request.session.get(SESSION_KEY)
+    if (
+        state is None
+        or state["user"] != request.user.pk
+        or state.get("changed") != request.user.watchlist_changed
+    ):
+        state = load(request, request.user) if store else _read(request.user)
+    return state
+
+
+def _save(request, state, auction_ids):
+    # this session's own change needs no reload here, but the user's other sessions do
+    now = time.time_ns()
+    User.objects.filter(pk=request.user.pk).update(watchlist_changed=now)
+    request.user.watchlist_changed = now
+    request.session[SESSION_KEY] = dict(state, changed=now, auctions=sorted(auction_ids))
+
+
+def touch(users):
+    """Mark the watchlists of ``users``, a queryset, as changed behind the sessions' back."""
+    users.update(watchlist_changed=time.time_ns())
+
+
+def watched(request):
+    """Return the ids of the auctions the signed-in user watches, as a set."""
+    if not request.user.is_authenticated:
+        return set()
+    return set(_state(request)["auctions"])
+
+
+def watched_auctions(request):
+    """The auctions on the user's watchlist, each with the user's highest bid on it as ``my_bid``.
+
+    None if the user has never watched anything. The bid comes from a
+    subquery per row that bid_bidder_auction_price_idx answers with one seek,
+    so a page of the watchlist is one query however many bids its auctions
+    have. Each row also carries the size of the whole watchlist as
+    ``watchlist_size``, from a subquery that does not depend on the row.
+    """
+    watchlist_id = _state(request)["watchlist"]
+    if watchlist_id is None:
+        return None
+    my_bid = Bid.objects.filter(auction=OuterRef("pk"), bider=request.user).order_by("-bid_price").values("bid_price")[:1]
+    # IN rather than a join: the database then walks the watched ids in order
+    # and stops at the end of the page, instead of sorting the whole watchlist
+    watched_ids = Through.objects.filter(watchlist=watchlist_id).values("auction_id")
+    size = Through.objects.filter(watchlist=watchlist_id).values("watchlist").annotate(size=Count("*")).values("size")
+    return Auction.objects.filter(pk__in=watched_ids).annotate(my_bid=Subquery(my_bid), watchlist_size=Subquery(size))
+
+
+def watch_count(request, page):
+    """Number of auctions on the watchlist of which ``page`` is a page."""
+    if not page.has_next and not page.has_previous:
+        # the page holds them all
+        return len(page)
+    if len(page):
+        return page.object_list[0].watchlist_size
+    # a cursor past the end of the watchlist
+    return Through.objects.filter(watchlist=_state(request)["watchlist"]).count()
+
+
+def watch(request, auction_id):
+    """Add the auction to the user's watchlist.
+
+    Returns True if it was added, False if it was already there and None if
+    the auction does not exist.
+    """
+    state = _state(request, store=True)
+    auction_ids = set(state["auctions"])
+    if state["watchlist"] is None:
+        # the first auction a user ever watches
+        state = dict(state, watchlist=Watchlist.objects.get_or_create(user=request.user)[0].id)
+
+    # INSERT ... SELECT adds nothing for an auction that does not exist, and
+    # the ignored conflict nothing for one already watched, so two clicks at
+    # once are as good as one
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"{connection.ops.insert_statement(ignore_conflicts=True)} {quote(Through._meta.db_table)} "
+            f"({quote('watchlist_id')}, {quote('auction_id')}) "
+            f"SELECT %s, {quote('id')} FROM {quote(Auction._meta.db_table)} WHERE {quote('id')} = %s",
+            [state["watchlist"], auction_id],
+        )
+        added = cursor.rowcount == 1
+
+    if not added and auction_id not in auction_ids and not Auction.objects.filter(pk=auction_id).exists():
+        return None
+    if auction_id not in auction_ids:
+        _save(request, state, auction_ids | {auction_id})
+    return added
+
+
+def unwatch(request, auction_id):
+    """Remove the auction from the user's watchlist; returns whether it was there."""
+    state = _state(request, store=True)
+    removed = False
+    if state["watchlist"] is not None:
+        # a plain DELETE: the through table has no signals or relations to collect
+        removed = Through.objects.filter(watchlist=state["watchlist"], auction=auction_id).delete()[0] > 0
+    if removed or auction_id in state["auctions"]:
+        _save(request, state, set(state["auctions"]) - {auction_id})
+    return removed
@@ -12,5 +12,14 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dbauction.settings')
+# serve the hot read pages with their async views (dbapp/async_views.py)
+os.environ.setdefault('DJANGO_ASYNC_VIEWS', '1')
+# and push bids to open listing pages (dbapp/sse.py)
+os.environ.setdefault('DJANGO_AUCTION_EVENTS', '1')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# needs the apps loaded by get_asgi_application()
+from dbapp.sse import with_auction_events  # noqa: E402
+
+application = with_auction_events(django_application)
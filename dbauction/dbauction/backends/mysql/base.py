@@ -0,0 +1,10 @@
+from django.db.backends.mysql import base
+
+from ..pool import ReusableConnectionMixin
+
+
+class DatabaseWrapper(ReusableConnectionMixin, base.DatabaseWrapper):
+    """MySQL backend with health-checked persistent connections and optional pooling."""
+
+    def ping(self, raw_connection):
+        raw_connection.ping()
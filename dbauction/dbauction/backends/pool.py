@@ -0,0 +1,246 @@
+import threading
+import time
+
+from django.db import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """A bounded pool of raw DB-API connections shared by all threads.
+
+    At most ``max_size`` connections exist at once; a thread asking for one
+    while all are checked out waits up to ``wait_timeout`` seconds before
+    ``PoolTimeout`` is raised. Connections idle for longer than
+    ``idle_timeout`` are closed instead of being handed out, and ones idle for
+    longer than ``check_after`` are pinged with ``check`` first.
+    """
+
+    def __init__(self, connect, max_size=10, idle_timeout=300, wait_timeout=10, check_after=10, check=None):
+        self._connect = connect
+        self._check = check
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self.check_after = check_after
+
+        self._lock = threading.Condition()
+        # (connection, released at) pairs, most recently released last
+        self._idle = []
+        self._size = 0
+        self._stats = {
+            "acquired": 0,
+            "created": 0,
+            "discarded": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "wait_time": 0.0,
+            "max_wait_time": 0.0,
+        }
+
+    def acquire(self):
+        started = time.monotonic()
+        waited = False
+        with self._lock:
+            while True:
+                while self._idle:
+                    # LIFO keeps the hot connections hot and lets the rest idle out
+                    conn, released = self._idle.pop()
+                    idle_for = time.monotonic() - released
+                    if idle_for > self.idle_timeout or (idle_for > self.check_after and not self._usable(conn)):
+                        self._discard(conn)
+                        continue
+                    return self._checked_out(conn, started, waited)
+
+                if self._size < self.max_size:
+                    # reserve the slot, then connect without holding the lock
+                    self._size += 1
+                    break
+
+                remaining = self.wait_timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"No database connection available within {self.wait_timeout}s "
+                        f"(pool size {self.max_size})")
+                waited = True
+                self._lock.wait(remaining)
+
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._stats["created"] += 1
+            return self._checked_out(conn, started, waited)
+
+    def release(self, conn, discard=False):
+        with self._lock:
+            if discard:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = self._size
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._size - len(self._idle)
+            return stats
+
+    def close_all(self):
+        with self._lock:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+    # the helpers below expect the lock to be held
+
+    def _checked_out(self, conn, started, waited):
+        wait_time = time.monotonic() - started
+        self._stats["acquired"] += 1
+        if waited:
+            self._stats["waits"] += 1
+            self._stats["wait_time"] += wait_time
+            self._stats["max_wait_time"] = max(self._stats["max_wait_time"], wait_time)
+        return conn
+
+    def _usable(self, conn):
+        if self._check is None:
+            return True
+        try:
+            self._check(conn)
+        except Exception:
+            return False
+        return True
+
+    def _discard(self, conn):
+        self._size -= 1
+        self._stats["discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, **kwargs):
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(**kwargs)
+        return _pools[key]
+
+
+def pool_stats():
+    """Statistics of every pool, keyed by "alias/database name"."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
+
+
+class ReusableConnectionMixin:
+    """Connection reuse for a Django ``DatabaseWrapper``.
+
+    Reads two optional keys of the ``DATABASES`` entry:
+
+    ``HEALTH_CHECKS``
+        Ping a persistent connection (``CONN_MAX_AGE`` > 0) the first time
+        it is used in each request and reconnect if it has gone away, rather
+        than failing the request on a connection the server already dropped.
+
+    ``POOL``
+        ``{"MAX_SIZE", "IDLE_TIMEOUT", "WAIT_TIMEOUT", "CHECK_AFTER"}``. Take
+        connections from a process-wide ``ConnectionPool`` and hand them back
+        on ``close()`` instead of closing them, so threads share a bounded
+        set of warm connections. Use with ``CONN_MAX_AGE = 0`` so every
+        request returns its connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+
+    def ping(self, raw_connection):
+        """Raise if ``raw_connection`` can no longer be used.
+
+        Runs ``SELECT 1``; backends whose driver has a cheaper check
+        override this.
+        """
+        cursor = raw_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        finally:
+            cursor.close()
+
+    def responds(self):
+        """Whether the current connection answers ``ping``."""
+        try:
+            self.ping(self.connection)
+        except Exception:
+            return False
+        return True
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get("POOL")
+        if not options:
+            return None
+        # keyed by name too, so the test database never gets production connections
+        return get_pool(
+            f"{self.alias}/{self.settings_dict['NAME']}",
+            connect=self._connect_raw,
+            check=self.ping,
+            max_size=options.get("MAX_SIZE", 10),
+            idle_timeout=options.get("IDLE_TIMEOUT", 300),
+            wait_timeout=options.get("WAIT_TIMEOUT", 10),
+            check_after=options.get("CHECK_AFTER", 10),
+        )
+
+    def _connect_raw(self):
+        return super().get_new_connection(self.get_connection_params())
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        return pool.acquire()
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        # a connection left mid-transaction or after an error is not reused
+        discard = self.in_atomic_block or self.errors_occurred
+        if not discard and not self.get_autocommit():
+            try:
+                self.connection.rollback()
+            except Exception:
+                discard = True
+        pool.release(self.connection, discard=discard)
+
+    def close_if_unusable_or_obsolete(self):
+        # called when a request starts and ends: check again in the next one
+        self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and self.settings_dict.get("HEALTH_CHECKS")
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            self.health_check_done = True
+            # is_usable() is always True on SQLite, so ask the connection itself
+            if not self.responds():
+                self.close()
+        super().ensure_connection()
@@ -0,0 +1,7 @@
+from django.db.backends.sqlite3 import base
+
+from ..pool import ReusableConnectionMixin
+
+
+class DatabaseWrapper(ReusableConnectionMixin, base.DatabaseWrapper):
+    """SQLite backend with optional pooling, for local runs of the pool benchmark."""
@@ -90,10 +90,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'dbapp',
+    'dbapp.apps.DbappConfig',
 ]
 
 MIDDLEWARE = [
+    # first, so its numbers cover every other middleware and the view
+    'dbapp.profiling.QueryProfileMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -107,7 +109,8 @@ ROOT_URLCONF = 'dbauction.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates plus render timing for the profiling middleware
+        'BACKEND': 'dbapp.profiling.ProfilingDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -116,6 +119,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'dbapp.context_processors.categories',
             ],
         },
     },
@@ -169,31 +173,64 @@ DB_USER = os.getenv('DB_USER') or (_mysql.get('user') if DEBUG else None)
 DB_PASSWORD = os.getenv('DB_PASSWORD') or (_mysql.get('password') if DEBUG else None)
 DB_PORT = os.getenv('DB_PORT') or (_mysql.get('port') if DEBUG else None) or '3306'
 
-missing = [k for k, v in {
-    'DB_HOST': DB_HOST,
-    'DB_NAME': DB_NAME,
-    'DB_USER': DB_USER,
-    'DB_PASSWORD': DB_PASSWORD,
-}.items() if not v]
+# Local dev / tests: DB_ENGINE=sqlite runs against a SQLite file (or DB_NAME)
+# instead of MySQL, so the test suite and query-plan checks need no server.
+DB_ENGINE = (os.getenv('DB_ENGINE') or 'mysql').strip().lower()
 
-if missing:
-    raise RuntimeError(
-        f"Missing DB config: {', '.join(missing)}. "
-        "In production, set environment variables. For local dev, set DJANGO_DEBUG=1 and provide [mysql] in .streamlit/secrets.toml.")
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'HOST': DB_HOST,
-        'PORT': DB_PORT,
-        'NAME': DB_NAME,
-        'USER': DB_USER,
-        'PASSWORD': DB_PASSWORD,
-        'OPTIONS': {
-            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'dbauction.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME') or os.path.join(BASE_DIR, 'db.sqlite3'),
+        }
+    }
+else:
+    missing = [k for k, v in {
+        'DB_HOST': DB_HOST,
+        'DB_NAME': DB_NAME,
+        'DB_USER': DB_USER,
+        'DB_PASSWORD': DB_PASSWORD,
+    }.items() if not v]
+
+    if missing:
+        raise RuntimeError(
+            f"Missing DB config: {', '.join(missing)}. "
+            "In production, set environment variables. For local dev, set DJANGO_DEBUG=1 and provide [mysql] in .streamlit/secrets.toml.")
+
+    DATABASES = {
+        'default': {
+            # django.db.backends.mysql plus connection health checks and pooling
+            'ENGINE': 'dbauction.backends.mysql',
+            'HOST': DB_HOST,
+            'PORT': DB_PORT,
+            'NAME': DB_NAME,
+            'USER': DB_USER,
+            'PASSWORD': DB_PASSWORD,
+            'OPTIONS': {
+                'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+            }
         }
     }
-}
+
+# Connection reuse (dbauction.backends.pool):
+# 'per-request' - open and close a connection for every request
+# 'persistent'  - keep one connection per thread for DB_CONN_MAX_AGE seconds,
+#                 pinging it on first use in each request
+# 'pool'        - share a bounded pool of connections between all threads
+DB_CONN_MODE = os.getenv('DB_CONN_MODE', 'persistent')
+
+if DB_CONN_MODE == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+    DATABASES['default']['HEALTH_CHECKS'] = True
+elif DB_CONN_MODE == 'pool':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+        'IDLE_TIMEOUT': int(os.getenv('DB_POOL_IDLE_TIMEOUT', '300')),
+        'WAIT_TIMEOUT': int(os.getenv('DB_POOL_WAIT_TIMEOUT', '10')),
+    }
+elif DB_CONN_MODE != 'per-request':
+    raise RuntimeError(f"Unknown DB_CONN_MODE {DB_CONN_MODE!r}: use per-request, persistent or pool.")
 
 AUTH_USER_MODEL = 'dbapp.User'
 
@@ -237,3 +274,89 @@ STATIC_URL = '/static/'
 
 # auto-created primary keys in Django
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
+# Per-request SQL profiling (dbapp.profiling.QueryProfileMiddleware)
+# maximum queries per view, keyed by url name; QUERY_BUDGET_DEFAULT applies
+# to views not listed (None = unchecked). 'warn' logs budget overruns,
+# 'fail' raises QueryBudgetExceeded, which is what the tests want.
+QUERY_BUDGETS = {
+    'index': 3,
+    'category': 3,
+    # listing and watchlist: one more when the session's copy of the watched
+    # ids is out of date (dbapp.watching)
+    'listing': 5,
+    'watchlist': 4,
+    'auction_events': 1,
+    'api_auctions': 1,
+    'api_auction': 1,
+    'api_bids': 2,
+    'api_bid_summary': 4,
+    'bid_history': 4,
+    'api_watchlist': 3,
+    'search': 3,
+    'api_search': 3,
+}
+QUERY_BUDGET_DEFAULT = None
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'warn')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'dbapp.profiling': {
+            'handlers': ['console'],
+            'level': os.getenv('DJANGO_PROFILE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Caches: local memory by default; set REDIS_URL to share them between
+# instances (needs the optional django-redis package).
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Anonymous page cache for the index and category pages (dbapp.pagecache)
+PAGE_CACHE_ENABLED = _env_bool('PAGE_CACHE_ENABLED', True)
+PAGE_CACHE_ALIAS = 'default'
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', '300'))
+
+# Seconds before the in-process category list and counts are reloaded (dbapp.categorycache)
+CATEGORY_CACHE_TTL = int(os.getenv('CATEGORY_CACHE_TTL', '300'))
+
+# number of auctions per page on the index, category and watchlist pages
+AUCTION_PAGE_SIZE = int(os.getenv('AUCTION_PAGE_SIZE', '20'))
+
+# Route the index, category, listing and watchlist pages to their async
+# versions (dbapp.async_views); asgi.py turns this on. Their independent
+# queries run at once on worker threads, each with its own connection, unless
+# ASYNC_PARALLEL_QUERIES is off.
+ASYNC_VIEWS = _env_bool('DJANGO_ASYNC_VIEWS', False)
+ASYNC_PARALLEL_QUERIES = _env_bool('ASYNC_PARALLEL_QUERIES', True)
+
+# Live auction updates (dbapp.events, dbapp.sse): listing pages follow the
+# price over server-sent events; asgi.py turns this on. EVENT_BROKER fans bids
+# out within one process; dbapp.events.RedisBroker (optional redis package)
+# shares them between processes.
+AUCTION_EVENTS = _env_bool('DJANGO_AUCTION_EVENTS', False)
+EVENT_BROKER = os.getenv('EVENT_BROKER', 'dbapp.events.InProcessBroker')
+EVENT_BROKER_URL = os.getenv('EVENT_BROKER_URL') or os.getenv('REDIS_URL')
+AUCTION_EVENTS_KEEPALIVE = int(os.getenv('AUCTION_EVENTS_KEEPALIVE', '15'))
+# how long browsers wait before polling the WSGI fallback again
+AUCTION_EVENTS_RETRY_MS = int(os.getenv('AUCTION_EVENTS_RETRY_MS', '5000'))